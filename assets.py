@@ -0,0 +1,162 @@
+"""
+This module contains the cache of the assets (images, parts of images and fonts)
+shared by all the views of the game. Each asset is read from the disk and
+converted to the format of the display only once; the cached surfaces are
+shared, so they must never be modified by the code using them.
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import pygame
+
+from constants import ASSET_CACHE_MAX_BYTES, ASSET_FONT_EXTENSIONS
+
+
+class AssetCache():
+    """Class storing the assets already loaded, keyed by their path, their size
+    and the region of the image they come from. The least recently used assets
+    are dropped when the cache holds more than <max_bytes> bytes."""
+
+    def __init__(self, max_bytes=ASSET_CACHE_MAX_BYTES):
+        """Constructor method."""
+
+        self.max_bytes = max_bytes
+
+        # Assets ordered from the least to the most recently used:
+        # each key is associated with a tuple (asset, number of bytes)
+        self.entries = OrderedDict()
+
+        # Statistics of the cache
+        self.hits, self.misses, self.bytes_held = 0, 0, 0
+
+        # Files read in advance by the preloading thread, by path: the images are
+        # decoded (but not converted yet), the fonts are kept as bytes
+        self.preloaded = {}
+
+    def get(self, key, load):
+        """Method returning the asset of the given <key>. If it is not cached yet,
+        the <load> function is called: it must return a tuple (asset, number of bytes)."""
+
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+            return entry[0]
+
+        self.misses += 1
+
+        entry = load()
+        self.entries[key] = entry
+        self.bytes_held += entry[1]
+
+        # We drop the least recently used assets (but never the one just loaded)
+        while self.bytes_held > self.max_bytes and len(self.entries) > 1:
+            (_, (_, size)) = self.entries.popitem(last=False)
+            self.bytes_held -= size
+
+        return entry[0]
+
+    def image(self, path, alpha=True):
+        """Method returning the image stored in the file at <path>, converted
+        to the format of the display (with transparency if <alpha> is True)."""
+
+        def load():
+            """Function reading (unless it has been preloaded) and converting the image."""
+            image = self.preloaded.pop(path, None)
+
+            if image is None:
+                image = pygame.image.load(path)
+
+            image = image.convert_alpha() if alpha else image.convert()
+
+            return (image, surface_size(image))
+
+        return self.get(('image', path, alpha), load)
+
+    def region(self, path, rect, alpha=True):
+        """Method returning the part of the image at <path> delimited by <rect>
+        (a tuple (x, y, width, height)), for instance one texture of a sprite sheet."""
+
+        def load():
+            """Function copying the region from the cached image."""
+            image = self.image(path, alpha).subsurface(pygame.Rect(rect)).copy()
+
+            return (image, surface_size(image))
+
+        return self.get(('region', path, tuple(rect), alpha), load)
+
+    def font(self, path, size):
+        """Method returning the font stored in the file at <path>, with the given <size>."""
+
+        def load():
+            """Function reading the font (its size is estimated by the size of the file)."""
+            data = self.preloaded.get(path)
+
+            if data is None:
+                return (pygame.font.Font(path, size), os.path.getsize(path))
+
+            return (pygame.font.Font(io.BytesIO(data), size), len(data))
+
+        return self.get(('font', path, size), load)
+
+    def preload(self, paths):
+        """Method reading the files at <paths> (images and fonts) in a background
+        thread, so that they are already in memory when they are first used.
+        The images are only decoded there: they are converted to the format of the
+        display by the image method, in the main thread. It returns the thread."""
+
+        def run():
+            """Function reading the files, one after the other."""
+
+            for path in paths:
+                if path in self.preloaded:
+                    continue
+
+                try:
+                    with open(path, 'rb') as asset_file:
+                        data = asset_file.read()
+
+                    if path.lower().endswith(ASSET_FONT_EXTENSIONS):
+                        self.preloaded[path] = data
+
+                    else:
+                        self.preloaded[path] = pygame.image.load(io.BytesIO(data), path)
+
+                # The asset will be read again (and the error raised) when it is used
+                except (OSError, pygame.error):
+                    pass
+
+        thread = threading.Thread(target=run, name='asset-preloader', daemon=True)
+        thread.start()
+
+        return thread
+
+    def clear(self):
+        """Method dropping all the cached assets."""
+        self.entries.clear()
+        self.preloaded.clear()
+        self.bytes_held = 0
+
+    def stats(self):
+        """Method returning a dictionary with the statistics of the cache."""
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'bytes': self.bytes_held
+        }
+
+
+def surface_size(surface):
+    """Function returning the number of bytes used by the pixels of a <surface>."""
+    return surface.get_pitch() * surface.get_height()
+
+
+# Cache shared by the whole application
+asset_cache = AssetCache()
@@ -0,0 +1,380 @@
+"""
+This module contains the benchmarks of the game. It times the main operations
+(parsing the levels, moving and pushing, cancelling a move, drawing a frame,
+building the menus, loading the assets, stepping the training environment and
+launching the game until its first frame) without opening a window, thanks to
+the dummy video driver of SDL, and writes the results as JSON. The results can
+be compared with a baseline saved before: the tool fails if a metric has
+regressed.
+
+Usage: python benchmark.py [-o results.json] [--compare baseline.json] [options]
+(run with --help for the list of the options)
+"""
+
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# The benchmarks never open a window (unless another video driver is chosen)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from assets import AssetCache
+from constants import (CHARACTER_MOVE_KEYS, LEVEL_MENU_LEVELS_PATH, UI_FONT_PATH,
+                       WINDOW_SIZE)
+from core_constants import (BENCHMARK_ENVIRONMENT_GAMES, BENCHMARK_MIN_DELTA,
+                            BENCHMARK_REPEAT, BENCHMARK_STARTUP_RUNS,
+                            BENCHMARK_THRESHOLD, CRATE_FLAG, WALL_FLAG)
+from environment import SokobanEnvironment, numpy
+from game import BackgroundManager, GameManager
+from level_collection import read_level_reference
+from menu import get_level_menu_elements, get_main_menu_elements, level_reference
+
+
+def measure(function, repeat=BENCHMARK_REPEAT, setup=None, teardown=None):
+    """Function calling <function> <repeat> times and returning the statistics
+    of its duration, in milliseconds. The optional <setup> and <teardown> functions
+    are called before and after each run, and are not timed. As in the timeit
+    module, the garbage collector is disabled during the measures."""
+
+    durations = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+
+            start_time = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start_time)
+
+            if teardown is not None:
+                teardown()
+
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return statistics(durations)
+
+
+def statistics(durations):
+    """Function returning the statistics of the <durations> of several runs
+    (in seconds), in milliseconds."""
+
+    durations = sorted(durations)
+
+    return {
+        'median': round(1000 * durations[len(durations) // 2], 6),
+        'min': round(1000 * durations[0], 6),
+        'mean': round(1000 * sum(durations) / len(durations), 6),
+        'runs': len(durations)
+    }
+
+
+def find_push(state):
+    """Function looking for a crate which the character can push in <state>.
+    It returns a tuple (path, move): the move codes leading the character next to
+    the crate, and the move code of the push. It returns None if there is none."""
+
+    obstacles = WALL_FLAG | CRATE_FLAG
+
+    for crate in sorted(state.crates):
+        for move, offset in enumerate(state.offsets):
+            if state.board[crate + offset] & obstacles \
+                    or state.board[crate - offset] & obstacles:
+                continue
+
+            path = state.path_to(crate - offset)
+
+            if path is not None:
+                return (path, move)
+
+    return None
+
+
+def benchmark_levels(repeat):
+    """Function timing the parsing of each level displayed in the level menu, from
+    the level cache (as when a level is opened), and without it (as the first time).
+    It returns a tuple (metrics, errors)."""
+
+    metrics, errors = {}, {}
+    background = BackgroundManager()
+
+    for level in sorted(os.listdir(LEVEL_MENU_LEVELS_PATH)):
+        reference = level_reference(level)
+
+        # The first parse fills the level cache
+        if not background.parse(reference):
+            errors[level] = 'the level cannot be parsed'
+            continue
+
+        metrics['background.parse.' + level] = measure(
+            lambda: background.parse(reference), repeat)
+        metrics['level.read.' + level] = measure(
+            lambda: read_level_reference(reference), repeat)
+
+    return (metrics, errors)
+
+
+def benchmark_game(screen, level, repeat):
+    """Function timing the moves, pushes and cancellations of the character,
+    and the drawing of the frames, on the <level> (a level reference).
+    It returns a tuple (metrics, errors)."""
+
+    metrics, errors = {}, {}
+
+    # The database of the levels is kept in memory, so that the benchmarks do
+    # not create or modify the one of the player
+    game = GameManager(screen, database_path=':memory:')
+    game.parse(level, 0)
+
+    character, state = game.character, game.state
+    arguments = (state, game.crates_by_coords, game.trophies)
+
+    def undo():
+        """Function cancelling the last move of the character."""
+        character.undo(*arguments)
+
+    # A move without push: the first direction in which the character can walk
+    walks = [move for move in range(len(state.offsets))
+             if not state.board[state.player + state.offsets[move]]
+             & (WALL_FLAG | CRATE_FLAG)]
+
+    if walks:
+        key = CHARACTER_MOVE_KEYS[walks[0]]
+
+        metrics['character.move'] = measure(
+            lambda: character.update(key, *arguments), repeat, teardown=undo)
+        metrics['character.undo_move'] = measure(
+            undo, repeat, lambda: character.update(key, *arguments))
+
+    else:
+        errors['character.move'] = 'the character cannot move'
+
+    # A push: the character walks to the first crate which can be pushed
+    push = find_push(state)
+
+    if push is not None:
+        (path, move) = push
+
+        for step in path:
+            character.update(CHARACTER_MOVE_KEYS[step], *arguments)
+
+        key = CHARACTER_MOVE_KEYS[move]
+
+        metrics['character.push'] = measure(
+            lambda: character.update(key, *arguments), repeat, teardown=undo)
+        metrics['character.undo_push'] = measure(
+            undo, repeat, lambda: character.update(key, *arguments))
+
+        # In the game, a push is followed by the update of the deadlocked crates,
+        # and by the drawing of the areas of the screen which changed
+        def push_frame():
+            """Function pushing the crate, and drawing the next frame."""
+            game.move_character(key)
+            game.draw()
+
+        def undo_push():
+            """Function cancelling the push, and forgetting the areas to redraw."""
+            undo()
+            game.dirty_rects = []
+
+        metrics['game.push_frame'] = measure(push_frame, repeat, teardown=undo_push)
+
+    else:
+        errors['character.push'] = 'no crate can be pushed'
+
+    def full_frame():
+        """Function drawing the whole screen, as at the first frame of the main loop."""
+        game.dirty_rects = [screen.get_rect()]
+        game.draw()
+
+    metrics['game.full_frame'] = measure(full_frame, repeat)
+
+    return (metrics, errors)
+
+
+def benchmark_menus(repeat):
+    """Function timing the creation of the elements of the menus."""
+
+    return {
+        'menu.main_elements': measure(get_main_menu_elements, repeat),
+        'menu.level_elements': measure(get_level_menu_elements, repeat)
+    }
+
+
+def benchmark_environment(repeat):
+    """Function timing a step of BENCHMARK_ENVIRONMENT_GAMES games of the training
+    environment, with random actions. It is skipped if NumPy is not installed."""
+
+    if numpy is None:
+        return {}
+
+    environment = SokobanEnvironment(BENCHMARK_ENVIRONMENT_GAMES, seed=0)
+    actions = numpy.random.default_rng(0).integers(
+        environment.action_count, size=(repeat, BENCHMARK_ENVIRONMENT_GAMES))
+    steps = iter(actions)
+
+    return {'environment.step': measure(lambda: environment.step(next(steps)), repeat)}
+
+
+def benchmark_assets(repeat):
+    """Function timing the loading of all the images and of the font of the game,
+    from the disk (with an empty asset cache) and from the asset cache."""
+
+    paths = sorted(glob.glob(os.path.join('sprites', '**', '*.png'), recursive=True))
+
+    def load_all(cache):
+        """Function loading all the assets in the <cache>."""
+
+        for path in paths:
+            cache.image(path)
+
+        cache.font(UI_FONT_PATH, 32)
+
+    caches = []
+    warm_cache = AssetCache()
+    load_all(warm_cache)
+
+    return {
+        'assets.load_cold': measure(lambda: load_all(caches[-1]), repeat,
+                                    lambda: caches.append(AssetCache()), caches.clear),
+        'assets.load_cached': measure(lambda: load_all(warm_cache), repeat)
+    }
+
+
+def benchmark_startup(runs=BENCHMARK_STARTUP_RUNS):
+    """Function launching the game <runs> times, and timing its first frame
+    (see the --startup-time option of the main module)."""
+
+    durations = []
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, 'main.py', '--startup-time'],
+            stdout=subprocess.PIPE, check=True, universal_newlines=True
+        ).stdout
+
+        durations.append(float(output.split()[-1]) / 1000)
+
+    return {'startup.time_to_first_frame': statistics(durations)}
+
+
+def run_benchmarks(level, repeat=BENCHMARK_REPEAT):
+    """Function running all the benchmarks, the game ones on the <level> reference.
+    It returns the dictionary of the results, saved as JSON."""
+
+    pygame.init()
+    screen = pygame.display.set_mode(WINDOW_SIZE)
+
+    metrics, errors = {}, {}
+
+    (level_metrics, level_errors) = benchmark_levels(repeat)
+    (game_metrics, game_errors) = benchmark_game(screen, level, repeat)
+
+    for results in (level_metrics, game_metrics, benchmark_menus(repeat),
+                    benchmark_environment(repeat), benchmark_assets(max(1, repeat // 10)),
+                    benchmark_startup()):
+        metrics.update(results)
+
+    errors.update(level_errors)
+    errors.update(game_errors)
+
+    pygame.quit()
+
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'video_driver': os.environ.get('SDL_VIDEODRIVER'),
+        'level': level,
+        'metrics': metrics,
+        'errors': errors
+    }
+
+
+def compare_results(results, baseline, threshold=BENCHMARK_THRESHOLD,
+                    min_delta=BENCHMARK_MIN_DELTA):
+    """Function comparing the median of each metric of <results> with the one of
+    <baseline>. A metric has regressed if it is more than <threshold> (a ratio)
+    slower, and more than <min_delta> milliseconds slower.
+    It returns the list of the comparisons, as tuples
+    (name, baseline median, median, ratio, regressed)."""
+
+    comparisons = []
+
+    for name in sorted(results['metrics']):
+        if name not in baseline.get('metrics', {}):
+            continue
+
+        before = baseline['metrics'][name]['median']
+        after = results['metrics'][name]['median']
+        ratio = after / before if before > 0 else float('inf')
+
+        regressed = after - before > min_delta and ratio > 1 + threshold
+        comparisons.append((name, before, after, ratio, regressed))
+
+    return comparisons
+
+
+def main(arguments=None):
+    """Main function of the tool. It returns the exit status:
+    1 if a metric has regressed compared to the baseline, 0 otherwise."""
+
+    parser = argparse.ArgumentParser(description='Time the main operations of the game.')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file in which the results are written (default: standard output)')
+    parser.add_argument('-c', '--compare', default=None,
+                        help='results of a previous run, used as a baseline')
+    parser.add_argument('-t', '--threshold', type=float, default=BENCHMARK_THRESHOLD,
+                        help='relative slowdown considered as a regression')
+    parser.add_argument('-r', '--repeat', type=int, default=BENCHMARK_REPEAT,
+                        help='number of runs of each operation')
+    parser.add_argument('-l', '--level', default=None,
+                        help='level used by the game benchmarks (default: the first one)')
+    options = parser.parse_args(arguments)
+
+    level = options.level or level_reference(sorted(os.listdir(LEVEL_MENU_LEVELS_PATH))[0])
+    results = run_benchmarks(level, max(1, options.repeat))
+
+    if options.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    else:
+        with open(options.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+            output.write('\n')
+
+    for (name, error) in results['errors'].items():
+        print('{}: {}'.format(name, error), file=sys.stderr)
+
+    if options.compare is None:
+        return 0
+
+    with open(options.compare, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+
+    comparisons = compare_results(results, baseline, options.threshold)
+
+    for (name, before, after, ratio, regressed) in comparisons:
+        print('{:<40} {:>10.4f} ms {:>10.4f} ms {:>7.2f}x{}'.format(
+            name, before, after, ratio, '  REGRESSION' if regressed else ''),
+            file=sys.stderr)
+
+    return 1 if any(comparison[4] for comparison in comparisons) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,8 @@
 This module contains all the constants useful in the application.
 """
 import pygame
+from core_constants import (LEVEL_TILE_SIZE, LEVELS_PATH, MOVE_DOWN, MOVE_LEFT,
+                            MOVE_RIGHT, MOVE_UP)
 
 ############################ Background ############################
 
@@ -9,14 +11,13 @@ import pygame
 BACKGROUND_TEXTURES_PATH = 'sprites/background_textures.png'
 TILE_SIZE = 32  # Size in pixels of each tile
 
-# The different tile codes used in the level files :
-EMPTY = 0  # Tile code for an empty tile
-WALL = 1  # Tile code for a wall
-CRATE = 2  # Tile code for a crate
-TROPHY = 3  # Tile code for a trophy
-RED_CRATE = 4  # Tile code for a red crate
-CHARACTER = 5  # Tile code for the characters
-PLAYER_TELEPORTER = 6  # Tile code for the player teleporter
+# Size (in tiles) of the chunks of the background of the maps larger than
+# the window, and maximum number of chunks kept rendered
+BACKGROUND_CHUNK_SIZE = 8
+BACKGROUND_CHUNK_CACHE_SIZE = 64
+
+# The tile codes used in the level files (EMPTY, WALL, CRATE, TROPHY, RED_CRATE,
+# CHARACTER, PLAYER_TELEPORTER) are defined in the core_constants module
 
 ############################ Character #############################
 
@@ -49,32 +50,31 @@ CHARACTER_DIRECTIONS = {
     pygame.K_DOWN: {
         'texture_pos': 0,
         'dx': 0,
-        'dy': 1
+        'dy': 1,
+        'move': MOVE_DOWN
     },
     pygame.K_UP: {
         'texture_pos': 1,
         'dx': 0,
-        'dy': -1
+        'dy': -1,
+        'move': MOVE_UP
     },
     pygame.K_RIGHT: {
         'texture_pos': 2,
         'dx': 1,
-        'dy': 0
+        'dy': 0,
+        'move': MOVE_RIGHT
     },
     pygame.K_LEFT: {
         'texture_pos': 3,
         'dx': -1,
-        'dy': 0
+        'dy': 0,
+        'move': MOVE_LEFT
     }
 }
 
-# Dictionary describing each movement and its opposite
-CHARACTER_DIRECTIONS_OPPOSITE = {
-    pygame.K_DOWN: pygame.K_UP,
-    pygame.K_UP: pygame.K_DOWN,
-    pygame.K_LEFT: pygame.K_RIGHT,
-    pygame.K_RIGHT: pygame.K_LEFT
-}
+# Key corresponding to each move code of the engine (in the order of the LURD notation)
+CHARACTER_MOVE_KEYS = [pygame.K_LEFT, pygame.K_UP, pygame.K_RIGHT, pygame.K_DOWN]
 
 ############################## Game ################################
 
@@ -85,6 +85,96 @@ GAME_BUTTONS_WIDTH = 150
 # Space between the buttons and the bottom of the window
 GAME_BUTTONS_Y_MARGIN = 16
 
+# Minimum distance (in tiles) kept between the character and the edges
+# of the screen, when the map is larger than the window
+GAME_CAMERA_MARGIN = 4
+
+# Coordinates of the move count on the screen, and of the messages displayed under it
+GAME_MOVE_COUNT_POSITION = (10, 0)
+GAME_MESSAGE_POSITION = (10, 28)
+
+# Keys cancelling the last move, and playing again the last cancelled move
+GAME_UNDO_KEY = pygame.K_z
+GAME_REDO_KEY = pygame.K_y
+
+# Key asking for a hint (the next push of a solution from the current position)
+GAME_HINT_KEY = pygame.K_h
+
+# Number of moves per second of the character walking to a clicked tile
+GAME_WALK_SPEED = 20
+
+# Height of the timeline of the moves (displayed above the buttons), space
+# between the timeline and the buttons, and space between the timeline
+# and the sides of the window
+GAME_TIMELINE_HEIGHT = 10
+GAME_TIMELINE_Y_MARGIN = 10
+GAME_TIMELINE_X_MARGIN = 16
+
+# Event posted when all the crates are placed on a trophy (its attributes are
+# the reference of the level, the numbers of moves and pushes, and the duration
+# of the game in seconds)
+LEVEL_COMPLETE_EVENT = pygame.USEREVENT + 2
+
+# Event posted when the plan pushing a dragged crate has been searched, and messages
+# displayed while it is searched and when no plan is found (for each status)
+PLAN_EVENT = pygame.USEREVENT + 3
+GAME_PLAN_MESSAGES = {
+    'searching': 'Recherche...',
+    'impossible': 'Impossible de pousser la caisse ici',
+    'timeout': 'Aucune solution trouvée à temps'
+}
+
+# Event posted when a hint has been searched, messages displayed while it is
+# searched and once it is found (for each status), and name of each move code
+HINT_EVENT = pygame.USEREVENT + 4
+GAME_HINT_MESSAGES = {
+    'searching': "Recherche d'un indice...",
+    'solved': 'Indice : pousser la caisse {}',
+    'partial': 'Piste (sans solution complète) : pousser la caisse {}',
+    'unsolvable': 'Plus de solution : annulez des déplacements',
+    'timeout': 'Aucun indice trouvé à temps'
+}
+GAME_HINT_DIRECTIONS = ['à gauche', 'vers le haut', 'à droite', 'vers le bas']
+
+# Color and transparency of the layer added on the crates which are deadlocked
+GAME_DEADLOCK_COLOR = (0, 0, 0)
+GAME_DEADLOCK_ALPHA_VALUE = 140
+
+# Color and transparency of the layer added on the crate of the hint,
+# and on the tile where it has to be pushed
+GAME_HINT_COLOR = (0, 200, 255)
+GAME_HINT_ALPHA_VALUE = 110
+
+############################ Event Loop ############################
+
+# Maximum frame rate of the main loops when something is animated
+LOOP_MAX_FPS = 60
+
+# Maximum time (in milliseconds) spent waiting for an event when nothing is animated
+LOOP_IDLE_TIMEOUT = 250
+
+############################# Profiler #############################
+
+PROFILER_TOGGLE_KEY = pygame.K_F3  # Key showing or hiding the profiling overlay
+PROFILER_CAPACITY = 1024  # Number of frames kept in the ring buffer of the profiler
+
+# Phases of the frames measured by the profiler (their order is the one of the
+# trace), and indexes of these phases
+PROFILER_PHASES = ['events', 'hover', 'background', 'trophies', 'sprites',
+                   'overlay', 'display']
+PROFILER_EVENTS, PROFILER_HOVER, PROFILER_BACKGROUND, PROFILER_TROPHIES, \
+    PROFILER_SPRITES, PROFILER_OVERLAY, PROFILER_DISPLAY = range(len(PROFILER_PHASES))
+
+PROFILER_OVERLAY_PERIOD = 0.5  # Time (in seconds) between two updates of the overlay
+PROFILER_OVERLAY_FONT_SIZE = 12  # Size of the text of the overlay
+PROFILER_OVERLAY_RECT = (448, 32, 184, 140)  # Area of the screen covered by the overlay
+PROFILER_OVERLAY_COLOR = (0, 0, 0, 180)  # Color (and transparency) of the overlay
+
+# Directory in which the traces are saved on exit, and their format ('json'
+# for the trace event format of Chrome, or 'csv')
+PROFILER_TRACES_PATH = 'traces'
+PROFILER_TRACE_FORMAT = 'json'
+
 ############################## Views ###############################
 
 GAME_VIEW = 0  # View set when the game is running
@@ -137,7 +227,7 @@ MAIN_MENU_SPRITES = [
 LEVEL_MENU_BUTTONS_SIZE = (100, 100)
 
 # Path to the directory containing the level files
-LEVEL_MENU_LEVELS_PATH = 'levels'
+LEVEL_MENU_LEVELS_PATH = LEVELS_PATH
 
 # Title displayed at the top of the menu
 LEVEL_MENU_TITLE_TEXT = 'Choix du niveau :'
@@ -148,6 +238,25 @@ LEVEL_MENU_TITLE_SIZE = 35
 # Top margin before the buttons
 LEVEL_MENU_TOP_MARGIN = 125
 
+# Proportion of the height of the buttons used by the number of the level,
+# once the thumbnail of the level is displayed
+LEVEL_MENU_NUMBER_PROPORTION = 0.25
+
+# Number of the page displayed after the title, when the levels fill several pages
+LEVEL_MENU_PAGE_TEXT = '{} ({}/{})'
+
+# Size and texts of the buttons leading to the previous and to the next page
+LEVEL_MENU_PAGE_BUTTON_SIZE = (50, 50)
+LEVEL_MENU_PREVIOUS_PAGE_TEXT = '<'
+LEVEL_MENU_NEXT_PAGE_TEXT = '>'
+
+# Keys changing the page (the mouse wheel changes it as well)
+LEVEL_MENU_PREVIOUS_PAGE_KEY = pygame.K_PAGEUP
+LEVEL_MENU_NEXT_PAGE_KEY = pygame.K_PAGEDOWN
+
+# Event posted when the thumbnail of a level has been rendered
+THUMBNAIL_EVENT = pygame.USEREVENT + 1
+
 ######################### User Interface ###########################
 
 UI_FONT_PATH = 'fonts/ui_font.ttf'  # Path of the font file
@@ -162,10 +271,22 @@ UI_BACKGROUND_COLOR = (55, 0, 10)  # Color of the background
 UI_BUTTON_CHECK_PATH = 'sprites/button-check.png'  # Path to the button check image
 UI_BUTTON_CHECK_SIZE = (16, 16)  # Size of the button check image
 
+############################## Assets ##############################
+
+# Maximum number of bytes held by the cache of the assets (images and fonts)
+ASSET_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Extensions of the font files (the other assets are images)
+ASSET_FONT_EXTENSIONS = ('.ttf', '.otf')
+
+# Assets of the game read in the background while the main menu is displayed
+ASSET_PRELOAD_PATHS = [BACKGROUND_TEXTURES_PATH] + \
+    [character_info['textures_path'] for character_info in CHARACTERS_INFO]
+
 ############################## Window ##############################
 
 WINDOW_TITLE = 'Mario Sokoban'  # Title of the window
-WINDOW_TILE_SIZE = 20  # Size of the window, in terms of tile
+WINDOW_TILE_SIZE = LEVEL_TILE_SIZE  # Size of the window, in terms of tile
 # Path to the image of the icon of the window
 WINDOW_ICON_PATH = 'sprites/window_icon.png'
 WINDOW_SIZE = (WINDOW_TILE_SIZE * TILE_SIZE,
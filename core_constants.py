@@ -0,0 +1,227 @@
+"""
+This module contains the constants used by the headless modules
+(the game engine, the solver...). Contrary to the constants module,
+it does not depend on pygame, so that these modules can be used
+without any display. The constants module re-exports them.
+"""
+
+############################## Level ###############################
+
+# The different tile codes used in the level files :
+EMPTY = 0  # Tile code for an empty tile
+WALL = 1  # Tile code for a wall
+CRATE = 2  # Tile code for a crate
+TROPHY = 3  # Tile code for a trophy
+RED_CRATE = 4  # Tile code for a red crate
+CHARACTER = 5  # Tile code for the characters
+PLAYER_TELEPORTER = 6  # Tile code for the player teleporter
+
+LEVEL_TILE_SIZE = 20  # Size of the original levels (and of the window), in terms of tile
+LEVEL_MAX_TILE_SIZE = 1024  # Maximum width and height of a level, in terms of tile
+LEVELS_PATH = 'levels'  # Path to the directory containing the level files
+LEVEL_TILE_SEPARATOR = ','  # Separator between the tile codes of a level file
+
+########################### Level Cache ############################
+
+LEVEL_CACHE_PATH = '.level_cache'  # Path to the directory containing the compiled levels
+LEVEL_CACHE_MAGIC = b'MSKL'  # First bytes of the compiled level files
+LEVEL_CACHE_VERSION = 3  # Version of the format of the compiled level files
+
+############################ Thumbnails ############################
+
+# Path to the directory containing the thumbnails of the levels
+THUMBNAILS_PATH = LEVEL_CACHE_PATH + '/thumbnails'
+THUMBNAIL_MAGIC = b'MSKT'  # First bytes of the thumbnail files
+THUMBNAIL_VERSION = 1  # Version of the format of the thumbnail files
+THUMBNAIL_SIZE = (88, 88)  # Maximum size of the thumbnails, in pixels
+THUMBNAIL_WORKERS = 2  # Number of processes rendering the thumbnails
+
+# Colors (RGBA) of the elements of the levels on the thumbnails
+# (the tiles outside of the walls are transparent)
+THUMBNAIL_WALL_COLOR = (150, 60, 40, 255)
+THUMBNAIL_FLOOR_COLOR = (222, 214, 174, 255)
+THUMBNAIL_TROPHY_COLOR = (240, 190, 30, 255)
+THUMBNAIL_CRATE_COLOR = (140, 110, 60, 255)
+THUMBNAIL_PLACED_CRATE_COLOR = (60, 160, 60, 255)
+THUMBNAIL_CHARACTER_COLOR = (220, 30, 30, 255)
+THUMBNAIL_OUTSIDE_COLOR = (0, 0, 0, 0)
+
+######################## Level Collections #########################
+
+# Extensions of the files containing a collection of levels in the standard format
+LEVEL_COLLECTION_EXTENSIONS = ('.xsb', '.sok')
+
+# Characters of the standard format of the levels
+XSB_WALL = '#'
+XSB_CHARACTER = '@'
+XSB_CHARACTER_ON_TROPHY = '+'
+XSB_CRATE = '$'
+XSB_CRATE_ON_TROPHY = '*'
+XSB_TROPHY = '.'
+XSB_FLOORS = ' -_'
+
+# Separator between the path of a collection and the number of one of its levels
+LEVEL_REFERENCE_SEPARATOR = '#'
+
+LEVEL_INDEX_MAGIC = b'MSKI'  # First bytes of the index files of the collections
+LEVEL_INDEX_VERSION = 1  # Version of the format of the index files
+
+############################# Engine ###############################
+
+# Codes of the moves of the character, in the order of the LURD notation
+MOVE_LEFT = 0
+MOVE_UP = 1
+MOVE_RIGHT = 2
+MOVE_DOWN = 3
+
+# Letters of the LURD notation for each move code (upper case for a push)
+MOVE_LETTERS = 'lurd'
+
+# Horizontal and vertical offsets of each move code
+MOVE_DELTAS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+
+# Flag added to a move code in the history when the move pushed a crate
+MOVE_PUSH_FLAG = 4
+
+# Values returned by the engine when the character is asked to move
+MOVE_BLOCKED = 0  # The move is impossible
+MOVE_WALKED = 1  # The character moved without pushing anything
+MOVE_PUSHED = 2  # The character moved and pushed a crate
+
+# Flags stored in each tile of the board of the engine
+WALL_FLAG = 1
+TROPHY_FLAG = 2
+CRATE_FLAG = 4
+
+# Number of bytes of the digests identifying the levels, and flag marking the
+# initial tile of the character in the data from which they are computed
+LEVEL_HASH_SIZE = 16
+LEVEL_HASH_PLAYER_FLAG = 8
+
+############################# Solver ###############################
+
+# Maximum number of entries of the transposition table of the solver
+SOLVER_TABLE_SIZE = 1 << 21
+
+# Weight applied to the heuristic of the A* search (1 gives nearly optimal solutions,
+# higher values find near-optimal solutions much faster)
+SOLVER_DEFAULT_WEIGHT = 3
+
+# Number of expanded nodes between two checks of the time limit
+SOLVER_CHECK_INTERVAL = 1024
+
+# Seed of the random generator used for the Zobrist keys
+SOLVER_ZOBRIST_SEED = 0x50C0BA
+
+# Pruning of the corral deadlocks by default (cheap with the memoized bitboard
+# searches, and it divides the nodes by 4 on level_D)
+SOLVER_CORRAL_CHECK = True
+
+############################ Deadlocks #############################
+
+# Maximum number of positions explored by the search checking a corral
+DEADLOCK_CORRAL_NODES = 200
+
+# Maximum number of corrals whose result is memoized
+DEADLOCK_CORRAL_CACHE_SIZE = 1 << 16
+
+############################# Replays ##############################
+
+REPLAYS_PATH = 'replays'  # Path to the directory containing the replays
+REPLAY_EXTENSION = '.msr'  # Extension of the replay files
+REPLAY_MAGIC = b'MSKR'  # First bytes of the replay files
+REPLAY_VERSION = 1  # Version of the format of the replay files
+REPLAY_DEFAULT_SPEED = 10  # Number of moves per second of the rendered playback
+
+########################## Batch solver ############################
+
+# Default time limit for each level, in seconds
+BATCH_TIME_LIMIT = 60
+
+# Fields of the reports of the batch solver, in the order of the CSV columns
+# (the source is 'solver', or 'database' for the levels already solved)
+BATCH_REPORT_FIELDS = ['level', 'status', 'solved', 'moves', 'pushes',
+                       'nodes', 'elapsed', 'wall_time', 'error', 'source']
+
+######################## Solution verifier #########################
+
+# Number of solutions sent at once to a worker process
+VERIFY_CHUNK_SIZE = 512
+
+# Extension of the files containing one solution per line, as JSON objects
+VERIFY_JSONL_EXTENSION = '.jsonl'
+
+# Fields of the reports of the solution verifier, in the order of the CSV columns
+VERIFY_REPORT_FIELDS = ['id', 'level', 'status', 'valid', 'moves', 'pushes',
+                        'diverged_at', 'error']
+
+############################ Benchmarks ############################
+
+BENCHMARK_REPEAT = 200  # Number of runs of each measured operation
+BENCHMARK_STARTUP_RUNS = 5  # Number of launches of the game timed by the benchmarks
+BENCHMARK_ENVIRONMENT_GAMES = 4096  # Number of games stepped at once by the benchmarks
+BENCHMARK_THRESHOLD = 0.25  # Relative slowdown of a metric considered as a regression
+
+# Slowdown (in milliseconds) below which a metric is never considered as
+# a regression, since the fastest operations only last a few microseconds
+BENCHMARK_MIN_DELTA = 0.005
+
+########################## Level analyzer ##########################
+
+# Maximum number of tiles of the arrays holding a batch of levels
+# (the levels of a batch are analyzed together, as a 3-dimensional array)
+ANALYZER_BATCH_TILES = 1 << 22
+
+# Number of steps of the flood fills between two checks of their progress
+ANALYZER_FLOOD_STEPS = 8
+
+# Fields of the reports of the level analyzer, in the order of the CSV columns
+ANALYZER_REPORT_FIELDS = ['level', 'valid', 'width', 'height', 'crates', 'trophies',
+                          'closed', 'unreachable_crates', 'unreachable_trophies',
+                          'floor', 'dead_squares', 'dead_crates', 'difficulty',
+                          'problems']
+
+############################# History ##############################
+
+# Number of moves between two checkpoints of the history: jumping to any move
+# of the history replays or cancels at most this number of moves
+HISTORY_CHECKPOINT_INTERVAL = 64
+
+########################### Pathfinding ############################
+
+# Maximum number of tiles reached by the search of a path during a frame
+# (the search of the farthest tiles of the largest maps goes on at the next frames)
+PATHFINDING_FRAME_TILES = 16384
+
+########################### Push planner ###########################
+
+PLANNER_TIME_LIMIT = 2.0  # Maximum duration of the search of a plan, in seconds
+
+# Number of states of the search between two checks of the time limit
+PLANNER_CHECK_INTERVAL = 256
+
+############################## Hints ###############################
+
+HINT_TIME_LIMIT = 30  # Maximum duration of the search of a hint, in seconds
+HINT_WEIGHT = SOLVER_DEFAULT_WEIGHT  # Weight of the heuristic of the searches of the hints
+HINT_CACHE_SIZE = 4096  # Number of positions whose next push is memoized
+
+############################# Database #############################
+
+DATABASE_PATH = 'levels.db'  # Path to the database of the levels (solutions, bests...)
+DATABASE_BATCH_SIZE = 512  # Number of rows written (or digests looked up) at once
+DATABASE_TIMEOUT = 30  # Time waited for the other processes writing the database, in seconds
+
+########################### Environment ############################
+
+# Flag marking the tile of the character on the boards of the environment
+# (it is not used by the boards of the engine)
+ENVIRONMENT_PLAYER_FLAG = 8
+
+ENVIRONMENT_MAX_STEPS = 1000  # Number of steps after which a game is stopped
+
+# Rewards of the games: at each step, for each crate placed on a trophy (the same
+# reward is taken back when it is pushed away), and when the level is solved
+ENVIRONMENT_STEP_REWARD = -0.1
+ENVIRONMENT_TROPHY_REWARD = 1.0
+ENVIRONMENT_SOLVED_REWARD = 10.0
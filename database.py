@@ -0,0 +1,249 @@
+"""
+This module contains the database of the levels: a local SQLite file keeping the
+results of the work done on the levels from one run to the next. Each level is
+identified by its digest (see the level_hash method of the engine), so that a
+level has the same entries whatever the file or the collection it comes from.
+
+The database stores the best solution known for each level, the statistics of
+the runs of the solver, the dead tiles of the levels and the best results of the
+player. The writes are buffered and committed in batches, and the database uses
+write-ahead logging, so that several processes (the game and the batch tools)
+can read it while it is written. This module does not depend on pygame.
+"""
+
+import sqlite3
+import time
+
+from core_constants import (DATABASE_BATCH_SIZE, DATABASE_PATH,
+                            DATABASE_TIMEOUT)
+
+# Tables of the database (the digests of the levels are their primary keys,
+# except for the runs of the solver, which are indexed by level)
+DATABASE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solutions (
+    level_hash TEXT PRIMARY KEY,
+    solution TEXT NOT NULL,
+    moves INTEGER NOT NULL,
+    pushes INTEGER NOT NULL,
+    source TEXT,
+    recorded REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS solver_runs (
+    level_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    nodes INTEGER,
+    elapsed REAL,
+    weight REAL,
+    recorded REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS solver_runs_level ON solver_runs (level_hash);
+
+CREATE TABLE IF NOT EXISTS dead_tiles (
+    level_hash TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    tiles BLOB NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS player_bests (
+    level_hash TEXT PRIMARY KEY,
+    moves INTEGER NOT NULL,
+    pushes INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    recorded REAL NOT NULL
+) WITHOUT ROWID;
+'''
+
+# Statements of the buffered writes: a solution (or a game of the player) only
+# replaces the known one if it has fewer moves, or as many moves and fewer pushes
+# (the best game of the player is kept as a whole, with its own duration)
+DATABASE_WRITES = {
+    'solutions': '''
+        INSERT INTO solutions VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (level_hash) DO UPDATE SET
+            solution = excluded.solution, moves = excluded.moves,
+            pushes = excluded.pushes, source = excluded.source,
+            recorded = excluded.recorded
+        WHERE excluded.moves < solutions.moves
+            OR (excluded.moves = solutions.moves AND excluded.pushes < solutions.pushes)
+    ''',
+    'solver_runs': 'INSERT INTO solver_runs VALUES (?, ?, ?, ?, ?, ?)',
+    'dead_tiles': 'INSERT OR REPLACE INTO dead_tiles VALUES (?, ?, ?)',
+    'player_bests': '''
+        INSERT INTO player_bests VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (level_hash) DO UPDATE SET
+            moves = excluded.moves, pushes = excluded.pushes,
+            duration = excluded.duration, recorded = excluded.recorded
+        WHERE excluded.moves < player_bests.moves
+            OR (excluded.moves = player_bests.moves AND excluded.pushes < player_bests.pushes)
+    '''
+}
+
+
+def pack_tiles(state, tiles):
+    """Function returning the values of <tiles> (a bytearray with one byte per
+    tile of the board of <state>) inside the bounds of the level, as a tuple
+    (width, bytes), so that they do not depend on the size of the map."""
+
+    (column, row, width, height) = state.level_bounds()
+
+    return (width, b''.join(
+        tiles[state.index(column, row + line):state.index(column, row + line) + width]
+        for line in range(height)))
+
+
+def unpack_tiles(state, width, packed_tiles):
+    """Function turning the tiles packed by the pack_tiles function back into a
+    bytearray with one byte per tile of the board of <state> (the tiles outside of
+    the bounds of the level are 0). It returns None if the sizes do not match."""
+
+    (column, row, level_width, height) = state.level_bounds()
+
+    if width != level_width or len(packed_tiles) != width * height:
+        return None
+
+    tiles = bytearray(len(state.board))
+
+    for line in range(height):
+        start = state.index(column, row + line)
+        tiles[start:start + width] = packed_tiles[line * width:(line + 1) * width]
+
+    return tiles
+
+
+class LevelDatabase():
+    """Class giving access to the database of the levels. Each process opens its
+    own database: the connection is only used by the thread which created it.
+    The writes are sent in batches of <batch_size> rows (or by the flush method),
+    and the database can be used as a context manager, which flushes and closes it.
+    The rows waiting to be written are not seen by the lookups."""
+
+    def __init__(self, path=DATABASE_PATH, batch_size=DATABASE_BATCH_SIZE,
+                 timeout=DATABASE_TIMEOUT):
+        """Constructor method. <path> is the database file (created if it does not
+        exist), and <timeout> the time waited for the other writers, in seconds."""
+
+        self.path, self.batch_size = path, batch_size
+
+        self.connection = sqlite3.connect(path, timeout=timeout)
+
+        # The readers are not blocked by the writers with write-ahead logging
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.executescript(DATABASE_SCHEMA)
+
+        # Rows waiting to be written, for each table
+        self.pending = {table: [] for table in DATABASE_WRITES}
+
+    def __enter__(self):
+        """Method called when the database is used as a context manager."""
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        """Method flushing and closing the database at the end of the context."""
+        self.close()
+
+    def write(self, table, row):
+        """Method adding a <row> to the rows waiting to be written in the <table>."""
+
+        self.pending[table].append(row)
+
+        if sum(len(rows) for rows in self.pending.values()) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Method writing all the waiting rows, in a single transaction."""
+
+        if not any(self.pending.values()):
+            return
+
+        with self.connection:
+            for table, rows in self.pending.items():
+                if rows:
+                    self.connection.executemany(DATABASE_WRITES[table], rows)
+
+        self.pending = {table: [] for table in DATABASE_WRITES}
+
+    def close(self):
+        """Method writing the waiting rows, and closing the database."""
+
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    def record_solution(self, level_hash, solution, moves, pushes, source=None):
+        """Method recording a <solution> (LURD string) of the level <level_hash>,
+        with its number of <moves> and <pushes>. It only replaces the known solution
+        if it is better. <source> tells where it comes from ('solver', 'player'...)."""
+        self.write('solutions', (level_hash, solution, moves, pushes, source, time.time()))
+
+    def record_solver_run(self, level_hash, status, nodes, elapsed, weight):
+        """Method recording the statistics of a run of the solver on the level
+        <level_hash>: its <status>, the number of <nodes> explored, its duration
+        (<elapsed>, in seconds) and the <weight> of its heuristic."""
+        self.write('solver_runs', (level_hash, status, nodes, elapsed, weight, time.time()))
+
+    def record_dead_tiles(self, state, dead_tiles):
+        """Method recording the <dead_tiles> of the level of <state> (a bytearray
+        with one byte per tile of its board, see the DeadlockDetector class)."""
+        self.write('dead_tiles', (state.level_hash(), *pack_tiles(state, dead_tiles)))
+
+    def record_player_result(self, level_hash, moves, pushes, duration):
+        """Method recording a game of the player completing the level <level_hash>
+        with <moves> moves and <pushes> pushes, in <duration> seconds. It only
+        replaces the best game of the player if it is better (see record_solution)."""
+        self.write('player_bests', (level_hash, moves, pushes, duration, time.time()))
+
+    def solutions(self, level_hashes):
+        """Method returning a dictionary giving the best known solution of each level
+        of the <level_hashes> list which has one, as a tuple (solution, moves, pushes)."""
+
+        level_hashes = list(level_hashes)
+        solutions = {}
+
+        # The digests are looked up in batches, to stay under the limit of
+        # the number of parameters of a statement
+        for start in range(0, len(level_hashes), self.batch_size):
+            batch = level_hashes[start:start + self.batch_size]
+
+            solutions.update(
+                (level_hash, (solution, moves, pushes))
+                for (level_hash, solution, moves, pushes) in self.connection.execute(
+                    'SELECT level_hash, solution, moves, pushes FROM solutions '
+                    'WHERE level_hash IN ({})'.format(', '.join('?' * len(batch))), batch)
+            )
+
+        return solutions
+
+    def solution(self, level_hash):
+        """Method returning the best known solution of the level <level_hash>,
+        as a tuple (solution, moves, pushes), or None if it has not been solved."""
+        return self.solutions([level_hash]).get(level_hash)
+
+    def solver_runs(self, level_hash):
+        """Method returning the runs of the solver on the level <level_hash>, as
+        a list of tuples (status, nodes, elapsed, weight, recorded), the latest first."""
+
+        return self.connection.execute(
+            'SELECT status, nodes, elapsed, weight, recorded FROM solver_runs '
+            'WHERE level_hash = ? ORDER BY recorded DESC', (level_hash,)).fetchall()
+
+    def dead_tiles(self, state):
+        """Method returning the dead tiles of the level of <state> (see the
+        record_dead_tiles method), or None if they are not known."""
+
+        row = self.connection.execute(
+            'SELECT width, tiles FROM dead_tiles WHERE level_hash = ?',
+            (state.level_hash(),)).fetchone()
+
+        return unpack_tiles(state, *row) if row is not None else None
+
+    def player_best(self, level_hash):
+        """Method returning the best game of the player on the level <level_hash>,
+        as a tuple (moves, pushes, duration), or None if it has never been completed."""
+
+        return self.connection.execute(
+            'SELECT moves, pushes, duration FROM player_bests WHERE level_hash = ?',
+            (level_hash,)).fetchone()
@@ -0,0 +1,262 @@
+"""
+This module detects the deadlocks of the game: the positions from which the
+level can no longer be solved, whatever the character does next.
+The DeadlockDetector class precomputes the dead tiles of a level once, and
+then checks the freeze deadlocks after each push and, optionally, the corral
+deadlocks. It works on the boards of the engine (the corrals on bitboards, see
+the flood_bits function of the engine) and does not depend on pygame.
+"""
+
+from core_constants import (CRATE_FLAG, DEADLOCK_CORRAL_CACHE_SIZE,
+                            DEADLOCK_CORRAL_NODES, MOVE_DOWN, MOVE_LEFT,
+                            MOVE_RIGHT, MOVE_UP, TROPHY_FLAG, WALL_FLAG)
+from engine import bit_tiles, flood_bits, push_destinations
+
+
+class DeadlockDetector():
+    """Class detecting the deadlocks of a level, given as a SokobanState object."""
+
+    def __init__(self, state, dead_tiles=None):
+        """Constructor method. It computes the dead tiles of the level:
+        the tiles from which a crate can never be pushed to a trophy, unless they
+        are given as <dead_tiles> (for instance by the database of the levels)."""
+
+        self.offsets = state.offsets
+        self.stride = state.stride
+
+        # Pairs of offsets along which a crate can be pushed (horizontal and vertical)
+        self.axes = (
+            (state.offsets[MOVE_LEFT], state.offsets[MOVE_RIGHT]),
+            (state.offsets[MOVE_UP], state.offsets[MOVE_DOWN])
+        )
+
+        board = state.board
+
+        if dead_tiles is not None:
+            self.dead_tiles = dead_tiles
+            self.compute_bitboards(board)
+            return
+
+        trophies = [index for index, tile in enumerate(board)
+                    if tile & TROPHY_FLAG]
+
+        # Every tile is dead, except the ones from which a trophy can be reached
+        self.dead_tiles = bytearray([1]) * len(board)
+
+        for trophy in trophies:
+            self.dead_tiles[trophy] = 0
+
+        # Breadth-first search from the trophies, pulling the crates backward:
+        # a crate can come from <previous> if the character could stand behind it
+        tiles = list(trophies)
+        position = 0
+
+        while position < len(tiles):
+            tile = tiles[position]
+            position += 1
+
+            for offset in self.offsets:
+                previous = tile - offset
+
+                if self.dead_tiles[previous] \
+                        and not board[previous] & WALL_FLAG \
+                        and not board[previous - offset] & WALL_FLAG:
+                    self.dead_tiles[previous] = 0
+                    tiles.append(previous)
+
+        # The walls are not considered as dead tiles
+        for index, tile in enumerate(board):
+            if tile & WALL_FLAG:
+                self.dead_tiles[index] = 0
+
+        self.compute_bitboards(board)
+
+    def compute_bitboards(self, board):
+        """Method computing the bitboards used by the checks of the corrals:
+        the tiles without walls, the tiles where a crate can be pushed
+        (not dead), and the trophies."""
+
+        self.floor = self.live = self.trophies = 0
+
+        for index, tile in enumerate(board):
+            if not tile & WALL_FLAG:
+                self.floor |= 1 << index
+
+                if not self.dead_tiles[index]:
+                    self.live |= 1 << index
+
+            if tile & TROPHY_FLAG:
+                self.trophies |= 1 << index
+
+        # Results of the checks of the corrals, indexed by the crates of their border,
+        # their tiles and the region of the character (see the corral_blocked method)
+        self.corral_cache = {}
+
+    def is_dead(self, tile):
+        """Method returning True if a crate on the <tile> can never reach a trophy."""
+        return self.dead_tiles[tile] == 1
+
+    def frozen_crates(self, board, tile, frozen):
+        """Method returning True if the crate on the <tile> of the <board> can never
+        move again. The frozen crates found are added to the <frozen> list.
+        The crate is temporarily considered as a wall while its neighbours are
+        checked, which stops the recursion on mutually blocking crates."""
+
+        dead_tiles = self.dead_tiles
+
+        board[tile] |= WALL_FLAG
+
+        try:
+            for (backward, forward) in self.axes:
+                before, after = tile + backward, tile + forward
+
+                # The crate is blocked along this axis by a wall,
+                if board[before] & WALL_FLAG or board[after] & WALL_FLAG:
+                    continue
+
+                # by two dead tiles (pushing it there would be a deadlock),
+                if dead_tiles[before] and dead_tiles[after]:
+                    continue
+
+                # or by a frozen crate (the crates found frozen while checking
+                # a neighbour which is not frozen itself are forgotten)
+                found = len(frozen)
+
+                if board[before] & CRATE_FLAG \
+                        and self.frozen_crates(board, before, frozen):
+                    continue
+
+                del frozen[found:]
+
+                if board[after] & CRATE_FLAG \
+                        and self.frozen_crates(board, after, frozen):
+                    continue
+
+                del frozen[found:]
+
+                return False
+
+        finally:
+            board[tile] &= ~WALL_FLAG
+
+        frozen.append(tile)
+
+        return True
+
+    def is_frozen(self, board, tile):
+        """Method returning True if the crate on the <tile> of the <board>
+        can never move again."""
+        return self.frozen_crates(board, tile, [])
+
+    def freeze_deadlock(self, board, tile):
+        """Method checking the crate which has just been pushed on the <tile>
+        of the <board>. It returns True if this crate is frozen together with
+        crates of which at least one is not placed on a trophy."""
+
+        frozen = []
+
+        if not self.frozen_crates(board, tile, frozen):
+            return False
+
+        return any(not board[crate] & TROPHY_FLAG for crate in frozen)
+
+    def push_deadlock(self, board, tile):
+        """Method checking the crate which has just been pushed on the <tile>
+        of the <board>. It returns True if the push leads to a dead tile
+        or to a freeze deadlock. It only looks around the pushed crate, so that
+        it can be called after each push of a search."""
+
+        return self.dead_tiles[tile] == 1 or self.freeze_deadlock(board, tile)
+
+    def is_deadlocked_crate(self, board, tile):
+        """Method returning True if the crate on the <tile> of the <board>
+        can never be placed on a trophy (used to flag the crates in the game)."""
+
+        if self.dead_tiles[tile]:
+            return True
+
+        return not board[tile] & TROPHY_FLAG and self.is_frozen(board, tile)
+
+    def corrals(self, crates, region):
+        """Method yielding the corrals of a position: the areas of empty tiles that the
+        character, who can reach the tiles of the <region>, cannot enter. The <crates>
+        and the <region> are bitboards (see the flood_bits function of the engine).
+        Each corral is given as a tuple (tiles, crates of its border), both bitboards.
+        The corrals whose crates are all placed, without empty trophy, are omitted."""
+
+        stride, trophies = self.stride, self.trophies
+        unreachable = self.floor & ~crates & ~region
+
+        while unreachable:
+            corral = flood_bits(unreachable & -unreachable, unreachable, stride)
+            unreachable &= ~corral
+
+            border = (corral << 1 | corral >> 1 | corral << stride
+                      | corral >> stride) & crates
+
+            if corral & trophies or border & ~trophies:
+                yield (corral, border)
+
+    def corral_deadlock(self, crates, region, max_nodes=DEADLOCK_CORRAL_NODES):
+        """Method returning True if one of the corrals of the position (see the corrals
+        method) is a deadlock (see the corral_blocked method)."""
+
+        return any(self.corral_blocked(border, corral, region, max_nodes)
+                   for (corral, border) in self.corrals(crates, region))
+
+    def corral_blocked(self, border, corral, region, max_nodes=DEADLOCK_CORRAL_NODES):
+        """Method checking a <corral> (see the corrals method): a small search is run
+        with only the crates of its <border>, the character starting in its <region>.
+        If the character can never enter the corral nor place all these crates on
+        trophies, even without the other crates, the position is a deadlock and True
+        is returned. Searches exceeding <max_nodes> positions are considered as
+        successful, so that the check never prunes wrongly.
+        The results are memoized, as the same corral comes back in many positions."""
+
+        floor, live, stride = self.floor, self.live, self.stride
+        free = floor & ~border
+        region = flood_bits(region & free, free, stride)
+        key = (border, corral, region & -region)
+        blocked = self.corral_cache.get(key)
+
+        if blocked is not None:
+            return blocked
+
+        # Breadth-first search over the positions of these crates (each with the
+        # region of the character), the list growing while we read it
+        positions = [(border, region)]
+        seen = {(border, region & -region)}
+        position = 0
+        blocked = True
+
+        while position < len(positions):
+            (crates, region) = positions[position]
+            position += 1
+
+            if region & corral or not crates & ~self.trophies \
+                    or len(seen) >= max_nodes:
+                blocked = False
+                break
+
+            targets = live & ~crates
+
+            for offset in self.offsets:
+                destinations = push_destinations(region, crates, targets, offset)
+
+                for destination in bit_tiles(destinations):
+                    crate = destination - offset
+                    pushed = crates ^ (1 << crate) ^ (1 << destination)
+                    free = floor & ~pushed
+                    pushed_region = flood_bits(1 << crate, free, stride)
+                    pushed_key = (pushed, pushed_region & -pushed_region)
+
+                    if pushed_key not in seen:
+                        seen.add(pushed_key)
+                        positions.append((pushed, pushed_region))
+
+        if len(self.corral_cache) >= DEADLOCK_CORRAL_CACHE_SIZE:
+            self.corral_cache.clear()
+
+        self.corral_cache[key] = blocked
+
+        return blocked
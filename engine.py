@@ -0,0 +1,488 @@
+"""
+This module contains the rules of the game, independently of pygame.
+The SokobanState class stores a level in a compact form and implements
+the moves, the pushes, the undo and the win test, so that solvers,
+replay checkers and batch tools can play the game without any display.
+"""
+
+import hashlib
+
+from core_constants import (CHARACTER, CRATE, CRATE_FLAG,
+                            LEVEL_HASH_PLAYER_FLAG, LEVEL_HASH_SIZE,
+                            LEVEL_MAX_TILE_SIZE, LEVEL_TILE_SEPARATOR,
+                            MOVE_BLOCKED, MOVE_DELTAS,
+                            MOVE_LETTERS, MOVE_PUSH_FLAG, MOVE_PUSHED,
+                            MOVE_WALKED, TROPHY, TROPHY_FLAG, WALL, WALL_FLAG)
+
+
+def read_level(filename):
+    """Function reading a level file, made of lines of comma-separated tile codes.
+    The map can have any size up to LEVEL_MAX_TILE_SIZE tiles on a side, as long
+    as all its lines have the same number of tiles (the empty lines are ignored).
+    It returns a tuple (background_map, crates, trophies, character_coords):
+    the crates, the trophies and the character are erased from <background_map>,
+    and their (column, row) coordinates are returned separately.
+    A ValueError is raised if the file is not a valid level."""
+
+    background_map = []
+
+    # We open the level file to extract its data
+    with open(filename, 'r', encoding='utf-8') as level_file:
+        for line in level_file:
+            if not line.strip():
+                continue
+
+            # The codes of the tiles are separated with comas
+            tile_codes = line.split(LEVEL_TILE_SEPARATOR)
+
+            # We check if the line contains the same number of tiles as the first one
+            width = len(background_map[0]) if background_map else len(tile_codes)
+
+            if len(tile_codes) != width or width > LEVEL_MAX_TILE_SIZE:
+                raise ValueError('{}: invalid number of tiles on line {}'.format(
+                    filename, len(background_map) + 1))
+
+            # We convert the string values into integers
+            # (int() raises a ValueError by itself if a value is not a number)
+            tile_codes = [int(value) for value in tile_codes]
+
+            # The integers must be between 0 and 5
+            for value in tile_codes:
+                if not 0 <= value <= CHARACTER:
+                    raise ValueError('{}: invalid tile code {}'.format(
+                        filename, value))
+
+            background_map.append(tile_codes)
+
+    # We also check the number of lines
+    if not 0 < len(background_map) <= LEVEL_MAX_TILE_SIZE:
+        raise ValueError('{}: invalid number of lines'.format(filename))
+
+    return split_tile_map(background_map, filename)
+
+
+def split_tile_map(background_map, name=''):
+    """Function extracting the crates, the trophies and the character
+    from a complete tile map, which is modified in place.
+    It returns the same tuple as the read_level function."""
+
+    crates, trophies, character_coords = [], [], ()
+
+    for row, tile_codes in enumerate(background_map):
+        for column, tile_code in enumerate(tile_codes):
+            # We store the coordinates of the crates, trophies and character,
+            # and erase them from the map (they are not part of the background)
+            if tile_code == CRATE:
+                crates.append((column, row))
+
+            elif tile_code == TROPHY:
+                trophies.append((column, row))
+
+            elif tile_code == CHARACTER:
+                character_coords = (column, row)
+
+            else:
+                continue
+
+            tile_codes[column] = 0
+
+    # A level without character cannot be played
+    if not character_coords:
+        raise ValueError('{}: no character in the level'.format(name))
+
+    return (background_map, crates, trophies, character_coords)
+
+
+def pad_level(level, width, height):
+    """Function centering the <level> (a tuple returned by the read_level function)
+    in a map of at least <width> x <height> tiles, filled with walls (so that the
+    rules of the padded level are those of the level file).
+    The levels which are already large enough are returned unchanged."""
+
+    (background_map, crates, trophies, character_coords) = level
+
+    level_height = len(background_map)
+    level_width = len(background_map[0]) if background_map else 0
+
+    if level_width >= width and level_height >= height:
+        return level
+
+    # Number of columns and rows added on the left and at the top
+    (dx, dy) = (max(width - level_width, 0) // 2,
+                max(height - level_height, 0) // 2)
+
+    padded_map = [[WALL] * max(width, level_width)
+                  for _ in range(max(height, level_height))]
+
+    for row, tile_codes in enumerate(background_map):
+        padded_map[row + dy][dx:dx + level_width] = tile_codes
+
+    def move(coords):
+        """Function moving coordinates along with the map."""
+        return (coords[0] + dx, coords[1] + dy)
+
+    return (padded_map, [move(crate) for crate in crates],
+            [move(trophy) for trophy in trophies], move(character_coords))
+
+
+def reachable_tiles(board, offsets, start, obstacles=WALL_FLAG | CRATE_FLAG):
+    """Function returning the list of the tiles of <board> that the character
+    can reach from the <start> tile without pushing any crate (or, more generally,
+    without crossing the tiles which have one of the <obstacles> flags)."""
+
+    visited = bytearray(len(board))
+    visited[start] = 1
+
+    # Breadth-first search: the list grows while we read it
+    tiles = [start]
+    position = 0
+
+    while position < len(tiles):
+        tile = tiles[position]
+        position += 1
+
+        for offset in offsets:
+            next_tile = tile + offset
+
+            if not visited[next_tile] and not board[next_tile] & obstacles:
+                visited[next_tile] = 1
+                tiles.append(next_tile)
+
+    return tiles
+
+
+def flood_bits(seed, area, stride):
+    """Function returning the tiles of the <area> connected to the tiles of <seed>,
+    on a board of <stride> tiles per row. The sets of tiles are bitboards: integers
+    whose bit of index i is set if the tile i belongs to the set. It is the equivalent
+    of the reachable_tiles function, where each step adds all the neighbours at once."""
+
+    tiles = seed & area
+
+    while True:
+        grown = (tiles | tiles << 1 | tiles >> 1
+                 | tiles << stride | tiles >> stride) & area
+
+        if grown == tiles:
+            return tiles
+
+        tiles = grown
+
+
+def bit_tiles(bits):
+    """Function yielding the indexes of the tiles of the bitboard <bits>,
+    in increasing order."""
+
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def push_destinations(region, crates, targets, offset):
+    """Function returning the bitboard of the tiles to which the <crates> can be
+    pushed by the character standing in its <region>, along the <offset> of a move,
+    among the <targets> (all bitboards)."""
+
+    # Tiles behind the crates adjacent to the region, in the direction
+    # of the move (the shifts of a bitboard cannot be negative)
+    if offset > 0:
+        return (region << offset & crates) << offset & targets
+
+    return (region >> -offset & crates) >> -offset & targets
+
+
+class SokobanState():
+    """Class storing the state of a level (walls, trophies, crates and character)
+    and applying the rules of the game to it.
+
+    The board is a flat bytearray, with one byte of flags (WALL_FLAG, TROPHY_FLAG
+    and CRATE_FLAG) per tile. It is surrounded by a border of walls, so that
+    the moves never have to check the limits of the map. The tiles are designated
+    by their index in this bytearray (see the index and coords methods)."""
+
+    __slots__ = ('width', 'height', 'stride', 'board', 'offsets', 'crates',
+                 'crates_on_trophies', 'player', 'history',
+                 'initial_crates', 'initial_player')
+
+    def __init__(self, background_map, crates, trophies, character_coords):
+        """Constructor method. It takes the tuple returned by the read_level function:
+        every non-empty tile of <background_map> is considered as a wall."""
+
+        self.height = len(background_map)
+        self.width = len(background_map[0]) if background_map else 0
+
+        # Number of tiles in a row of the board (including the border)
+        self.stride = self.width + 2
+
+        # Offsets of the index of a tile for each move code
+        self.offsets = tuple(dx + dy * self.stride for (dx, dy) in MOVE_DELTAS)
+
+        # The board is filled with walls, then we dig the empty tiles
+        self.board = bytearray([WALL_FLAG]) * \
+            (self.stride * (self.height + 2))
+
+        for row, tile_codes in enumerate(background_map):
+            for column, tile_code in enumerate(tile_codes):
+                if not tile_code:
+                    self.board[self.index(column, row)] = 0
+
+        for (column, row) in trophies:
+            self.board[self.index(column, row)] |= TROPHY_FLAG
+
+        # Initial indexes of the crates and of the character (used to reset the state)
+        self.initial_crates = [self.index(column, row)
+                               for (column, row) in crates]
+        self.initial_player = self.index(*character_coords)
+
+        # Set of the indexes of the crates
+        self.crates = set()
+
+        # Number of crates placed on a trophy, maintained at each push
+        self.crates_on_trophies = 0
+
+        # Index of the tile of the character
+        self.player = self.initial_player
+
+        # History of the moves: each byte is a move code,
+        # combined with MOVE_PUSH_FLAG if the move pushed a crate
+        self.history = bytearray()
+
+        self.reset()
+
+    @classmethod
+    def from_file(cls, filename):
+        """Method creating a state from a level file."""
+        return cls(*read_level(filename))
+
+    def index(self, column, row):
+        """Method returning the index of the tile at (<column>, <row>)."""
+        return (row + 1) * self.stride + column + 1
+
+    def coords(self, index):
+        """Method returning the (column, row) coordinates of the tile at <index>."""
+        (row, column) = divmod(index, self.stride)
+        return (column - 1, row - 1)
+
+    def reset(self):
+        """Method putting the crates and the character back to their initial positions."""
+
+        self.place(self.initial_crates, self.initial_player)
+        self.history = bytearray()
+
+    def place(self, crates, player):
+        """Method putting the crates on the tiles of the <crates> list, and the
+        character on the <player> tile, without checking the rules of the game.
+        The history of the moves is left unchanged."""
+
+        board = self.board
+
+        for index in self.crates:
+            board[index] &= ~CRATE_FLAG
+
+        self.crates = set(crates)
+        self.crates_on_trophies = 0
+
+        for index in self.crates:
+            board[index] |= CRATE_FLAG
+
+            if board[index] & TROPHY_FLAG:
+                self.crates_on_trophies += 1
+
+        self.player = player
+
+    def copy(self):
+        """Method returning an independent copy of the state."""
+
+        state = SokobanState.__new__(SokobanState)
+
+        for name in SokobanState.__slots__:
+            setattr(state, name, getattr(self, name))
+
+        # The mutable attributes must not be shared
+        state.board = bytearray(self.board)
+        state.crates = set(self.crates)
+        state.history = bytearray(self.history)
+
+        return state
+
+    def move_crate(self, source, destination):
+        """Method moving the crate at <source> to <destination>,
+        without checking the rules of the game."""
+
+        board = self.board
+
+        board[source] &= ~CRATE_FLAG
+        board[destination] |= CRATE_FLAG
+
+        self.crates.remove(source)
+        self.crates.add(destination)
+
+        # We update the number of crates placed on a trophy
+        if board[source] & TROPHY_FLAG:
+            self.crates_on_trophies -= 1
+
+        if board[destination] & TROPHY_FLAG:
+            self.crates_on_trophies += 1
+
+    def move(self, move):
+        """Method moving the character with the given <move> code.
+        It returns MOVE_BLOCKED if the move is impossible,
+        and MOVE_WALKED or MOVE_PUSHED otherwise."""
+
+        board = self.board
+        offset = self.offsets[move]
+        next_index = self.player + offset
+        next_tile = board[next_index]
+
+        # The character cannot walk through walls
+        if next_tile & WALL_FLAG:
+            return MOVE_BLOCKED
+
+        if next_tile & CRATE_FLAG:
+            # The crate can only be pushed on an empty tile
+            if board[next_index + offset] & (WALL_FLAG | CRATE_FLAG):
+                return MOVE_BLOCKED
+
+            self.move_crate(next_index, next_index + offset)
+            self.player = next_index
+            self.history.append(move | MOVE_PUSH_FLAG)
+
+            return MOVE_PUSHED
+
+        self.player = next_index
+        self.history.append(move)
+
+        return MOVE_WALKED
+
+    def undo(self):
+        """Method cancelling the last move of the history.
+        It returns the cancelled entry of the history (the move code,
+        combined with MOVE_PUSH_FLAG if a crate was pushed),
+        or None if the history is empty."""
+
+        if not self.history:
+            return None
+
+        last_move = self.history.pop()
+        offset = self.offsets[last_move & ~MOVE_PUSH_FLAG]
+
+        # If a crate was pushed, we pull it back to the tile of the character
+        if last_move & MOVE_PUSH_FLAG:
+            self.move_crate(self.player + offset, self.player)
+
+        self.player -= offset
+
+        return last_move
+
+    def path_to(self, target):
+        """Method returning the shortest list of move codes leading the character
+        to the <target> tile without pushing any crate, or None if it is not reachable."""
+
+        board, offsets = self.board, self.offsets
+        obstacles = WALL_FLAG | CRATE_FLAG
+
+        # For each visited tile, we store the move code used to reach it
+        # (the start tile is marked with a value which is not a move code)
+        previous_moves = {self.player: -1}
+        tiles = [self.player]
+        position = 0
+
+        while position < len(tiles) and target not in previous_moves:
+            tile = tiles[position]
+            position += 1
+
+            for move, offset in enumerate(offsets):
+                next_tile = tile + offset
+
+                if next_tile not in previous_moves and not board[next_tile] & obstacles:
+                    previous_moves[next_tile] = move
+                    tiles.append(next_tile)
+
+        if target not in previous_moves:
+            return None
+
+        # We walk back from the target to build the path
+        path = []
+
+        while target != self.player:
+            move = previous_moves[target]
+            path.append(move)
+            target -= offsets[move]
+
+        path.reverse()
+
+        return path
+
+    def level_bounds(self):
+        """Method returning the rectangle (column, row, width, height) of the level in
+        its map: the rows and columns around it, made of walls and of empty tiles
+        out of reach of the character, are left out. The rectangle is thus the same
+        whether the level is centered in a larger map (with walls or empty tiles) or not."""
+
+        # Tiles of the level: the ones that the character could reach if there were
+        # no crates, the trophies and the crates
+        tiles = reachable_tiles(self.board, self.offsets, self.initial_player, WALL_FLAG)
+        tiles += [index for (index, value) in enumerate(self.board) if value & TROPHY_FLAG]
+        tiles += self.initial_crates
+
+        coords = [self.coords(index) for index in tiles]
+        columns, rows = [column for (column, _) in coords], [row for (_, row) in coords]
+
+        return (min(columns), min(rows),
+                max(columns) - min(columns) + 1, max(rows) - min(rows) + 1)
+
+    def level_hash(self):
+        """Method returning a digest (hexadecimal string) identifying the level:
+        its walls, its trophies and the initial positions of the crates and of the
+        character. Only the tiles inside the bounds of the level are taken into
+        account (see the level_bounds method), and the empty tiles out of reach of
+        the character count as walls, so that a level has the same digest whether
+        it is centered in a larger map or not."""
+
+        # Tiles of the level in their initial state (the character is marked
+        # with a flag which is not used by the board, and the tiles out of reach
+        # of the character are walls)
+        grid = self.board.translate(bytes(
+            value & ~CRATE_FLAG or WALL_FLAG for value in range(256)))
+
+        for index in reachable_tiles(self.board, self.offsets, self.initial_player, WALL_FLAG):
+            grid[index] &= ~WALL_FLAG
+
+        for index in self.initial_crates:
+            grid[index] = grid[index] & ~WALL_FLAG | CRATE_FLAG
+
+        grid[self.initial_player] |= LEVEL_HASH_PLAYER_FLAG
+
+        (column, row, width, height) = self.level_bounds()
+
+        digest = hashlib.blake2b(digest_size=LEVEL_HASH_SIZE)
+        digest.update('{}x{}:'.format(width, height).encode())
+
+        for line in range(row, row + height):
+            start = self.index(column, line)
+            digest.update(grid[start:start + width])
+
+        return digest.hexdigest()
+
+    def is_solved(self):
+        """Method returning True if all the crates are placed on a trophy."""
+        return self.crates_on_trophies == len(self.crates)
+
+    def lurd(self):
+        """Method returning the history of the moves in the LURD notation
+        (the moves pushing a crate are in upper case)."""
+
+        return ''.join(
+            MOVE_LETTERS[move & ~MOVE_PUSH_FLAG].upper()
+            if move & MOVE_PUSH_FLAG else MOVE_LETTERS[move]
+            for move in self.history
+        )
+
+    def move_count(self):
+        """Method returning the number of moves done since the initial position."""
+        return len(self.history)
+
+    def push_count(self):
+        """Method returning the number of pushes done since the initial position."""
+        return sum(1 for move in self.history if move & MOVE_PUSH_FLAG)
@@ -0,0 +1,234 @@
+"""
+This module contains an environment in which automated players are trained on
+the levels, without any display. It plays a batch of games at once: the boards
+of all the games are stacked in a single NumPy array, and each step moves the
+characters of all the games with a vector of actions, using the same rules as
+the engine (and thus as the game).
+
+The API follows the vectorized environments of Gym: the step method returns
+the observations, the rewards and the done flags of all the games, and the games
+which are over are started again at once, on a level drawn from the pool.
+NumPy is needed by this module only.
+"""
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional: only this module and the level analyzer need it
+    numpy = None
+
+from core_constants import (CRATE_FLAG, ENVIRONMENT_MAX_STEPS,
+                            ENVIRONMENT_PLAYER_FLAG, ENVIRONMENT_SOLVED_REWARD,
+                            ENVIRONMENT_STEP_REWARD, ENVIRONMENT_TROPHY_REWARD,
+                            LEVELS_PATH, MOVE_DELTAS, TROPHY_FLAG, WALL_FLAG)
+from engine import SokobanState
+from level_collection import read_level_reference
+from solve_levels import find_levels
+
+# Number of rows and columns of walls around the boards: the tile behind the
+# tile in front of the character is always inside the board
+ENVIRONMENT_MARGIN = 2
+
+
+class LevelPool():
+    """Class storing the levels on which the games are played, as a stack of
+    boards of the same size (the smaller levels are surrounded by walls)."""
+
+    def __init__(self, references):
+        """Constructor method. <references> is the list of the level files (or of
+        the references of levels of collections). The invalid levels are left out."""
+
+        if numpy is None:
+            raise ValueError('NumPy is needed by the environment')
+
+        states = []
+
+        for reference in references:
+            try:
+                states.append((reference, SokobanState(*read_level_reference(reference))))
+
+            except (OSError, ValueError):
+                pass
+
+        if not states:
+            raise ValueError('no valid level in the pool')
+
+        self.references = [reference for (reference, _) in states]
+
+        # Size of the boards (the boards of the engine already have a border of walls)
+        self.height = max(state.height for (_, state) in states) + 2 * ENVIRONMENT_MARGIN
+        self.width = max(state.width for (_, state) in states) + 2 * ENVIRONMENT_MARGIN
+
+        # Tiles of each level (flags of the engine, and ENVIRONMENT_PLAYER_FLAG
+        # on the tile of the character), and index of the tile of the character
+        self.boards = numpy.full((len(states), self.height, self.width), WALL_FLAG, numpy.uint8)
+        self.players = numpy.zeros(len(states), numpy.int64)
+
+        # Number of crates of each level, and of crates initially placed on a trophy
+        self.crates = numpy.zeros(len(states), numpy.int32)
+        self.crates_on_trophies = numpy.zeros(len(states), numpy.int32)
+
+        for number, (_, state) in enumerate(states):
+            shift = ENVIRONMENT_MARGIN - 1
+            board = numpy.frombuffer(bytes(state.board), numpy.uint8).reshape(
+                state.height + 2, state.stride)
+
+            self.boards[number, shift:shift + state.height + 2,
+                        shift:shift + state.stride] = board
+
+            (column, row) = state.coords(state.player)
+            self.players[number] = (row + ENVIRONMENT_MARGIN) * self.width \
+                + column + ENVIRONMENT_MARGIN
+            self.boards[number].flat[self.players[number]] |= ENVIRONMENT_PLAYER_FLAG
+
+            self.crates[number] = len(state.crates)
+            self.crates_on_trophies[number] = state.crates_on_trophies
+
+    def __len__(self):
+        """Method returning the number of levels of the pool."""
+        return len(self.references)
+
+
+class SokobanEnvironment():
+    """Class playing <count> games at once. The observation of the games is the
+    stack of their boards: an array of shape (count, height, width), with the flags
+    of the engine for each tile (WALL_FLAG, TROPHY_FLAG and CRATE_FLAG), and
+    ENVIRONMENT_PLAYER_FLAG on the tile of the character. This array is updated in
+    place by the steps (it has to be copied to be kept). The actions are the move
+    codes of the engine (left, up, right and down)."""
+
+    # Number of actions of the games
+    action_count = len(MOVE_DELTAS)
+
+    def __init__(self, count, levels=None, max_steps=ENVIRONMENT_MAX_STEPS, seed=None):
+        """Constructor method. <levels> is the list of the level files, directories or
+        glob patterns of the pool (the levels directory by default), or a LevelPool.
+        A game is over when the level is solved, or after <max_steps> steps.
+        <seed> initializes the random generator choosing the levels."""
+
+        self.pool = levels if isinstance(levels, LevelPool) \
+            else LevelPool(find_levels(levels or [LEVELS_PATH]))
+
+        self.count, self.max_steps = count, max_steps
+        self.random = numpy.random.default_rng(seed)
+
+        (height, width) = (self.pool.height, self.pool.width)
+
+        # Boards of the games, and the same array with the tiles of all the games
+        # in a row (the tiles of the games are designated by their index in it)
+        self.boards = numpy.zeros((count, height, width), numpy.uint8)
+        self.tiles = self.boards.reshape(-1)
+
+        # Offset of the index of a tile for each action
+        self.offsets = numpy.array([dx + dy * width for (dx, dy) in MOVE_DELTAS], numpy.int64)
+
+        # Index of the first tile of each game
+        self.starts = numpy.arange(count, dtype=numpy.int64) * height * width
+
+        # Level of each game, index of the tile of the character, number of crates,
+        # number of crates on a trophy, and number of steps since the level started
+        self.levels = numpy.zeros(count, numpy.int64)
+        self.players = numpy.zeros(count, numpy.int64)
+        self.crates = numpy.zeros(count, numpy.int32)
+        self.crates_on_trophies = numpy.zeros(count, numpy.int32)
+        self.steps = numpy.zeros(count, numpy.int32)
+
+        self.reset()
+
+    def reset(self, games=None):
+        """Method starting the <games> (an array of game numbers, or a boolean mask
+        of the games) again on new levels drawn from the pool, or all of them
+        if <games> is None. It returns the observations."""
+
+        if games is None:
+            games = numpy.arange(self.count)
+
+        elif numpy.asarray(games).dtype == bool:
+            games = numpy.flatnonzero(games)
+
+        levels = self.random.integers(len(self.pool), size=len(games))
+
+        self.levels[games] = levels
+        self.boards[games] = self.pool.boards[levels]
+        self.players[games] = self.starts[games] + self.pool.players[levels]
+        self.crates[games] = self.pool.crates[levels]
+        self.crates_on_trophies[games] = self.pool.crates_on_trophies[levels]
+        self.steps[games] = 0
+
+        return self.boards
+
+    def step(self, actions):
+        """Method playing one move in each game: <actions> is the array of the move
+        codes, one per game. It returns a tuple (observations, rewards, dones, infos):
+        the rewards and the done flags are arrays with one value per game, and infos
+        is a dictionary of arrays telling which games have been 'solved', which ones
+        have been stopped after the maximum number of steps ('truncated'), and the
+        levels of the pool on which the games were played ('levels'). The games which
+        are over are started again on a new level, before the observations are returned."""
+
+        tiles = self.tiles
+        offsets = self.offsets[actions]
+
+        # Tile in front of the character, and the one behind it
+        targets = self.players + offsets
+        target_tiles = tiles[targets]
+        behind = targets + offsets
+
+        # The character walks on the empty tiles, and pushes the crates which have
+        # an empty tile behind them (the same rules as the move method of the engine)
+        walked = (target_tiles & (WALL_FLAG | CRATE_FLAG)) == 0
+        pushed = ((target_tiles & CRATE_FLAG) != 0) \
+            & ((tiles[behind] & (WALL_FLAG | CRATE_FLAG)) == 0)
+
+        pushing_games = numpy.flatnonzero(pushed)
+        sources, destinations = targets[pushing_games], behind[pushing_games]
+
+        tiles[sources] &= ~numpy.uint8(CRATE_FLAG)
+        tiles[destinations] |= CRATE_FLAG
+
+        # Change of the number of crates placed on a trophy
+        placed = numpy.zeros(self.count, numpy.int32)
+        placed[pushing_games] = (tiles[destinations] & TROPHY_FLAG).astype(numpy.int32) \
+            - (tiles[sources] & TROPHY_FLAG)
+        placed >>= 1
+        self.crates_on_trophies += placed
+
+        moving_games = numpy.flatnonzero(walked | pushed)
+        tiles[self.players[moving_games]] &= ~numpy.uint8(ENVIRONMENT_PLAYER_FLAG)
+        self.players[moving_games] = targets[moving_games]
+        tiles[self.players[moving_games]] |= ENVIRONMENT_PLAYER_FLAG
+
+        self.steps += 1
+
+        solved = self.crates_on_trophies == self.crates
+        truncated = ~solved & (self.steps >= self.max_steps)
+        dones = solved | truncated
+
+        rewards = ENVIRONMENT_STEP_REWARD + ENVIRONMENT_TROPHY_REWARD * placed \
+            + ENVIRONMENT_SOLVED_REWARD * solved
+
+        infos = {'solved': solved, 'truncated': truncated, 'levels': self.levels.copy()}
+
+        if dones.any():
+            self.reset(dones)
+
+        return (self.boards, rewards.astype(numpy.float32), dones, infos)
+
+    def planes(self):
+        """Method returning the observations as a boolean array of shape
+        (count, 4, height, width): the walls, the crates, the trophies and the
+        character of each game (the form expected by most neural networks)."""
+
+        return numpy.stack([
+            (self.boards & flag) != 0
+            for flag in (WALL_FLAG, CRATE_FLAG, TROPHY_FLAG, ENVIRONMENT_PLAYER_FLAG)
+        ], axis=1)
+
+    def state(self, game):
+        """Method returning the position of the <game> number, as a tuple
+        (crates, player) of (column, row) coordinates in its board."""
+
+        board = self.boards[game]
+        (rows, columns) = numpy.nonzero(board & CRATE_FLAG)
+        (row, column) = divmod(int(self.players[game] - self.starts[game]), self.pool.width)
+
+        return (sorted(zip(columns.tolist(), rows.tolist())), (column, row))
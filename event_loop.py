@@ -0,0 +1,111 @@
+"""
+This module contains the loop driver shared by the menus and the game.
+It blocks on the event queue when nothing is animated, so that an idle
+window uses almost no CPU, and caps the frame rate otherwise.
+"""
+
+import time
+
+import pygame
+
+from constants import LOOP_IDLE_TIMEOUT, LOOP_MAX_FPS
+
+
+class LoopDriver():
+    """Class pacing the frames of the main loops, and measuring
+    their frame rate and the CPU time they use."""
+
+    def __init__(self, max_fps=LOOP_MAX_FPS, idle_timeout=LOOP_IDLE_TIMEOUT,
+                 launch_time=None):
+        """Constructor method. <max_fps> is the maximum frame rate when something
+        is animated, and <idle_timeout> the maximum time (in milliseconds) spent
+        waiting for an event when nothing is animated. <launch_time> is the value
+        of time.perf_counter() when the application started (by default, the
+        creation of the driver): the time to the first frame is measured from it."""
+
+        self.max_fps = max_fps
+        self.idle_timeout = idle_timeout
+
+        # Clock used to cap and measure the frame rate
+        self.clock = pygame.time.Clock()
+
+        # CPU time of the process when the driver was created
+        self.start_cpu_time = time.process_time()
+        self.start_time = time.perf_counter()
+
+        # Time (in seconds) between the launch and the first frame drawn,
+        # and functions waiting for the first frame
+        self.launch_time = launch_time if launch_time is not None else self.start_time
+        self.time_to_first_frame = None
+        self.first_frame_callbacks = []
+
+    def events(self, animating=False):
+        """Method returning the list of the events of the next frame.
+        If <animating> is False, it waits until an event arrives (or until the
+        idle timeout expires); otherwise it waits for the next frame at the
+        maximum frame rate. The consecutive MOUSEMOTION events are coalesced:
+        only the last one of each burst is returned."""
+
+        if animating:
+            self.clock.tick(self.max_fps)
+            events = pygame.event.get()
+
+        else:
+            # We block until an event arrives, then we take the pending ones
+            event = pygame.event.wait(self.idle_timeout)
+            events = [event] if event.type != pygame.NOEVENT else []
+            events.extend(pygame.event.get())
+
+            # The clock only measures the frame rate here
+            self.clock.tick()
+
+        # We drop the mouse motions followed by another one
+        return [
+            event for index, event in enumerate(events)
+            if event.type != pygame.MOUSEMOTION
+            or index + 1 == len(events)
+            or events[index + 1].type != pygame.MOUSEMOTION
+        ]
+
+    def call_after_first_frame(self, function):
+        """Method calling <function> once the first frame has been drawn
+        (at once if it has already been drawn)."""
+
+        if self.time_to_first_frame is None:
+            self.first_frame_callbacks.append(function)
+
+        else:
+            function()
+
+    def frame_drawn(self):
+        """Method called by the views each time they update the display.
+        The first time, it measures the time to the first frame."""
+
+        if self.time_to_first_frame is not None:
+            return
+
+        self.time_to_first_frame = time.perf_counter() - self.launch_time
+
+        for function in self.first_frame_callbacks:
+            function()
+
+        self.first_frame_callbacks = []
+
+    @property
+    def fps(self):
+        """Measured frame rate (averaged over the last frames)."""
+        return self.clock.get_fps()
+
+    @property
+    def cpu_time(self):
+        """CPU time (in seconds) used by the process since the driver was created."""
+        return time.process_time() - self.start_cpu_time
+
+    @property
+    def cpu_usage(self):
+        """Proportion of the elapsed time spent using the CPU since
+        the driver was created (between 0 and 1 for a single thread)."""
+
+        elapsed = time.perf_counter() - self.start_time
+
+        return self.cpu_time / elapsed if elapsed > 0 else 0.0
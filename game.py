@@ -3,132 +3,172 @@ This module contains the different classes
 which manage the game itself.
 """
 
-import collections
+import hashlib
 import sys
+import time
+from collections import OrderedDict
+
 import pygame
-from constants import (BACKGROUND_TEXTURES_PATH, CHARACTER,
-                       CHARACTER_DIRECTIONS, CHARACTERS_INFO, CRATE,
+from assets import asset_cache
+from constants import (BACKGROUND_CHUNK_CACHE_SIZE, BACKGROUND_CHUNK_SIZE,
+                       BACKGROUND_TEXTURES_PATH, CHARACTER_DIRECTIONS,
+                       CHARACTER_MOVE_KEYS, CHARACTERS_INFO,
                        GAME_BUTTONS_HEIGHT, GAME_BUTTONS_WIDTH,
-                       GAME_BUTTONS_Y_MARGIN, RED_CRATE, TILE_SIZE, TROPHY,
-                       WINDOW_SIZE, WINDOW_TILE_SIZE, CHARACTER_DIRECTIONS_OPPOSITE,
-                       UI_FONT_PATH, UI_TEXT_COLOR)
-from user_interface import TextButton
+                       GAME_DEADLOCK_ALPHA_VALUE, GAME_DEADLOCK_COLOR,
+                       GAME_HINT_ALPHA_VALUE, GAME_HINT_COLOR,
+                       GAME_HINT_DIRECTIONS, GAME_HINT_KEY, GAME_HINT_MESSAGES,
+                       GAME_MESSAGE_POSITION, GAME_MOVE_COUNT_POSITION,
+                       GAME_PLAN_MESSAGES, GAME_REDO_KEY,
+                       GAME_TIMELINE_HEIGHT, GAME_TIMELINE_X_MARGIN,
+                       GAME_TIMELINE_Y_MARGIN, GAME_UNDO_KEY, GAME_VIEW,
+                       GAME_WALK_SPEED, HINT_EVENT,
+                       GAME_BUTTONS_Y_MARGIN, LEVEL_CHOICE_MENU_VIEW,
+                       LEVEL_COMPLETE_EVENT, PLAN_EVENT, PROFILER_BACKGROUND,
+                       PROFILER_DISPLAY, PROFILER_EVENTS, PROFILER_HOVER,
+                       PROFILER_OVERLAY, PROFILER_SPRITES, PROFILER_TOGGLE_KEY,
+                       PROFILER_TROPHIES, TILE_SIZE,
+                       WINDOW_SIZE, WINDOW_TILE_SIZE, UI_FONT_PATH, UI_TEXT_COLOR)
+from core_constants import (CRATE, CRATE_FLAG, DATABASE_PATH, MOVE_BLOCKED,
+                            MOVE_PUSH_FLAG, MOVE_PUSHED, PATHFINDING_FRAME_TILES,
+                            RED_CRATE, REPLAY_DEFAULT_SPEED, TROPHY)
+from database import LevelDatabase
+from deadlock import DeadlockDetector
+from engine import SokobanState, pad_level
+from event_loop import LoopDriver
+from hints import HintEngine, solution_pushes
+from history import MoveHistory
+from level_cache import file_signature, load_level, save_background
+from pathfinding import PathFinder
+from profiler import profiler
+from push_planner import PushPlanner
+from replay import Replay, save_replay
+from user_interface import TextButton, Timeline
+from viewport import Viewport
 
 
 def load_background_texture(tile_code):
-    """Utility function loading the texture of
-    a certin tile in the background textures"""
+    """Utility function returning the texture of
+    a certin tile in the background textures (shared by the asset cache)"""
 
-    # Textures of the background
-    background_textures = pygame.image.load(
-        BACKGROUND_TEXTURES_PATH).convert_alpha()
+    # We extract the portion we want from the textures of the background
+    return asset_cache.region(
+        BACKGROUND_TEXTURES_PATH,
+        (tile_code * TILE_SIZE, 0, TILE_SIZE, TILE_SIZE)
+    )
 
-    # We intialize the resulting texture
-    result = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
 
-    # We extract the portion we want
-    result.blit(
-        background_textures,
-        (0, 0),
-        pygame.Rect(tile_code * TILE_SIZE, 0, TILE_SIZE, TILE_SIZE)
-    )
+def background_tag():
+    """Utility function returning a non-zero integer identifying the textures
+    of the background and the pixel format of the display, so that the backgrounds
+    pre-rendered with other textures (or another format) are not used"""
+
+    image = pygame.Surface((TILE_SIZE, TILE_SIZE))
+
+    digest = hashlib.blake2b(repr((
+        file_signature(BACKGROUND_TEXTURES_PATH), TILE_SIZE,
+        image.get_bitsize(), image.get_masks()
+    )).encode(), digest_size=8)
 
-    return result
+    return int.from_bytes(digest.digest(), 'little') or 1
 
 
-class BackgroundManager(pygame.sprite.Sprite):
-    """Class managing the background of the game."""
+class BackgroundManager():
+    """Class managing the background of the game. The maps can be much larger
+    than the window, so the background is rendered by chunks of tiles, only when
+    they become visible, and only the most recently used chunks are kept."""
 
     def __init__(self):
         """Constructor method. It initializes the different attributes of the background."""
 
-        # We first call the parent constructor
-        pygame.sprite.Sprite.__init__(self)
-
         # Initial coordinates of the character
         self.initial_character_coords = ()
 
         # Initial coordinates of the crates and trophies on the map
         self.initial_crates, self.initial_trophies = [], []
 
-        # Codes of the tiles of the background map
+        # Codes of the tiles of the background map, and size of the map (in tiles)
         self.background_map = []
+        self.columns, self.rows = 0, 0
 
-        # Image of the background
-        self.image = pygame.Surface(WINDOW_SIZE)
-        self.rect = pygame.Rect((0, 0), WINDOW_SIZE)
+        # Size of the chunks (in tiles), and rendered chunks by (column, row)
+        # coordinates, from the least to the most recently used
+        self.chunk_columns, self.chunk_rows = BACKGROUND_CHUNK_SIZE, BACKGROUND_CHUNK_SIZE
+        self.chunks = OrderedDict()
 
-    def parse(self, filename):
-        """Method parsing the background image from a level file."""
+        # Tag identifying the textures and the pixel format of the background,
+        # saved with the pre-rendered backgrounds in the level cache
+        self.background_tag = background_tag()
 
-        # We reset the different attributes, so that the user can call this method multiple times
-        self.initial_crates, self.initial_trophies, self.background_map = [], [], []
+    def parse(self, filename):
+        """Method parsing the background of a level file. The maps smaller than the
+        window are centered in a map of the size of the window."""
 
-        # Variable containing the textures used for the background image
-        background_textures = pygame.image.load(
-            BACKGROUND_TEXTURES_PATH).convert()
+        # We read the compiled level from the cache (the level file is only parsed
+        # if it has changed, with the rules of the format implemented in the engine)
+        # If an error occurs, we return False
+        try:
+            level = load_level(filename)
 
-        # Variable used to report an error
-        error = False
+        except ValueError:
+            self.initial_crates, self.initial_trophies, self.background_map = [], [], []
+            return False
 
-        # We open the level file to extract its data
-        with open(filename, 'r') as level_file:
-            for line in level_file:
-                # We first extract the codes of this line as a list of string objects
-                # The codes of the tiles are separated with comas
-                tile_codes = line.split(',')
+        (self.background_map, self.initial_crates, self.initial_trophies,
+         self.initial_character_coords) = pad_level(
+             level.to_level(), WINDOW_TILE_SIZE, WINDOW_TILE_SIZE)
 
-                # We check if the line contains the required number of tiles
-                if len(tile_codes) != WINDOW_TILE_SIZE:
-                    error = True
-                    break
+        self.rows, self.columns = len(self.background_map), len(self.background_map[0])
+        self.chunks.clear()
 
-                # We convert the string values into integers
-                try:
-                    for index, value in enumerate(tile_codes):
-                        tile_codes[index] = int(value)
+        # The maps larger than the window are rendered by chunks, when they are displayed
+        if (self.columns, self.rows) != (WINDOW_TILE_SIZE, WINDOW_TILE_SIZE):
+            self.chunk_columns, self.chunk_rows = BACKGROUND_CHUNK_SIZE, BACKGROUND_CHUNK_SIZE
+            return True
 
-                        # If the integer is not between 0 and 5, we raise a value error
-                        if not 0 <= tile_codes[index] <= CHARACTER:
-                            raise ValueError
+        # The other ones are made of a single chunk, which is saved in the level cache
+        self.chunk_columns, self.chunk_rows = self.columns, self.rows
+        image = self.chunks[(0, 0)] = pygame.Surface(WINDOW_SIZE)
 
-                except ValueError:
-                    error = True
-                    break
+        # If the background has already been rendered with the same textures,
+        # we copy its pixels at once
+        if level.background_tag == self.background_tag \
+                and level.background_size == WINDOW_SIZE \
+                and len(level.background_pixels) == image.get_buffer().length:
+            memoryview(image.get_view('1')).cast('B')[:] = level.background_pixels
 
-                self.background_map.append(tile_codes)
+            return True
 
-        # If an error occured, or if the number of lines is not valid, we return False
-        if error or len(self.background_map) != WINDOW_TILE_SIZE:
-            return False
+        self.render_chunk(image, 0, 0)
 
-        # Now we create the background image from the <background_map> variable
-        for row in range(WINDOW_TILE_SIZE):
-            for column in range(WINDOW_TILE_SIZE):
-                # Variable containing the code of the tile we will finally display
-                displayed_tile = 0
+        # We save the rendered background in the cache, for the next times
+        save_background(level, filename, self.background_tag, WINDOW_SIZE,
+                        image.get_buffer().raw)
 
-                # If the tile code corresponds to a crate or a trophy,
-                # we do not want to add it to the background.
-                # Instead, we store its coordinates for later use
-                if self.background_map[row][column] == CRATE:
-                    self.initial_crates.append((column, row))
+        return True
 
-                elif self.background_map[row][column] == TROPHY:
-                    self.initial_trophies.append((column, row))
+    def render_chunk(self, image, chunk_column, chunk_row):
+        """Method rendering the tiles of the chunk at (<chunk_column>, <chunk_row>)
+        on its <image>."""
 
-                elif self.background_map[row][column] == CHARACTER:
-                    self.initial_character_coords = (column, row)
+        # Variable containing the textures used for the background image
+        # (they are only read from the disk for the first level)
+        background_textures = asset_cache.image(
+            BACKGROUND_TEXTURES_PATH, alpha=False)
 
-                else:
-                    displayed_tile = self.background_map[row][column]
+        first_column = chunk_column * self.chunk_columns
+        first_row = chunk_row * self.chunk_rows
 
-                # We erase the crates, trophies, and character from the <background_map> variable
-                # (we have already stored their coordinates in other variables)
-                self.background_map[row][column] = displayed_tile
+        # Now we create the image from the <background_map> variable
+        # (the crates, trophies and character have already been erased from it)
+        for row in range(first_row, min(first_row + self.chunk_rows, self.rows)):
+            for column in range(first_column,
+                                min(first_column + self.chunk_columns, self.columns)):
+                # Code of the tile we will display
+                displayed_tile = self.background_map[row][column]
 
-                # Coordinates of the tile in the background
-                dest_coord = (column * TILE_SIZE, row * TILE_SIZE)
+                # Coordinates of the tile in the chunk
+                dest_coord = ((column - first_column) * TILE_SIZE,
+                              (row - first_row) * TILE_SIZE)
 
                 # Rectangle defining the portion of the
                 # background textures taken by the tile we want
@@ -136,10 +176,52 @@ class BackgroundManager(pygame.sprite.Sprite):
                     TILE_SIZE * displayed_tile, 0, TILE_SIZE, TILE_SIZE)
 
                 # Finally, we copy this portion of the textures in
-                # the background image, at the computed coordinates
-                self.image.blit(background_textures, dest_coord, source_rect)
+                # the chunk image, at the computed coordinates
+                image.blit(background_textures, dest_coord, source_rect)
 
-        return True
+    def chunk(self, chunk_column, chunk_row):
+        """Method returning the image of the chunk at (<chunk_column>, <chunk_row>).
+        It is rendered if it is not in the cache of the chunks."""
+
+        key = (chunk_column, chunk_row)
+        image = self.chunks.get(key)
+
+        if image is not None:
+            self.chunks.move_to_end(key)
+            return image
+
+        image = pygame.Surface(
+            (self.chunk_columns * TILE_SIZE, self.chunk_rows * TILE_SIZE))
+        self.render_chunk(image, chunk_column, chunk_row)
+
+        # We drop the least recently used chunk if the cache is full
+        self.chunks[key] = image
+
+        if len(self.chunks) > BACKGROUND_CHUNK_CACHE_SIZE:
+            self.chunks.popitem(last=False)
+
+        return image
+
+    def draw(self, screen, viewport, area):
+        """Method drawing the chunks covering the <area> of the map on the <screen>,
+        where the map is displayed through the <viewport>."""
+
+        chunk_width = self.chunk_columns * TILE_SIZE
+        chunk_height = self.chunk_rows * TILE_SIZE
+
+        # Number of chunks in a row and in a column of the map
+        chunks_x = -(-self.columns // self.chunk_columns)
+        chunks_y = -(-self.rows // self.chunk_rows)
+
+        for chunk_row in range(max(area.top // chunk_height, 0),
+                               min((area.bottom - 1) // chunk_height + 1, chunks_y)):
+            for chunk_column in range(max(area.left // chunk_width, 0),
+                                      min((area.right - 1) // chunk_width + 1, chunks_x)):
+                screen.blit(
+                    self.chunk(chunk_column, chunk_row),
+                    (chunk_column * chunk_width - viewport.rect.x,
+                     chunk_row * chunk_height - viewport.rect.y)
+                )
 
 
 class Character(pygame.sprite.Sprite):
@@ -168,10 +250,9 @@ class Character(pygame.sprite.Sprite):
         # Initial direction of the character
         self.direction = pygame.K_DOWN
 
-        # Textures of the character
-        self.textures = pygame.image.load(
+        # Textures of the character (shared by the asset cache)
+        self.textures = asset_cache.image(
             CHARACTERS_INFO[character_id]['textures_path'])
-        self.textures.convert_alpha()
 
         # Rectangle defining the portion of the textures that we will display
         source_rect = pygame.Rect(
@@ -205,73 +286,62 @@ class Character(pygame.sprite.Sprite):
         self.image.fill(pygame.Color(0, 0, 0, 0))
         self.image.blit(self.textures, (0, 0), source_rect)
 
-    def update(
-        self,
-        direction,
-        level_tile_map,
-        crates, trophies,
-        move_queue,
-        reverse=False,
-        with_crate=False
-    ):
+    def front_coords(self):
+        """Method returning the coordinates of the tile in front of the character."""
+
+        return (self.column + CHARACTER_DIRECTIONS[self.direction]['dx'],
+                self.row + CHARACTER_DIRECTIONS[self.direction]['dy'])
+
+    def update(self, direction, state, crates, trophies):
         """Method moving the character with the given <direction> parameter.
-        It also requires the <level_tile_map>, <crates> and <trophies>
-        parameters, for collisions. The <move_queue> parameter is usefull
-        for storing the moves of the character. The <reversed> and <with_crate>
-        parameters are used when the move is backward."""
+        The rules of the game are applied by the <state> parameter (a SokobanState
+        object). <crates> is the dictionary indexing the crates by coordinates, and
+        <trophies> the set of the coordinates of the trophies: they are used to move
+        the sprite of the pushed crate, if any. It returns True if the character moved."""
 
         # First, we set up the new direction
         self.direction = direction
 
-        # Then we compute the next coordinates, taking in account the <reverse> parameter
-        direction_coeff = -1 if reverse else 1
-
-        next_column = self.column + direction_coeff * \
-            CHARACTER_DIRECTIONS[self.direction]['dx']
-        next_row = self.row + direction_coeff * \
-            CHARACTER_DIRECTIONS[self.direction]['dy']
-
-        # Variable which saves if the collisions with the crates are not problematic
-        collision_ok, crate_collision = True, False
-
-        if reverse:
-            if with_crate:
-                # We have to move the crate that was previously moved
-                # These are the coordinates of the character if the move was forward
-                column_forward = self.column + \
-                    CHARACTER_DIRECTIONS[self.direction]['dx']
-                row_forward = self.row + \
-                    CHARACTER_DIRECTIONS[self.direction]['dy']
-
-                for crate in crates:
-                    if crate.column == column_forward and crate.row == row_forward:
-                        crate.update(
-                            CHARACTER_DIRECTIONS_OPPOSITE[direction],
-                            level_tile_map,
-                            crates,
-                            trophies
-                        )
+        # Then we ask the engine to move the character
+        result = state.move(CHARACTER_DIRECTIONS[direction]['move'])
 
-        else:
-            # We check for the collision with any crate
-            for crate in crates:
-                if crate.column == next_column and crate.row == next_row:
-                    collision_ok = crate.update(
-                        direction, level_tile_map, crates, trophies)
-                    crate_collision = True
-
-        # We check if the next tile is an empty one
-        if not level_tile_map[next_row][next_column] and collision_ok:
-            # We change the coordinates of the character
-            self.change_coords(next_column, next_row)
-
-            if not reverse:
-                # We store the move in the queue
-                move_queue.append((self.direction, crate_collision))
+        if result == MOVE_BLOCKED:
+            return False
 
-            return True
+        (next_column, next_row) = state.coords(state.player)
+
+        # If a crate was pushed, we move its sprite as well, and update the index
+        if result == MOVE_PUSHED:
+            crate = crates.pop((next_column, next_row))
+            crate.update(direction, trophies)
+            crates[(crate.column, crate.row)] = crate
+
+        # We change the coordinates of the character
+        self.change_coords(next_column, next_row)
+
+        return True
+
+    def undo(self, state, crates, trophies):
+        """Method cancelling the last move of the character, stored in the history
+        of the <state> parameter. It returns True if a move was cancelled."""
+
+        last_move = state.undo()
+
+        if last_move is None:
+            return False
 
-        return False
+        # The character keeps looking in the direction of the cancelled move
+        self.direction = CHARACTER_MOVE_KEYS[last_move & ~MOVE_PUSH_FLAG]
+
+        # If a crate was pushed, it has been pulled back to the former tile of the character
+        if last_move & MOVE_PUSH_FLAG:
+            crate = crates.pop(self.front_coords())
+            crate.change_coords(self.column, self.row, trophies)
+            crates[(crate.column, crate.row)] = crate
+
+        self.change_coords(*state.coords(state.player))
+
+        return True
 
 
 class Crate(pygame.sprite.Sprite):
@@ -279,10 +349,16 @@ class Crate(pygame.sprite.Sprite):
 
     @staticmethod
     def load_textures():
-        """Static method loading the textures of the crates (regular and red)"""
+        """Static method loading the textures of the crates (regular and red),
+        and creating the layer displayed on the deadlocked crates"""
         Crate.regular_crate_texture = load_background_texture(CRATE)
         Crate.red_crate_texture = load_background_texture(RED_CRATE)
 
+        Crate.deadlock_surface = pygame.Surface(
+            (TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+        Crate.deadlock_surface.fill(GAME_DEADLOCK_COLOR)
+        Crate.deadlock_surface.set_alpha(GAME_DEADLOCK_ALPHA_VALUE)
+
     def __init__(self, column, row):
         """Constructor method. It initializes the coordinates of the crate."""
 
@@ -300,9 +376,36 @@ class Crate(pygame.sprite.Sprite):
             TILE_SIZE
         )
 
+        # Attributes saving if the crate is on a trophy, and if it can
+        # no longer be placed on a trophy (deadlock)
+        self.on_trophy, self.deadlocked = False, False
+
         # Displayed image of the crate
         self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-        self.image.blit(Crate.regular_crate_texture, (0, 0))
+        self.update_image()
+
+    def update_image(self):
+        """Method updating the displayed image of the crate."""
+
+        self.image.fill(pygame.Color(0, 0, 0, 0))
+
+        # If the crate is on a trophy, then it becomes red
+        if self.on_trophy:
+            self.image.blit(Crate.red_crate_texture, (0, 0))
+
+        else:
+            self.image.blit(Crate.regular_crate_texture, (0, 0))
+
+        # If the crate is deadlocked, it is darkened
+        if self.deadlocked:
+            self.image.blit(Crate.deadlock_surface, (0, 0))
+
+    def set_deadlocked(self, deadlocked):
+        """Method flagging the crate as deadlocked (or not)."""
+
+        if deadlocked != self.deadlocked:
+            self.deadlocked = deadlocked
+            self.update_image()
 
     def change_coords(self, next_column, next_row, trophies):
         """Method changing the coordinates of the crate."""
@@ -314,64 +417,104 @@ class Crate(pygame.sprite.Sprite):
         self.rect.x = self.column * TILE_SIZE
         self.rect.y = self.row * TILE_SIZE
 
-        # If the crate is on a trophy, then it becomes red
-        if (self.column, self.row) in trophies:
-            self.image.blit(Crate.red_crate_texture, (0, 0))
-
-        else:
-            self.image.blit(Crate.regular_crate_texture, (0, 0))
+        # We check if the crate is on a trophy, and update the image accordingly
+        self.on_trophy = (self.column, self.row) in trophies
+        self.update_image()
 
-    def update(self, direction, level_tile_map, crates, trophies):
+    def update(self, direction, trophies):
         """Method moving the crate with the given <direction> parameter.
-        It also requires the <level_tile_map> and <crates> parameters, for collisions."""
+        The move must have been validated by the engine beforehand."""
 
         # We compute the next coordinates
         next_column = self.column + CHARACTER_DIRECTIONS[direction]['dx']
         next_row = self.row + CHARACTER_DIRECTIONS[direction]['dy']
 
-        # We check for the collision with any other crate
-        for crate in crates:
-            if next_column == crate.column and next_row == crate.row:
-                return False
-
-        # We check if the next tile is an empty one, and return if the move succeeds
-        if not level_tile_map[next_row][next_column]:
-            # We change the coordinates of the crate
-            self.change_coords(next_column, next_row, trophies)
-
-            return True
-
-        return False
+        # We change the coordinates of the crate
+        self.change_coords(next_column, next_row, trophies)
 
 
 class GameManager():
     """Class managing the game and its different components."""
 
-    def __init__(self, screen):
-        """Constructor method. It initializes the attributes of the class."""
+    def __init__(self, screen, loop_driver=None, database_path=DATABASE_PATH):
+        """Constructor method. It initializes the attributes of the class.
+        <loop_driver> is the LoopDriver pacing the frames (a new one by default),
+        and <database_path> the file of the database of the levels (':memory:'
+        for a database which is not kept)."""
         self.screen = screen  # Represents the surface of the window
-        self.background = BackgroundManager()  # Background of the game
-        self.character = Character(0, 0, 0)  # Character
-        self.crates = []  # Crates
 
-        # Diferent rendering groups
-        self.background_group = pygame.sprite.Group()
-        self.character_group = pygame.sprite.Group()
-        self.crates_group = pygame.sprite.Group()
+        # Driver of the main loop, shared with the other views
+        self.loop_driver = loop_driver if loop_driver is not None else LoopDriver()
+
+        self.background = BackgroundManager()  # Background of the game
+        self.viewport = Viewport(WINDOW_SIZE)  # Area of the map displayed in the window
+        self.character = None  # Character (created with the level)
+        self.crates = []  # Crates of the level
+
+        # Index of the crates by coordinates, and coordinates of the trophies
+        self.crates_by_coords, self.trophies = {}, set()
+
+        # State of the level, to which the rules of the game are applied
+        self.state = None
+
+        # Timeline of the moves of the state (undo, redo and jumps to any move)
+        self.history = None
+
+        # Shortest paths of the character to the clicked tiles, clicked tile whose
+        # path is being searched, moves left to walk along the path, and time
+        # of the next move
+        self.pathfinder = None
+        self.walk_target, self.walk_path, self.walk_time = None, [], 0.0
+
+        # Planner of the pushes moving the dragged crates, tile of the crate being
+        # dragged, and number of the last requested plan (the results of the
+        # previous ones are ignored)
+        self.planner = PushPlanner()
+        self.dragged_crate = None
+        self.plan_number = 0
+
+        # Engine searching the hints, displayed hint (a tuple (crate, move code)),
+        # True while a hint is searched, and number of the last requested hint
+        self.hint_engine = HintEngine()
+        self.hint, self.hint_requested = None, False
+        self.hint_number = 0
+
+        # Reference of the level, and date at which the current game started
+        # (they are saved with the replay of the game)
+        self.level_filename, self.started = None, 0.0
+
+        # Database of the levels (dead tiles, known solutions and bests of the player),
+        # opened with each level and closed when the game view is left, and digest
+        # of the current level
+        self.database_path, self.database = database_path, None
+        self.level_hash = None
+
+        # Detector of the deadlocks, precomputed for each level
+        self.deadlocks = None
+
+        # Areas of the screen which have to be redrawn at the next frame
+        self.dirty_rects = []
 
         # We load the textures of the crates and the trophies
         Crate.load_textures()
         self.trophy_texture = load_background_texture(TROPHY)
 
-        # Stack storing the moves of the character
-        self.move_queue = collections.deque()
+        # Layer displayed on the crate of the hint, and on its destination
+        self.hint_surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+        self.hint_surface.fill(GAME_HINT_COLOR)
+        self.hint_surface.set_alpha(GAME_HINT_ALPHA_VALUE)
 
         # Font used to display the move count
-        self.text_font = pygame.font.Font(UI_FONT_PATH, 3 * TILE_SIZE // 4)
+        self.text_font = asset_cache.font(UI_FONT_PATH, 3 * TILE_SIZE // 4)
 
         # We create the image for the move count by updating it for the first time
+        self.move_count_rect = pygame.Rect(GAME_MOVE_COUNT_POSITION, (0, 0))
         self.update_move_count_image()
 
+        # Message displayed under the move count (None if there is no message)
+        self.message_image = None
+        self.message_rect = pygame.Rect(GAME_MESSAGE_POSITION, (0, 0))
+
         # Initialization of the buttons available in-game
         self.back_to_menu_button = TextButton(
             pygame.Rect(
@@ -403,6 +546,18 @@ class GameManager():
             'Annuler'
         )
 
+        # Timeline of the moves, above the buttons (it is dragged with the mouse)
+        self.timeline = Timeline(
+            pygame.Rect(
+                GAME_TIMELINE_X_MARGIN,
+                WINDOW_SIZE[1] - GAME_BUTTONS_Y_MARGIN - GAME_BUTTONS_HEIGHT
+                - GAME_TIMELINE_Y_MARGIN - GAME_TIMELINE_HEIGHT,
+                WINDOW_SIZE[0] - 2 * GAME_TIMELINE_X_MARGIN,
+                GAME_TIMELINE_HEIGHT
+            )
+        )
+        self.dragging_timeline = False
+
         # We join all these buttons in a sprite group
         self.buttons_group = pygame.sprite.Group()
 
@@ -414,19 +569,512 @@ class GameManager():
         """Method updating the image of the move count"""
 
         self.move_count_image = self.text_font.render(
-            'Déplacements: {}'.format(len(self.move_queue)),
+            'Déplacements: {}'.format(
+                self.state.move_count() if self.state else 0),
             True,
             UI_TEXT_COLOR
         )
 
+        # The area of the previous image has to be redrawn as well
+        previous_rect = self.move_count_rect
+
+        self.move_count_rect = self.move_count_image.get_rect(
+            topleft=GAME_MOVE_COUNT_POSITION)
+
+        self.dirty_rects.append(self.move_count_rect.union(previous_rect))
+
+    def show_message(self, text):
+        """Method displaying the <text> message under the move count,
+        or removing the message if <text> is None."""
+
+        if text is None and self.message_image is None:
+            return
+
+        previous_rect = self.message_rect
+
+        if text is None:
+            self.message_image = None
+            self.message_rect = pygame.Rect(GAME_MESSAGE_POSITION, (0, 0))
+
+        else:
+            self.message_image = self.text_font.render(text, True, UI_TEXT_COLOR)
+            self.message_rect = self.message_image.get_rect(topleft=GAME_MESSAGE_POSITION)
+
+        self.dirty_rects.append(self.message_rect.union(previous_rect))
+
+    def hint_tiles(self):
+        """Method returning the (column, row) coordinates of the crate of the
+        displayed hint, and of the tile where it has to be pushed."""
+
+        (crate, move) = self.hint
+
+        return [self.state.coords(crate),
+                self.state.coords(crate + self.state.offsets[move])]
+
+    def request_hint(self):
+        """Method requesting a hint from the current position. It is searched by
+        the process of the hint engine (or found at once if it is memoized): it is
+        displayed once it is received (see HINT_EVENT)."""
+
+        self.clear_hint()
+        self.show_message(GAME_HINT_MESSAGES['searching'])
+        self.hint_requested = True
+
+        number = self.hint_number
+
+        def receive_hint(hint):
+            """Function called by the hint engine when the hint is found.
+            The hint is displayed by the main thread, which is woken up by an event."""
+
+            try:
+                pygame.event.post(pygame.event.Event(
+                    HINT_EVENT, number=number, status=hint[0], push=hint[1]))
+
+            # The display may have been closed in the meantime
+            except pygame.error:
+                pass
+
+        self.hint_engine.request(self.state, receive_hint)
+
+    def show_hint(self, status, push):
+        """Method displaying the <push> of a hint, or the reason why
+        there is none (according to its <status>). The push of a 'partial' hint
+        leads to the position closest to a solution found in the time limit."""
+
+        self.hint_requested = False
+
+        if push is None:
+            self.show_message(GAME_HINT_MESSAGES[status] if status != 'solved' else None)
+            return
+
+        self.hint = push
+        self.show_message(GAME_HINT_MESSAGES[status].format(GAME_HINT_DIRECTIONS[push[1]]))
+
+        for (column, row) in self.hint_tiles():
+            self.mark_tile(column, row)
+
+    def clear_hint(self):
+        """Method removing the displayed hint (and its message),
+        or cancelling the search of the requested one."""
+
+        if self.hint is None and not self.hint_requested:
+            return
+
+        self.hint_engine.cancel()
+        self.hint_number += 1
+        self.hint_requested = False
+
+        if self.hint is not None:
+            for (column, row) in self.hint_tiles():
+                self.mark_tile(column, row)
+
+            self.hint = None
+
+        self.show_message(None)
+
+    def update_timeline(self):
+        """Method updating the timeline with the current move of the history."""
+
+        if self.timeline.update(self.history.position(), self.history.length()):
+            self.dirty_rects.append(self.timeline.rect)
+
+    def mark_tile(self, column, row):
+        """Method marking the tile at (<column>, <row>) to be redrawn."""
+        self.dirty_rects.append(self.viewport.tile_rect(column, row))
+
+    def mark_character_area(self, undo=False):
+        """Method marking the tiles which can change when the character moves,
+        or when a move is cancelled (if <undo> is True): the tile of the character,
+        the one behind it and the one in front of it (where a crate can be).
+        When a push is cancelled, the crate leaves the tile two tiles ahead."""
+
+        dx = CHARACTER_DIRECTIONS[self.character.direction]['dx']
+        dy = CHARACTER_DIRECTIONS[self.character.direction]['dy']
+
+        for distance in (-1, 0, 1, 2) if undo else (-1, 0, 1):
+            self.mark_tile(self.character.column + distance * dx,
+                           self.character.row + distance * dy)
+
+    def move_character(self, direction):
+        """Method moving the character with the given <direction> (an arrow key),
+        and marking the areas of the screen which change.
+        It returns True if the character moved."""
+
+        if not self.character.update(
+            direction,
+            self.state,
+            self.crates_by_coords,
+            self.trophies
+        ):
+            return False
+
+        # The hint is given for the previous position
+        self.clear_hint()
+
+        self.history.record()
+        self.update_timeline()
+        self.update_move_count_image()
+        self.mark_character_area()
+        self.follow_character()
+
+        # The deadlocks can only appear, and the level can only be completed,
+        # when a crate is pushed (the state counts the crates placed on a trophy)
+        if self.state.history[-1] & MOVE_PUSH_FLAG:
+            self.update_deadlocked_crates(self.character.front_coords())
+
+            if self.state.is_solved():
+                pygame.event.post(pygame.event.Event(
+                    LEVEL_COMPLETE_EVENT,
+                    level=self.level_filename,
+                    moves=self.state.move_count(),
+                    pushes=self.state.push_count(),
+                    duration=time.time() - self.started
+                ))
+
+        return True
+
+    def tile_at(self, position):
+        """Method returning the index (in the board of the state) of the tile
+        displayed at the <position> of the screen, or None if it is outside of the map."""
+
+        (column, row) = self.viewport.tile_at(position)
+
+        if 0 <= column < self.background.columns and 0 <= row < self.background.rows:
+            return self.state.index(column, row)
+
+        return None
+
+    def walk_to(self, position):
+        """Method making the character walk to the tile displayed at the <position>
+        of the screen (if it can reach it without pushing any crate)."""
+
+        self.stop_walking()
+        self.walk_target = self.tile_at(position)
+
+    def stop_walking(self):
+        """Method stopping the character walking to a clicked tile,
+        or pushing a dragged crate (the plan being searched is cancelled)."""
+
+        self.walk_target, self.walk_path = None, []
+
+        self.planner.cancel()
+        self.plan_number += 1
+
+    def push_dragged_crate(self, position):
+        """Method requesting the plan pushing the dragged crate to the tile displayed
+        at the <position> of the screen. The plan is searched by the thread of the
+        planner: the character plays it once it is received (see PLAN_EVENT)."""
+
+        (crate, self.dragged_crate) = (self.dragged_crate, None)
+        target = self.tile_at(position)
+
+        # The crate cannot be dropped on the buttons (which are clicked instead)
+        if target is None or target == crate \
+                or any(button.collides(position) for button in self.buttons_group):
+            return
+
+        self.stop_walking()
+        self.show_message(GAME_PLAN_MESSAGES['searching'])
+
+        number = self.plan_number
+
+        def receive_plan(plan):
+            """Function called by the thread of the planner when the plan is ready.
+            The plan is played by the main thread, which is woken up by an event."""
+
+            try:
+                pygame.event.post(pygame.event.Event(
+                    PLAN_EVENT, number=number, status=plan[0], moves=plan[1]))
+
+            # The display may have been closed in the meantime
+            except pygame.error:
+                pass
+
+        self.planner.request(self.state, crate, target, receive_plan)
+
+    def play_plan(self, status, moves):
+        """Method making the character play the <moves> of a plan, or displaying
+        why there is no plan (according to its <status>)."""
+
+        if moves is None:
+            self.show_message(GAME_PLAN_MESSAGES[status])
+            return
+
+        self.show_message(None)
+        self.walk_path, self.walk_time = moves[::-1], time.perf_counter()
+
+    def update_walk(self):
+        """Method going on with the walk of the character to the clicked tile: the
+        search of the path is extended (it can last several frames on the largest
+        maps), then the moves are played at GAME_WALK_SPEED moves per second.
+        Each move is recorded in the history, as if it was played with the keys."""
+
+        now = time.perf_counter()
+
+        if self.walk_target is not None:
+            if not self.pathfinder.search(self.walk_target, PATHFINDING_FRAME_TILES):
+                return
+
+            # The path is reversed, so that the next move is at the end of the list
+            path = self.pathfinder.path_to(self.walk_target)
+            self.walk_target, self.walk_path = None, (path or [])[::-1]
+            self.walk_time = now
+
+        while self.walk_path and self.walk_time <= now:
+            if not self.move_character(CHARACTER_MOVE_KEYS[self.walk_path.pop()]):
+                self.stop_walking()
+
+            self.walk_time += 1 / GAME_WALK_SPEED
+
+    def undo_move(self):
+        """Method cancelling the last move of the character.
+        It returns True if a move was cancelled."""
+
+        if not self.character.undo(self.state, self.crates_by_coords, self.trophies):
+            return False
+
+        self.clear_hint()
+        self.update_timeline()
+        self.update_move_count_image()
+        self.mark_character_area(undo=True)
+        self.follow_character()
+
+        # The crate pulled back (if any) is in front of the character
+        self.update_deadlocked_crates(self.character.front_coords())
+
+        return True
+
+    def redo_move(self):
+        """Method playing again the last cancelled move.
+        It returns True if a move was played."""
+
+        move = self.history.next_move()
+
+        if move is None:
+            return False
+
+        return self.move_character(CHARACTER_MOVE_KEYS[move & ~MOVE_PUSH_FLAG])
+
+    def seek(self, position):
+        """Method jumping to the <position> of the history (a number of moves)."""
+
+        if self.history.seek(position):
+            self.show_state()
+
+    def show_state(self):
+        """Method moving the crates and the character to their tiles in the state,
+        after the state changed by other means than the moves of the character."""
+
+        # The crates are identical, so their order does not matter
+        for (crate, index) in zip(self.crates, sorted(self.state.crates)):
+            crate.change_coords(*self.state.coords(index), self.trophies)
+
+        self.index_crates()
+        self.clear_hint()
+
+        # The character looks in the direction of its last move
+        self.character.direction = CHARACTER_MOVE_KEYS[
+            self.state.history[-1] & ~MOVE_PUSH_FLAG] if self.state.history else pygame.K_DOWN
+        self.character.change_coords(*self.state.coords(self.state.player))
+
+        self.update_timeline()
+        self.update_move_count_image()
+        self.update_deadlocked_crates()
+        self.follow_character()
+
+        # Everything may have moved, so we redraw the whole screen
+        self.dirty_rects.append(self.screen.get_rect())
+
+    def save_replay(self):
+        """Method saving the replay of the current game, if the character moved.
+        It returns the path of the replay file, or None if nothing was saved."""
+
+        if self.state is None or not self.state.history:
+            return None
+
+        return save_replay(Replay.from_state(
+            self.state, self.level_filename, self.started, time.time() - self.started))
+
+    def leave_level(self):
+        """Method called when the game view is left: it stops the search of the
+        hint, saves the replay of the game, clears the crates, and writes and closes
+        the database of the levels (it is opened again with the next level)."""
+
+        self.clear_hint()
+        self.save_replay()
+
+        self.crates.clear()
+        self.crates_by_coords.clear()
+
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+
+    def follow_character(self):
+        """Method scrolling the viewport if the character comes close to the edges
+        of the screen. The whole screen is redrawn if the viewport moved."""
+
+        if self.viewport.follow(self.character.rect):
+            self.dirty_rects.append(self.screen.get_rect())
+
+    def draw_area(self, rect):
+        """Method drawing all the components of the game in the <rect> area of
+        the screen. Only the tiles of the map covered by this area are looked at."""
+
+        self.screen.set_clip(rect)
+
+        # Area of the map displayed in the rect
+        area = self.viewport.to_map(rect)
+
+        # Background
+        self.background.draw(self.screen, self.viewport, area)
+        profiler.mark(PROFILER_BACKGROUND)
+
+        # Trophies and crates of the tiles covered by the area
+        for row in range(max(area.top // TILE_SIZE, 0),
+                         min((area.bottom - 1) // TILE_SIZE + 1, self.background.rows)):
+            for column in range(max(area.left // TILE_SIZE, 0),
+                                min((area.right - 1) // TILE_SIZE + 1, self.background.columns)):
+                if (column, row) in self.trophies:
+                    self.screen.blit(self.trophy_texture,
+                                     self.viewport.tile_rect(column, row))
+
+                crate = self.crates_by_coords.get((column, row))
+
+                if crate is not None:
+                    self.screen.blit(crate.image, self.viewport.to_screen(crate.rect))
+
+        profiler.mark(PROFILER_TROPHIES)
+
+        # Crate of the hint, and tile where it has to be pushed
+        if self.hint is not None:
+            for (column, row) in self.hint_tiles():
+                self.screen.blit(self.hint_surface, self.viewport.tile_rect(column, row))
+
+        # Character
+        if self.character.rect.colliderect(area):
+            self.screen.blit(self.character.image,
+                             self.viewport.to_screen(self.character.rect))
+
+        # Timeline of the moves and buttons at the bottom of the screen
+        if self.timeline.rect.colliderect(rect):
+            self.screen.blit(self.timeline.image, self.timeline.rect)
+
+        for button in self.buttons_group:
+            if button.image.get_rect(topleft=button.rect.topleft).colliderect(rect):
+                self.screen.blit(button.image, button.rect)
+
+        # Move count, and message under it
+        if self.move_count_rect.colliderect(rect):
+            self.screen.blit(self.move_count_image, self.move_count_rect)
+
+        if self.message_image is not None and self.message_rect.colliderect(rect):
+            self.screen.blit(self.message_image, self.message_rect)
+
+        self.screen.set_clip(None)
+        profiler.mark(PROFILER_SPRITES)
+
+    def draw(self):
+        """Method redrawing the areas of the screen marked since the last frame,
+        and updating only these areas of the display."""
+
+        if not self.dirty_rects:
+            return
+
+        # The overlay of the profiler is drawn again at each frame
+        if profiler.enabled:
+            self.dirty_rects.append(profiler.overlay_rect)
+
+        for rect in self.dirty_rects:
+            self.draw_area(rect)
+
+        profiler.draw_overlay(self.screen)
+        profiler.mark(PROFILER_OVERLAY)
+
+        pygame.display.update(self.dirty_rects)
+        profiler.mark(PROFILER_DISPLAY)
+        profiler.end_frame()
+        self.loop_driver.frame_drawn()
+
+        self.dirty_rects = []
+
+    def update_deadlocked_crates(self, around=None):
+        """Method flagging the crates which can no longer be placed on a trophy.
+        If the (column, row) coordinates <around> are given, only the crates close
+        to them are checked (after a push, the crates whose deadlock status can
+        change are the ones around the pushed crate)."""
+
+        if around is None:
+            crates = self.crates
+
+        else:
+            crates = []
+
+            for row in range(around[1] - 2, around[1] + 3):
+                for column in range(around[0] - 2, around[0] + 3):
+                    if (column, row) in self.crates_by_coords:
+                        crates.append(self.crates_by_coords[(column, row)])
+
+        for crate in crates:
+            deadlocked = self.deadlocks.is_deadlocked_crate(
+                self.state.board,
+                self.state.index(crate.column, crate.row)
+            )
+
+            # The crates whose image changes have to be redrawn
+            if deadlocked != crate.deadlocked:
+                crate.set_deadlocked(deadlocked)
+                self.dirty_rects.append(self.viewport.to_screen(crate.rect))
+
+    def index_crates(self):
+        """Method rebuilding the index of the crates by coordinates"""
+
+        self.crates_by_coords = {
+            (crate.column, crate.row): crate for crate in self.crates}
+
     def parse(self, level_filename, character_id):
         """Method parsing a level file and consequently
         initializing the different components of the game"""
 
         # We try to parse the level
         if self.background.parse(level_filename):
-            # We add the background to the rendering group
-            self.background_group.add(self.background)
+            # We initialize the state of the level (it also stores the history of the moves)
+            self.state = SokobanState(
+                self.background.background_map,
+                self.background.initial_crates,
+                self.background.initial_trophies,
+                self.background.initial_character_coords
+            )
+            self.history = MoveHistory(self.state)
+            self.pathfinder = PathFinder(self.state)
+            self.stop_walking()
+            self.clear_hint()
+            self.show_message(None)
+            self.update_timeline()
+            self.update_move_count_image()
+
+            # We precompute the dead tiles of the level (or read them from the
+            # database, if the level has already been opened)
+            if self.database is None:
+                self.database = LevelDatabase(self.database_path)
+
+            self.level_hash = self.state.level_hash()
+            dead_tiles = self.database.dead_tiles(self.state)
+            self.deadlocks = DeadlockDetector(self.state, dead_tiles)
+
+            if dead_tiles is None:
+                self.database.record_dead_tiles(self.state, self.deadlocks.dead_tiles)
+                self.database.flush()
+
+            # The best known solution of the level gives the hints along it at once
+            known_solution = self.database.solution(self.level_hash)
+
+            if known_solution is not None:
+                self.hint_engine.store_solution(
+                    self.state, solution_pushes(self.state, known_solution[0]))
+
+            # Set of the coordinates of the trophies
+            self.trophies = set(self.background.initial_trophies)
 
             # We initialize the character
             self.character = Character(
@@ -435,126 +1083,219 @@ class GameManager():
                 character_id
             )
 
-            # We add the character to the rendering group
-            self.character_group.add(self.character)
-
-            # Then we initialize the crates and add them to the rendering group
+            # Then we initialize the crates
             for crate in self.background.initial_crates:
                 self.crates.append(Crate(crate[0], crate[1]))
-                self.crates_group.add(self.crates[-1])
+
+            self.index_crates()
+            self.update_deadlocked_crates()
+
+            # The viewport starts around the character
+            self.viewport.set_map_size(self.background.columns, self.background.rows)
+            self.viewport.follow(self.character.rect)
+
+            self.level_filename, self.started = level_filename, time.time()
 
         else:
-            raise ValueError
+            raise ValueError('{}: the level cannot be parsed'.format(level_filename))
 
     def mainloop(self):
         """The main loop of the game. It looks for the inputs
-        of the user to move the elements of the game."""
+        of the user to move the elements of the game. It returns a view code:
+        GAME_VIEW if the level has been completed (the next level can be opened),
+        and LEVEL_CHOICE_MENU_VIEW if the user went back to the menu."""
 
         # We update the buttons, so that they do not appear hovered
         self.buttons_group.update((0, 0))
 
+        # The whole screen is drawn at the first frame
+        self.dirty_rects = [self.screen.get_rect()]
+
         # List of the codes of the arrow keys
         arrow_keys = [pygame.K_LEFT, pygame.K_UP,
                       pygame.K_DOWN, pygame.K_RIGHT]
 
         while True:
-            # Events processing
-            for event in pygame.event.get():
+            # Events processing (waits for the next event, unless the character
+            # walks to a clicked tile)
+            events = self.loop_driver.events(
+                animating=self.walk_target is not None or bool(self.walk_path))
+            profiler.begin_frame()
+
+            for event in events:
                 if event.type == pygame.QUIT:
+                    self.leave_level()
+                    self.planner.shutdown()
                     sys.exit()
 
+                # The walk to a clicked tile (or the push of a dragged crate)
+                # stops if the user plays another move
+                if event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
+                    self.stop_walking()
+                    self.show_message(None)
+
+                # The profiler is shown or hidden, so its area has to be redrawn
+                if event.type == pygame.KEYDOWN and event.key == PROFILER_TOGGLE_KEY:
+                    profiler.toggle()
+                    profiler.begin_frame()
+                    self.dirty_rects.append(profiler.overlay_rect)
+
                 # If an arrow key is pressed, then we move the character
                 if event.type == pygame.KEYDOWN and event.key in arrow_keys:
-                    if self.character.update(
-                        event.key,
-                        self.background.background_map,
-                        self.crates,
-                        self.background.initial_trophies,
-                        self.move_queue
-                    ):
-                        self.update_move_count_image()
+                    self.move_character(event.key)
+
+                # The last move can be cancelled, and the cancelled moves played again
+                if event.type == pygame.KEYDOWN and event.key == GAME_UNDO_KEY:
+                    self.undo_move()
+
+                if event.type == pygame.KEYDOWN and event.key == GAME_REDO_KEY:
+                    self.redo_move()
+
+                # A hint is searched (the search is cancelled if the character moves)
+                if event.type == pygame.KEYDOWN and event.key == GAME_HINT_KEY:
+                    self.request_hint()
+
+                if event.type == HINT_EVENT and event.number == self.hint_number:
+                    self.show_hint(event.status, event.push)
+
+                # If the level is completed (and the last move was not cancelled
+                # in the meantime), the game is saved and we leave the level
+                if event.type == LEVEL_COMPLETE_EVENT \
+                        and event.level == self.level_filename and self.state.is_solved():
+                    # The game is kept as a solution of the level, and as the best
+                    # game of the player if it beats the previous one
+                    self.database.record_player_result(
+                        self.level_hash, event.moves, event.pushes, event.duration)
+                    self.database.record_solution(
+                        self.level_hash, self.state.lurd(), event.moves, event.pushes, 'player')
+
+                    self.leave_level()
+
+                    return GAME_VIEW
+
+                # If the timeline is clicked, we jump to the corresponding move,
+                # and follow the mouse until the button is released
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 \
+                        and self.timeline.collides(event.pos):
+                    self.dragging_timeline = True
+                    self.seek(self.timeline.position_at(event.pos))
+
+                # If the map is clicked (outside of the buttons), the character walks
+                # to the clicked tile, unless a crate is clicked: it is dragged then
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 \
+                        and not any(button.collides(event.pos) for button in self.buttons_group):
+                    tile = self.tile_at(event.pos)
+
+                    if tile is not None and self.state.board[tile] & CRATE_FLAG:
+                        self.dragged_crate = tile
+
+                    else:
+                        self.walk_to(event.pos)
+
+                # The dragged crate is dropped: the character pushes it there
+                if event.type == pygame.MOUSEBUTTONUP and self.dragged_crate is not None:
+                    self.push_dragged_crate(event.pos)
+
+                # The plan of the last dragged crate is received
+                if event.type == PLAN_EVENT and event.number == self.plan_number:
+                    self.play_plan(event.status, event.moves)
+
+                if event.type == pygame.MOUSEMOTION and self.dragging_timeline:
+                    self.seek(self.timeline.position_at(event.pos))
 
                 # If the mouse moves, we have to update the buttons
+                # (only the ones whose hover state changes are redrawn)
                 if event.type == pygame.MOUSEMOTION:
-                    self.buttons_group.update(pygame.mouse.get_pos())
+                    profiler.mark(PROFILER_EVENTS)
+                    mouse_position = pygame.mouse.get_pos()
+
+                    for button in self.buttons_group:
+                        if button.collides(mouse_position) != button.hovered:
+                            button.update(mouse_position)
+                            self.dirty_rects.append(button.image.get_rect(
+                                topleft=button.rect.topleft))
+
+                    profiler.mark(PROFILER_HOVER)
 
                 # If the mouse is clicked, we have to check for all the buttons
                 if event.type == pygame.MOUSEBUTTONUP:
                     mouse_position = pygame.mouse.get_pos()
+                    self.dragging_timeline = False
 
                     # If the user clicks on the 'back' button,
                     # we have to move the character accordingly.
                     if self.back_button.collides(mouse_position):
-                        if len(self.move_queue) > 0:
-                            last_move = self.move_queue.pop()
-
-                            if self.character.update(
-                                last_move[0],
-                                self.background.background_map,
-                                self.crates,
-                                self.background.initial_trophies,
-                                self.move_queue,
-                                True,
-                                last_move[1]
-                            ):
-                                self.update_move_count_image()
+                        self.undo_move()
 
                     # If the user clicks on the 'clear' button,
                     # we restart the level as it was initially
                     if self.clear_button.collides(mouse_position):
-                        # We clear the history of moves
-                        self.move_queue.clear()
-
-                        # We update the move count
-                        self.update_move_count_image()
-
-                        # We reset the crates to their initial positions
-                        for index in range(len(self.crates)):
-                            self.crates[index].change_coords(
-                                self.background.initial_crates[index][0],
-                                self.background.initial_crates[index][1],
-                                self.background.initial_trophies
-                            )
-
-                        # Finally, we reset the position of the character
-                        self.character.change_coords(
-                            self.background.initial_character_coords[0],
-                            self.background.initial_character_coords[1]
-                        )
+                        # The abandoned game is saved, and a new one starts
+                        self.save_replay()
+                        self.started = time.time()
+
+                        # We reset the state and the history of moves
+                        self.state.reset()
+                        self.history.clear()
+
+                        # Then the crates and the character are put back in place
+                        self.show_state()
 
                     # If the user clicks on the 'back' button,
                     # We quit the game
                     if self.back_to_menu_button.collides(mouse_position):
-                        # We clear the crates
-                        self.crates_group.empty()
-                        self.crates.clear()
+                        self.leave_level()
 
-                        # Then we clear the background and character groups
-                        self.background_group.empty()
-                        self.character_group.empty()
+                        return LEVEL_CHOICE_MENU_VIEW
 
-                        return
+            self.update_walk()
+            profiler.mark(PROFILER_EVENTS)
 
-            # Drawing the different components of the game
-            self.background_group.draw(self.screen)
+            # Drawing the areas of the screen which have changed
+            self.draw()
 
-            for trophy in self.background.initial_trophies:
-                self.screen.blit(
-                    self.trophy_texture,
-                    (trophy[0] * TILE_SIZE, trophy[1] * TILE_SIZE)
-                )
+    def play_replay(self, replay, speed=REPLAY_DEFAULT_SPEED):
+        """Method playing the <replay> back in the window, at <speed> moves per second,
+        on the level loaded by the parse method. The playback stops if a key
+        is pressed or if the mouse is clicked. It returns True if all the moves have
+        been played. A ValueError is raised if the replay does not match the level."""
 
-            self.crates_group.draw(self.screen)
-            self.character_group.draw(self.screen)
+        if replay.level_hash != self.state.level_hash():
+            raise ValueError('{}: the replay does not match the level'.format(replay.level))
 
-            # Displaying the buttons at the bottom of the screen
-            self.buttons_group.draw(self.screen)
+        moves = replay.move_codes()
+        position = 0
 
-            # Displaying the move count
-            self.screen.blit(
-                self.move_count_image,
-                (10, 0)
-            )
+        # The buttons are not used during the playback
+        self.buttons_group.update((0, 0))
+        self.dirty_rects = [self.screen.get_rect()]
+
+        start_time = time.perf_counter()
+
+        while position < len(moves):
+            # The frames are paced by the loop driver, since the game is animated
+            events = self.loop_driver.events(animating=True)
+            profiler.begin_frame()
+
+            for event in events:
+                if event.type == pygame.QUIT:
+                    sys.exit()
+
+                if event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONUP):
+                    return False
+
+            # We play all the moves which should have been played by now
+            # (several per frame if the speed is higher than the frame rate)
+            last_position = min(
+                len(moves), int((time.perf_counter() - start_time) * speed) + 1)
 
-            # Updating the screen
-            pygame.display.flip()
+            while position < last_position:
+                if not self.move_character(CHARACTER_MOVE_KEYS[moves[position]]):
+                    raise ValueError('{}: impossible move {}'.format(
+                        replay.level, position + 1))
+
+                position += 1
+
+            self.draw()
+
+        return True
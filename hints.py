@@ -0,0 +1,199 @@
+"""
+This module gives hints to the player: the next push of a solution of the level,
+from the current position of the crates and of the character.
+
+The solver runs in a separate process (the search would slow the main loop down
+if it ran in a thread of the game), which is stopped as soon as the hint is no
+longer needed. The solutions found are memoized: each position of the solution
+is stored with its next push, so that asking again for a hint at the same
+position, or at the next positions of the solution, gives it at once.
+This module does not depend on pygame.
+"""
+
+import multiprocessing
+import signal
+import threading
+from collections import OrderedDict
+
+from core_constants import (HINT_CACHE_SIZE, HINT_TIME_LIMIT, HINT_WEIGHT,
+                            MOVE_LETTERS)
+from engine import reachable_tiles
+from solver import Solver
+
+
+def position_key(state, level_hash=None):
+    """Function returning the key identifying the position of <state>: the digest
+    of the level (<level_hash>, computed if it is not given), the tiles of the
+    crates, and the smallest tile of the region of the character (the positions
+    in which the character can walk to the same tiles are equivalent)."""
+
+    if level_hash is None:
+        level_hash = state.level_hash()
+
+    return (level_hash, frozenset(state.crates),
+            min(reachable_tiles(state.board, state.offsets, state.player)))
+
+
+def solution_pushes(state, solution):
+    """Function returning the pushes of a <solution> (LURD string) played from
+    <state>, as a list of tuples (crate, move code)."""
+
+    pushes = []
+    player = state.player
+
+    for letter in solution:
+        move = MOVE_LETTERS.index(letter.lower())
+        player += state.offsets[move]
+
+        if letter.isupper():
+            pushes.append((player, move))
+
+    return pushes
+
+
+def solve_position(state, time_limit, connection):
+    """Function searching a solution from the position of <state>, and sending
+    the tuple (status, pushes) through the <connection>, where status is the one
+    of the solver and pushes the list of the pushes of the solution. If the search
+    stopped before finding one, they are the pushes leading to the position closest
+    to a solution (None if there is none). It is run by the process of the hint engine."""
+
+    # The process may inherit the handler of the game, which would ignore the
+    # signal sent to stop it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    result = Solver(state, HINT_WEIGHT).solve(time_limit)
+    moves = result.solution if result.solved else result.partial
+
+    pushes = solution_pushes(state, moves) if moves else None
+
+    connection.send((result.status, pushes))
+    connection.close()
+
+
+class HintEngine():
+    """Class searching the hints in a separate process. Only the last requested
+    hint is searched: requesting a hint cancels the previous one."""
+
+    def __init__(self, time_limit=HINT_TIME_LIMIT, cache_size=HINT_CACHE_SIZE):
+        """Constructor method. <time_limit> is the maximum duration of a search,
+        and <cache_size> the number of positions whose hint is memoized."""
+
+        self.time_limit, self.cache_size = time_limit, cache_size
+
+        # Next push of the positions already solved (None for the unsolvable ones),
+        # filled by the thread waiting for the results of the process
+        self.hints = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Process searching the current hint
+        self.process = None
+
+    def cached_hint(self, key):
+        """Method returning the memoized hint of the position <key> (see the
+        position_key function), as a tuple (status, push), or None if it is unknown."""
+
+        with self.lock:
+            if key not in self.hints:
+                return None
+
+            self.hints.move_to_end(key)
+            push = self.hints[key]
+
+        return ('solved', push) if push is not None else ('unsolvable', None)
+
+    def store(self, key, push):
+        """Method memoizing the next <push> of the position <key>."""
+
+        with self.lock:
+            self.hints[key] = push
+            self.hints.move_to_end(key)
+
+            while len(self.hints) > self.cache_size:
+                self.hints.popitem(last=False)
+
+    def store_solution(self, state, pushes):
+        """Method memoizing the next push of each position of a solution,
+        by playing its <pushes> on a copy of <state>."""
+
+        level_hash = state.level_hash()
+        state = state.copy()
+
+        for (crate, move) in pushes:
+            self.store(position_key(state, level_hash), (crate, move))
+
+            # The character walks behind the crate, and pushes it
+            state.player = crate - state.offsets[move]
+            state.move(move)
+
+    def request(self, state, callback):
+        """Method requesting the hint of the position of <state>. <callback> is called
+        with a tuple (status, push) once it is found, where status is 'solved',
+        'partial' (the push leads closer to a solution, but none was found in the time
+        limit), 'unsolvable' or 'timeout', and push is a tuple (crate, move code), or None.
+        It is called at once if the hint is memoized, and from another thread
+        otherwise (not at all if the hint is cancelled)."""
+
+        self.cancel()
+
+        key = position_key(state)
+        hint = self.cached_hint(key)
+
+        if hint is not None:
+            callback(hint)
+            return
+
+        state = state.copy()
+        (receiver, sender) = multiprocessing.Pipe(duplex=False)
+
+        process = self.process = multiprocessing.Process(
+            target=solve_position, args=(state, self.time_limit, sender), daemon=True)
+        process.start()
+
+        # Only the process keeps the sending end, so that the receiving end
+        # is closed if the process is stopped
+        sender.close()
+
+        def wait_for_hint():
+            """Function waiting for the result of the process."""
+
+            try:
+                (status, pushes) = receiver.recv()
+
+            except (EOFError, OSError):
+                return
+
+            finally:
+                receiver.close()
+                process.join()
+
+            # The hint may have been cancelled after the result was sent
+            if self.process is not process:
+                return
+
+            self.process = None
+
+            if status == 'solved' and pushes:
+                self.store_solution(state, pushes)
+                callback(('solved', pushes[0]))
+
+            # The pushes of a partial result are not memoized: they may lead nowhere
+            elif pushes:
+                callback(('partial', pushes[0]))
+
+            elif status == 'unsolvable':
+                self.store(key, None)
+                callback(('unsolvable', None))
+
+            else:
+                callback((status, None))
+
+        threading.Thread(target=wait_for_hint, daemon=True).start()
+
+    def cancel(self):
+        """Method stopping the search of the current hint (if any)."""
+
+        (process, self.process) = (self.process, None)
+
+        if process is not None and process.is_alive():
+            process.terminate()
@@ -0,0 +1,138 @@
+"""
+This module contains the history of the moves of a game, which allows to cancel
+the moves, to play them again (redo) and to jump to any move of the game.
+
+The history keeps the timeline of all the moves played, including the ones
+which have been cancelled: they are played again until the character makes
+another move. Every HISTORY_CHECKPOINT_INTERVAL moves, the positions of the
+crates and of the character are saved in a compact checkpoint, so that jumping
+to a move only replays or cancels a few moves, whatever the length of the game.
+This module does not depend on pygame.
+"""
+
+from array import array
+
+from core_constants import HISTORY_CHECKPOINT_INTERVAL, MOVE_PUSH_FLAG
+
+
+class MoveHistory():
+    """Class storing the timeline of the moves played on a SokobanState.
+
+    The moves of the timeline which are before the current position are the
+    history of the state: the position is the number of moves of the state.
+    The move methods of the state are called by the game, which then calls the
+    record method; the moves are cancelled with the undo method of the state
+    (the cancelled moves stay in the timeline)."""
+
+    def __init__(self, state, interval=HISTORY_CHECKPOINT_INTERVAL):
+        """Constructor method. <state> is the SokobanState whose moves are recorded,
+        and <interval> the number of moves between two checkpoints."""
+
+        self.state = state
+        self.interval = interval
+
+        # The indexes of the tiles are stored on 2 bytes when the board is small enough
+        self.typecode = 'H' if len(state.board) <= 1 << 16 else 'I'
+
+        # All the moves played (with the same codes as the history of the state)
+        self.timeline = bytearray()
+
+        # Positions of the crates and of the character after every <interval>
+        # moves of the timeline (the first one is the initial position)
+        self.checkpoints = []
+
+        self.clear()
+
+    def clear(self):
+        """Method emptying the timeline. The state must be in its initial position."""
+
+        self.timeline = bytearray(self.state.history)
+        self.checkpoints = [array(self.typecode, sorted(self.state.initial_crates)
+                                  + [self.state.initial_player]).tobytes()]
+
+        # The moves already played by the state are replayed, to create the checkpoints
+        if self.timeline:
+            self.state.reset()
+            self.seek(len(self.timeline))
+
+    def position(self):
+        """Method returning the number of moves before the current position."""
+        return len(self.state.history)
+
+    def length(self):
+        """Method returning the number of moves of the timeline."""
+        return len(self.timeline)
+
+    def snapshot(self):
+        """Method returning the checkpoint of the current position of the state:
+        the sorted indexes of the crates, followed by the index of the character."""
+        return array(self.typecode, sorted(self.state.crates) + [self.state.player]).tobytes()
+
+    def restore(self, checkpoint):
+        """Method putting the state back to the position of the <checkpoint> number."""
+
+        indexes = array(self.typecode, self.checkpoints[checkpoint])
+        position = checkpoint * self.interval
+
+        self.state.place(indexes[:-1], indexes[-1])
+        self.state.history = self.timeline[:position]
+
+    def record(self):
+        """Method adding the last move of the state to the timeline. If it is not
+        the move which was cancelled at this position, the moves cancelled before
+        are forgotten (they can no longer be played again)."""
+
+        position = len(self.state.history)
+        move = self.state.history[-1]
+
+        if position > len(self.timeline) or self.timeline[position - 1] != move:
+            del self.timeline[position - 1:]
+            self.timeline.append(move)
+
+            # The checkpoints after the new move no longer match the timeline
+            del self.checkpoints[(position - 1) // self.interval + 1:]
+
+        if position % self.interval == 0 and len(self.checkpoints) == position // self.interval:
+            self.checkpoints.append(self.snapshot())
+
+    def next_move(self):
+        """Method returning the move which can be played again (redo), combined with
+        MOVE_PUSH_FLAG if it pushes a crate, or None if no move has been cancelled."""
+
+        position = len(self.state.history)
+
+        if position < len(self.timeline):
+            return self.timeline[position]
+
+        return None
+
+    def seek(self, position):
+        """Method moving the state to the <position> of the timeline (a number of
+        moves), by replaying or cancelling at most <interval> moves from the current
+        position or from the closest checkpoint. It returns True if the state changed."""
+
+        position = max(0, min(position, len(self.timeline)))
+        current = len(self.state.history)
+
+        if position == current:
+            return False
+
+        checkpoint = min(position // self.interval, len(self.checkpoints) - 1)
+        start = checkpoint * self.interval
+
+        # The current position is used if it is closer than the checkpoint
+        if position < current:
+            if current - position > position - start:
+                self.restore(checkpoint)
+
+        elif current < start:
+            self.restore(checkpoint)
+
+        while len(self.state.history) > position:
+            self.state.undo()
+
+        for move in self.timeline[len(self.state.history):position]:
+            self.state.move(move & ~MOVE_PUSH_FLAG)
+            self.record()
+
+        return True
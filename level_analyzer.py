@@ -0,0 +1,278 @@
+"""
+This module contains a command-line tool checking a whole set of levels without
+playing them. It reports the levels which are not closed by walls, whose numbers
+of crates and trophies differ, whose crates or trophies cannot be reached by the
+character, or whose crates start on a dead square (a tile from which a crate can
+never be pushed to a trophy). It also counts the dead squares of each level and
+estimates its difficulty.
+
+The levels are held in NumPy arrays: the levels of similar sizes are stacked in
+a single 3-dimensional array, and all of them are analyzed at once by flood fills
+and neighbourhood operations on whole arrays. NumPy is needed by this tool only.
+
+Usage: python level_analyzer.py [paths or globs...] [options]
+(run with --help for the list of the options)
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional: only this tool needs it
+    numpy = None
+
+from core_constants import (ANALYZER_BATCH_TILES, ANALYZER_FLOOD_STEPS,
+                            ANALYZER_REPORT_FIELDS, LEVELS_PATH)
+from level_collection import read_level_reference
+from solve_levels import find_levels
+
+# Number of tiles added around the levels of a batch: the tiles outside of the
+# map are neither walls nor floor, and a flood fill reaching them has left the map
+ANALYZER_MARGIN = 2
+
+# Slices selecting, in an array of a batch, the tiles which have a neighbour in
+# each direction (left, up, right, down), and these neighbours
+INNER = (slice(None), slice(1, -1), slice(1, -1))
+NEIGHBOURS = (
+    (slice(None), slice(1, -1), slice(None, -2)),
+    (slice(None), slice(None, -2), slice(1, -1)),
+    (slice(None), slice(1, -1), slice(2, None)),
+    (slice(None), slice(2, None), slice(1, -1))
+)
+
+
+def flood_fill(seeds, passable):
+    """Function returning the tiles of <passable> (a boolean array of a batch)
+    connected to the <seeds>, for all the levels of the batch at once.
+    Each step extends the filled area by one tile in every direction."""
+
+    filled = seeds & passable
+    inner_passable = passable[INNER]
+    count = -1
+
+    while count != numpy.count_nonzero(filled):
+        count = numpy.count_nonzero(filled)
+
+        for _ in range(ANALYZER_FLOOD_STEPS):
+            for neighbour in NEIGHBOURS:
+                filled[INNER] |= filled[neighbour] & inner_passable
+
+    return filled
+
+
+def live_squares(trophies, passable):
+    """Function returning the tiles of <passable> from which a crate can be pushed
+    to a trophy, for all the levels of the batch at once. They are found by pulling
+    the crates backward from the trophies: a crate can come from a tile if the
+    tile behind it (where the character pushes it from) is passable as well."""
+
+    live = trophies & passable
+    count = -1
+
+    # For each direction, the tiles whose neighbour on the other side is passable
+    pushable = [passable[INNER] & passable[NEIGHBOURS[(move + 2) % 4]]
+                for move in range(4)]
+
+    while count != numpy.count_nonzero(live):
+        count = numpy.count_nonzero(live)
+
+        for _ in range(ANALYZER_FLOOD_STEPS):
+            for move, neighbour in enumerate(NEIGHBOURS):
+                live[INNER] |= live[neighbour] & pushable[move]
+
+    return live
+
+
+def difficulty(floor, crates):
+    """Function returning a cheap estimate of the difficulty of a level: the
+    logarithm (in base 10) of the number of ways to place its <crates> on its
+    <floor> tiles which are not dead squares, which is the size of the space
+    of the positions searched by a solver."""
+
+    if crates > floor:
+        return 0.0
+
+    return (math.lgamma(floor + 1) - math.lgamma(crates + 1)
+            - math.lgamma(floor - crates + 1)) / math.log(10)
+
+
+def analyze_batch(levels):
+    """Function analyzing a batch of levels at once. <levels> is a list of tuples
+    (reference, level), where level is the tuple returned by the read_level function.
+    It returns the list of the reports, in the same order."""
+
+    height = max(len(level[0]) for (_, level) in levels) + 2 * ANALYZER_MARGIN
+    width = max(len(level[0][0]) for (_, level) in levels) + 2 * ANALYZER_MARGIN
+    shape = (len(levels), height, width)
+
+    walls, inside = numpy.zeros(shape, bool), numpy.zeros(shape, bool)
+    crates, trophies = numpy.zeros(shape, bool), numpy.zeros(shape, bool)
+    player = numpy.zeros(shape, bool)
+
+    for number, (_, (background_map, level_crates, level_trophies,
+                     character_coords)) in enumerate(levels):
+        grid = numpy.array(background_map, numpy.uint8)
+        rows, columns = grid.shape
+
+        area = (number, slice(ANALYZER_MARGIN, ANALYZER_MARGIN + rows),
+                slice(ANALYZER_MARGIN, ANALYZER_MARGIN + columns))
+        walls[area] = grid != 0
+        inside[area] = True
+
+        for (array, coords) in ((crates, level_crates), (trophies, level_trophies)):
+            if coords:
+                (columns, rows) = numpy.array(coords).T
+                array[number, rows + ANALYZER_MARGIN, columns + ANALYZER_MARGIN] = True
+
+        player[number, character_coords[1] + ANALYZER_MARGIN,
+               character_coords[0] + ANALYZER_MARGIN] = True
+
+    # Area of the character (the crates can be pushed away, so they are not obstacles)
+    region = flood_fill(player, ~walls)
+
+    # Tiles of the area from which a crate can never reach a trophy
+    dead = region & ~live_squares(trophies, ~walls & inside)
+
+    counts = {
+        name: numpy.count_nonzero(array, axis=(1, 2)) for (name, array) in (
+            ('crates', crates),
+            ('trophies', trophies),
+            ('outside', region & ~inside),
+            ('unreachable_crates', crates & ~region),
+            ('unreachable_trophies', trophies & ~region),
+            ('floor', region),
+            ('dead_squares', dead),
+            ('dead_crates', crates & dead)
+        )
+    }
+
+    reports = []
+
+    for number, (reference, level) in enumerate(levels):
+        report = {name: int(values[number]) for (name, values) in counts.items()}
+        report.update(level=reference, width=len(level[0][0]), height=len(level[0]),
+                      closed=not report.pop('outside'))
+
+        problems = []
+
+        if not report['closed']:
+            problems.append('the level is not closed')
+
+        if report['crates'] != report['trophies']:
+            problems.append('{} crates but {} trophies'.format(
+                report['crates'], report['trophies']))
+
+        for name in ('unreachable_crates', 'unreachable_trophies', 'dead_crates'):
+            if report[name]:
+                problems.append('{} {}'.format(report[name], name.replace('_', ' ')))
+
+        report.update(
+            valid=not problems,
+            problems=problems,
+            difficulty=round(difficulty(
+                report['floor'] - report['dead_squares'], report['crates']), 2)
+        )
+        reports.append(report)
+
+    return reports
+
+
+def analyze_levels(references, batch_tiles=ANALYZER_BATCH_TILES):
+    """Function analyzing all the levels of the <references> list. The levels are
+    sorted by size, and grouped in batches of at most <batch_tiles> tiles.
+    It returns the list of the reports, in the order of <references>."""
+
+    reports, levels = {}, []
+
+    for reference in references:
+        try:
+            levels.append((reference, read_level_reference(reference)))
+
+        except (OSError, ValueError) as error:
+            report = dict.fromkeys(ANALYZER_REPORT_FIELDS)
+            report.update(level=reference, valid=False, problems=[str(error)])
+            reports[reference] = report
+
+    levels.sort(key=lambda level: (len(level[1][0]), len(level[1][0][0])))
+
+    batch, batch_width = [], 0
+
+    for level in levels:
+        # Size of the batch if the level is added to it (all the levels of the
+        # batch are padded to the size of the largest one)
+        width = max(batch_width, len(level[1][0][0]))
+        tiles = (len(batch) + 1) * (len(level[1][0]) + 2 * ANALYZER_MARGIN) \
+            * (width + 2 * ANALYZER_MARGIN)
+
+        if batch and tiles > batch_tiles:
+            reports.update((report['level'], report) for report in analyze_batch(batch))
+            batch, width = [], len(level[1][0][0])
+
+        batch.append(level)
+        batch_width = width
+
+    if batch:
+        reports.update((report['level'], report) for report in analyze_batch(batch))
+
+    return [reports[reference] for reference in references]
+
+
+def write_report(reports, output, report_format):
+    """Function writing the <reports> in the <output> file object,
+    with the 'json' or 'csv' <report_format>."""
+
+    if report_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=ANALYZER_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(dict(report, problems='; '.join(report['problems']))
+                         for report in reports)
+
+    else:
+        json.dump({
+            'levels': reports,
+            'valid': sum(1 for report in reports if report['valid']),
+            'total': len(reports)
+        }, output, indent=2)
+        output.write('\n')
+
+
+def main(arguments=None):
+    """Main function of the tool. It returns the exit status:
+    0 if no problem has been found in the levels, 1 otherwise."""
+
+    parser = argparse.ArgumentParser(
+        description='Check a set of levels without playing them.')
+    parser.add_argument('paths', nargs='*', default=[LEVELS_PATH],
+                        help='level files, directories or glob patterns')
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+                        help='format of the report')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file in which the report is written (default: standard output)')
+    options = parser.parse_args(arguments)
+
+    if numpy is None:
+        parser.error('NumPy is needed to analyze the levels')
+
+    references = find_levels(options.paths)
+
+    if not references:
+        parser.error('no level found')
+
+    reports = analyze_levels(references)
+
+    if options.output is None:
+        write_report(reports, sys.stdout, options.format)
+
+    else:
+        with open(options.output, 'w', newline='', encoding='utf-8') as output:
+            write_report(reports, output, options.format)
+
+    return 0 if all(report['valid'] for report in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+This module contains the cache of the compiled levels. The first time a level
+file is opened, it is parsed and saved in a binary form in the cache directory:
+a packed grid of tile codes, the lists of the crates and trophies, the character
+and, optionally, the pixels of the pre-rendered background. The next times,
+the compiled level is mapped in memory at once, as long as the level file
+has not changed. This module does not depend on pygame.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+from core_constants import (LEVEL_CACHE_MAGIC, LEVEL_CACHE_PATH,
+                            LEVEL_CACHE_VERSION)
+from level_collection import read_level_reference, split_reference
+
+# Header of a compiled level: magic, version, modification time and size of the
+# level file, digest of its content, width and height of the grid, number of
+# crates and trophies, coordinates of the character, tag of the background
+# (0 if there is none), and width and height of the background in pixels
+LEVEL_CACHE_HEADER = struct.Struct('<4sHqQ16sHHHHHHQII')
+
+
+class CompiledLevel():
+    """Class storing a level in the form saved in the cache."""
+
+    __slots__ = ('width', 'height', 'grid', 'crates', 'trophies',
+                 'character_coords', 'background_tag', 'background_size',
+                 'background_pixels')
+
+    def __init__(self, background_map, crates, trophies, character_coords):
+        """Constructor method. It takes the tuple returned by the read_level function."""
+
+        self.height = len(background_map)
+        self.width = len(background_map[0]) if background_map else 0
+
+        # Tile codes of the background, row after row
+        self.grid = bytes(tile_code for tile_codes in background_map
+                          for tile_code in tile_codes)
+
+        self.crates, self.trophies = list(crates), list(trophies)
+        self.character_coords = tuple(character_coords)
+
+        # Raw pixels of the pre-rendered background (None if it was not saved)
+        # The tag identifies the textures used to render it
+        self.background_tag, self.background_size = 0, (0, 0)
+        self.background_pixels = None
+
+    def background_map(self):
+        """Method returning the tile codes of the background as a list of rows."""
+
+        return [list(self.grid[row * self.width:(row + 1) * self.width])
+                for row in range(self.height)]
+
+    def to_level(self):
+        """Method returning the same tuple as the read_level function."""
+        return (self.background_map(), list(self.crates),
+                list(self.trophies), self.character_coords)
+
+    def pack(self, signature, digest):
+        """Method returning the bytes saved in the cache. <signature> is the
+        tuple (modification time, size) of the level file and <digest>
+        the digest of its content."""
+
+        pixels = self.background_pixels if self.background_pixels is not None else b''
+
+        header = LEVEL_CACHE_HEADER.pack(
+            LEVEL_CACHE_MAGIC, LEVEL_CACHE_VERSION, signature[0], signature[1],
+            digest, self.width, self.height, len(self.crates), len(self.trophies),
+            self.character_coords[0], self.character_coords[1],
+            self.background_tag if pixels else 0,
+            self.background_size[0] if pixels else 0,
+            self.background_size[1] if pixels else 0
+        )
+
+        # The coordinates are stored as pairs of unsigned 16-bit integers
+        coords = struct.pack('<{}H'.format(2 * (len(self.crates) + len(self.trophies))),
+                             *(value for pair in self.crates + self.trophies
+                               for value in pair))
+
+        return b''.join((header, self.grid, coords, pixels))
+
+    @classmethod
+    def unpack(cls, data):
+        """Method rebuilding a compiled level from the bytes saved in the cache.
+        It returns a tuple (level, signature, digest), and raises a ValueError
+        if the data is not a compiled level of the current version.
+        The pixels of the background are not copied: if <data> is a memoryview,
+        they are a slice of it."""
+
+        if len(data) < LEVEL_CACHE_HEADER.size:
+            raise ValueError('truncated compiled level')
+
+        (magic, version, mtime, size, digest, width, height, nb_crates,
+         nb_trophies, column, row, background_tag, background_width,
+         background_height) = LEVEL_CACHE_HEADER.unpack_from(data)
+
+        if magic != LEVEL_CACHE_MAGIC or version != LEVEL_CACHE_VERSION:
+            raise ValueError('invalid compiled level')
+
+        level = cls.__new__(cls)
+        level.width, level.height = width, height
+        level.character_coords = (column, row)
+
+        position = LEVEL_CACHE_HEADER.size
+        level.grid = bytes(data[position:position + width * height])
+        position += width * height
+
+        nb_coords = 2 * (nb_crates + nb_trophies)
+        coords = struct.unpack_from('<{}H'.format(nb_coords), data, position)
+        position += 2 * nb_coords
+
+        pairs = list(zip(coords[0::2], coords[1::2]))
+        level.crates, level.trophies = pairs[:nb_crates], pairs[nb_crates:]
+
+        level.background_tag = background_tag
+        level.background_size = (background_width, background_height)
+        level.background_pixels = data[position:] if background_tag else None
+
+        if len(level.grid) != width * height:
+            raise ValueError('truncated compiled level')
+
+        return (level, (mtime, size), digest)
+
+
+def compiled_path(filename, cache_path=LEVEL_CACHE_PATH):
+    """Function returning the path of the compiled version of the level <filename>.
+    The absolute path of the level is hashed, so that two level packs can
+    contain files with the same name."""
+
+    path_digest = hashlib.blake2b(os.path.abspath(filename).encode(),
+                                  digest_size=6).hexdigest()
+
+    return os.path.join(cache_path, '{}-{}.lvl'.format(
+        os.path.basename(filename), path_digest))
+
+
+def file_signature(filename):
+    """Function returning the tuple (modification time, size) of a file."""
+
+    stat = os.stat(filename)
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def file_digest(filename):
+    """Function returning the digest of the content of a file."""
+
+    with open(filename, 'rb') as source:
+        return hashlib.blake2b(source.read(), digest_size=16).digest()
+
+
+def load_level(filename, cache_path=LEVEL_CACHE_PATH):
+    """Function returning the CompiledLevel of the level <filename>: a level file,
+    or the reference of a level of a collection (see the level_collection module).
+    The compiled level is read from the cache if the level file has not changed
+    (same modification time and size, or same content); otherwise the level file
+    is parsed again and the cache is updated. A ValueError is raised if the
+    file is not a valid level. The errors of the cache itself are ignored."""
+
+    # File containing the level (the collection, for a level of a collection)
+    source = split_reference(filename)[0]
+
+    signature = file_signature(source)
+    path = compiled_path(filename, cache_path)
+
+    # The compiled level is mapped in memory, so that the pixels of the
+    # background can be copied directly from the file to their surface
+    try:
+        with open(path, 'rb') as compiled:
+            data = mmap.mmap(compiled.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (level, cached_signature, digest) = CompiledLevel.unpack(memoryview(data))
+
+    except (OSError, ValueError, struct.error):
+        level = None
+
+    if level is not None:
+        # The level file has not been modified since it was compiled
+        if cached_signature == signature:
+            return level
+
+        # The level file has been touched, but its content is the same:
+        # we only update its signature in the cache
+        if file_digest(source) == digest:
+            save_level(level, filename, cache_path, signature, digest)
+            return level
+
+    # We parse the level file (the errors of the format are raised to the caller)
+    level = CompiledLevel(*read_level_reference(filename))
+    save_level(level, filename, cache_path, signature)
+
+    return level
+
+
+def save_level(level, filename, cache_path=LEVEL_CACHE_PATH,
+               signature=None, digest=None):
+    """Function saving the compiled <level> of the level file <filename> in the cache.
+    The file is written next to its final path, then renamed, so that a level
+    is never read half-written. It returns False if the cache cannot be written."""
+
+    path = compiled_path(filename, cache_path)
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    try:
+        if signature is None:
+            signature = file_signature(split_reference(filename)[0])
+
+        if digest is None:
+            digest = file_digest(split_reference(filename)[0])
+
+        os.makedirs(cache_path, exist_ok=True)
+
+        with open(temporary_path, 'wb') as compiled:
+            compiled.write(level.pack(signature, digest))
+
+        os.replace(temporary_path, path)
+
+    except OSError:
+        return False
+
+    return True
+
+
+def save_background(level, filename, tag, size, pixels, cache_path=LEVEL_CACHE_PATH):
+    """Function adding the raw <pixels> of the pre-rendered background of the
+    compiled <level> to the cache. <size> is the size of the background in pixels,
+    and <tag> a non-zero integer identifying the textures used to render it."""
+
+    level.background_tag, level.background_size = tag, tuple(size)
+    level.background_pixels = bytes(pixels)
+
+    return save_level(level, filename, cache_path)
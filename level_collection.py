@@ -0,0 +1,298 @@
+"""
+This module reads the level collections in the standard text format of Sokoban
+(XSB/SOK files, where '#' is a wall, '$' a crate, '.' a trophy, '*' a crate on
+a trophy, '@' the character and '+' the character on a trophy). A collection can
+hold thousands of levels: it is read once to build an index of the byte offset
+of each level, saved in the cache directory, and each level is then parsed only
+when it is needed, by seeking in the file. This module does not depend on pygame.
+
+A level of a collection is designated by a reference made of the path of the
+collection and of the number of the level (starting from 1), joined by
+LEVEL_REFERENCE_SEPARATOR, for instance 'levels/pack.xsb#12'.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from core_constants import (EMPTY, LEVEL_CACHE_PATH,
+                            LEVEL_COLLECTION_EXTENSIONS, LEVEL_INDEX_MAGIC,
+                            LEVEL_INDEX_VERSION, LEVEL_MAX_TILE_SIZE,
+                            LEVEL_REFERENCE_SEPARATOR,
+                            WALL, XSB_CHARACTER, XSB_CHARACTER_ON_TROPHY,
+                            XSB_CRATE, XSB_CRATE_ON_TROPHY, XSB_FLOORS,
+                            XSB_TROPHY, XSB_WALL)
+from engine import read_level
+
+# Header of an index file: magic, version, modification time and size
+# of the collection, and number of levels
+LEVEL_INDEX_HEADER = struct.Struct('<4sHqQI')
+
+# Characters which can appear on the lines of a level, and wall character
+XSB_BOARD_CHARACTERS = (XSB_WALL + XSB_CHARACTER + XSB_CHARACTER_ON_TROPHY + XSB_CRATE
+                        + XSB_CRATE_ON_TROPHY + XSB_TROPHY + XSB_FLOORS).encode()
+XSB_WALL_BYTE = XSB_WALL.encode()
+
+
+def is_collection(filename):
+    """Function returning True if the file <filename> is a level collection
+    (according to its extension)."""
+    return os.path.splitext(filename)[1].lower() in LEVEL_COLLECTION_EXTENSIONS
+
+
+def is_board_line(line):
+    """Function returning True if the <line> (bytes, without its end of line)
+    is a line of a level: it is only made of the characters of the format,
+    and contains at least one wall."""
+
+    return bool(line) and XSB_WALL_BYTE in line \
+        and not line.translate(None, XSB_BOARD_CHARACTERS)
+
+
+def parse_board(lines, name=''):
+    """Function converting the <lines> of a level (strings) into the tuple returned
+    by the read_level function. The lines are padded with empty tiles to the
+    width of the longest one. A ValueError is raised if the level is not valid."""
+
+    width = max((len(line) for line in lines), default=0)
+
+    if width > LEVEL_MAX_TILE_SIZE or len(lines) > LEVEL_MAX_TILE_SIZE:
+        raise ValueError('{}: the level is too large'.format(name))
+
+    background_map, crates, trophies, character_coords = [], [], [], ()
+
+    for row, line in enumerate(lines):
+        tile_codes = []
+
+        for column, character in enumerate(line.ljust(width)):
+            # The walls are the only tiles of the background map,
+            # the other elements are stored separately
+            if character == XSB_WALL:
+                tile_codes.append(WALL)
+                continue
+
+            tile_codes.append(EMPTY)
+
+            if character in (XSB_CRATE, XSB_CRATE_ON_TROPHY):
+                crates.append((column, row))
+
+            if character in (XSB_TROPHY, XSB_CRATE_ON_TROPHY, XSB_CHARACTER_ON_TROPHY):
+                trophies.append((column, row))
+
+            if character in (XSB_CHARACTER, XSB_CHARACTER_ON_TROPHY):
+                # A level has only one character
+                if character_coords:
+                    raise ValueError('{}: several characters in the level'.format(name))
+
+                character_coords = (column, row)
+
+            elif character not in XSB_FLOORS + XSB_CRATE + XSB_CRATE_ON_TROPHY + XSB_TROPHY:
+                raise ValueError('{}: invalid character {!r}'.format(name, character))
+
+        background_map.append(tile_codes)
+
+    # A level without character cannot be played
+    if not character_coords:
+        raise ValueError('{}: no character in the level'.format(name))
+
+    return (background_map, crates, trophies, character_coords)
+
+
+class LevelCollection():
+    """Class giving access to the levels of a collection file.
+    The index of the collection is built the first time it is opened,
+    and then reloaded from the cache directory while the file is unchanged."""
+
+    def __init__(self, filename, cache_path=LEVEL_CACHE_PATH):
+        """Constructor method. It loads or builds the index of the collection."""
+
+        self.filename = filename
+        self.cache_path = cache_path
+
+        stat = os.stat(filename)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+
+        # Byte offset and length of each level in the file
+        self.offsets, self.lengths = array('Q'), array('I')
+
+        if not self.load_index():
+            self.build_index()
+            self.save_index()
+
+    def __len__(self):
+        """Method returning the number of levels in the collection."""
+        return len(self.offsets)
+
+    def __getitem__(self, number):
+        """Method returning the level of the given <number> (starting from 0),
+        as the tuple returned by the read_level function.
+        An IndexError is raised if the level does not exist."""
+
+        return parse_board(self.board_lines(number), self.reference(number))
+
+    def reference(self, number):
+        """Method returning the reference of the level of the given <number>
+        (starting from 0, whereas the references start from 1)."""
+        return '{}{}{}'.format(self.filename, LEVEL_REFERENCE_SEPARATOR, number + 1)
+
+    def board_lines(self, number):
+        """Method reading the lines of the level of the given <number> (starting
+        from 0) in the collection file: only this level is read from the disk."""
+
+        with open(self.filename, 'rb') as collection:
+            collection.seek(self.offsets[number])
+            data = collection.read(self.lengths[number])
+
+        return data.decode('latin-1').splitlines()
+
+    def build_index(self):
+        """Method reading the collection file once, line by line, to find the
+        offset of each level: a level is a block of consecutive board lines."""
+
+        self.offsets, self.lengths = array('Q'), array('I')
+
+        offset, start = 0, None
+
+        with open(self.filename, 'rb') as collection:
+            for line in collection:
+                if is_board_line(line.rstrip(b'\r\n')):
+                    if start is None:
+                        start = offset
+
+                elif start is not None:
+                    self.offsets.append(start)
+                    self.lengths.append(offset - start)
+                    start = None
+
+                offset += len(line)
+
+        # The last level may end with the file
+        if start is not None:
+            self.offsets.append(start)
+            self.lengths.append(offset - start)
+
+    def index_path(self):
+        """Method returning the path of the index file of the collection."""
+
+        path_digest = hashlib.blake2b(os.path.abspath(self.filename).encode(),
+                                      digest_size=6).hexdigest()
+
+        return os.path.join(self.cache_path, '{}-{}.idx'.format(
+            os.path.basename(self.filename), path_digest))
+
+    def load_index(self):
+        """Method loading the index of the collection from the cache directory.
+        It returns False if there is no index, or if the collection has changed."""
+
+        try:
+            with open(self.index_path(), 'rb') as index:
+                data = index.read()
+
+            (magic, version, mtime, size, count) = LEVEL_INDEX_HEADER.unpack_from(data)
+
+        except (OSError, struct.error):
+            return False
+
+        if magic != LEVEL_INDEX_MAGIC or version != LEVEL_INDEX_VERSION \
+                or (mtime, size) != self.signature \
+                or len(data) != LEVEL_INDEX_HEADER.size + 12 * count:
+            return False
+
+        position = LEVEL_INDEX_HEADER.size
+
+        self.offsets = array('Q', data[position:position + 8 * count])
+        self.lengths = array('I', data[position + 8 * count:])
+
+        # The index is stored in little-endian order
+        if sys.byteorder == 'big':
+            self.offsets.byteswap()
+            self.lengths.byteswap()
+
+        return True
+
+    def save_index(self):
+        """Method saving the index of the collection in the cache directory.
+        It returns False if the cache cannot be written."""
+
+        offsets, lengths = array('Q', self.offsets), array('I', self.lengths)
+
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+            lengths.byteswap()
+
+        path = self.index_path()
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        try:
+            os.makedirs(self.cache_path, exist_ok=True)
+
+            with open(temporary_path, 'wb') as index:
+                index.write(LEVEL_INDEX_HEADER.pack(
+                    LEVEL_INDEX_MAGIC, LEVEL_INDEX_VERSION,
+                    self.signature[0], self.signature[1], len(offsets)))
+                index.write(offsets.tobytes())
+                index.write(lengths.tobytes())
+
+            os.replace(temporary_path, path)
+
+        except OSError:
+            return False
+
+        return True
+
+
+# Collections already opened, by path
+open_collections = {}
+
+
+def open_collection(filename):
+    """Function returning the LevelCollection of the file <filename>.
+    The collections are kept open, unless their file has changed."""
+
+    collection = open_collections.get(filename)
+    stat = os.stat(filename)
+
+    if collection is None or collection.signature != (stat.st_mtime_ns, stat.st_size):
+        collection = open_collections[filename] = LevelCollection(filename)
+
+    return collection
+
+
+def split_reference(reference):
+    """Function splitting a level <reference> into a tuple (path, number), where
+    number starts from 0, or is None if the reference is a single level file."""
+
+    (path, separator, number) = reference.rpartition(LEVEL_REFERENCE_SEPARATOR)
+
+    if separator and number.isdigit() and is_collection(path):
+        return (path, int(number) - 1)
+
+    return (reference, None)
+
+
+def collection_references(filename):
+    """Function returning the references of all the levels of a collection."""
+
+    collection = open_collection(filename)
+
+    return [collection.reference(number) for number in range(len(collection))]
+
+
+def read_level_reference(reference):
+    """Function reading the level designated by <reference>: a single level file,
+    or a level of a collection. It returns the same tuple as the read_level
+    function. A ValueError is raised if the level is not valid."""
+
+    (path, number) = split_reference(reference)
+
+    if number is None:
+        return read_level(path)
+
+    collection = open_collection(path)
+
+    if not 0 <= number < len(collection):
+        raise ValueError('{}: no such level in the collection'.format(reference))
+
+    return collection[number]
@@ -2,15 +2,39 @@
 This module contains the main program of the Mario Sokoban.
 Specifically, it displays the different views of the game (menus,
 level editor, the game itself...)
+
+The views are created the first time they are displayed, and the assets of
+the game are read in the background while the main menu is displayed, so that
+the first frame appears as soon as possible.
+
+Usage: python main.py [--startup-time]
 """
 
+import time
+
+# Launch time of the program, used to measure the time to the first frame
+# (it is taken before importing pygame, which is part of the startup)
+LAUNCH_TIME = time.perf_counter()
+
+import argparse
+import sys
+
 import pygame
+from assets import asset_cache
+from event_loop import LoopDriver
 from game import GameManager
-from menu import MenuManager, get_main_menu_elements, get_level_menu_elements
+from menu import (LevelMenuManager, MenuManager, get_main_menu_elements,
+                  next_level_reference)
 from constants import (WINDOW_SIZE, WINDOW_TITLE, WINDOW_ICON_PATH,
-                       GAME_VIEW, MAIN_MENU_VIEW, LEVEL_CHOICE_MENU_VIEW)
+                       ASSET_PRELOAD_PATHS, GAME_VIEW, MAIN_MENU_VIEW,
+                       LEVEL_CHOICE_MENU_VIEW)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play the Mario Sokoban.')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='print the time to the first frame (in milliseconds) and quit')
+    options = parser.parse_args()
+
     pygame.init()
 
     # Initialization of the window
@@ -20,19 +44,31 @@ if __name__ == '__main__':
     pygame.display.set_icon(pygame.image.load(
         WINDOW_ICON_PATH).convert_alpha())  # Icon
 
+    # Driver of the main loops, shared by all the views
+    loop_driver = LoopDriver(launch_time=LAUNCH_TIME)
+
+    # Once the main menu is displayed, the assets of the game are read in the background
+    loop_driver.call_after_first_frame(
+        lambda: asset_cache.preload(ASSET_PRELOAD_PATHS))
+
+    if options.startup_time:
+        def report_startup_time():
+            """Function printing the time to the first frame, and quitting."""
+            print('{:.1f}'.format(1000 * loop_driver.time_to_first_frame))
+            sys.exit()
+
+        loop_driver.call_after_first_frame(report_startup_time)
+
     # Currently displayed view
     view = MAIN_MENU_VIEW
 
-    # Initialization of the main menu
+    # Initialization of the main menu (the other views are created when
+    # they are displayed for the first time)
     (main_menu_buttons, main_menu_sprites) = get_main_menu_elements()
-    main_menu = MenuManager(screen, main_menu_buttons, main_menu_sprites)
+    main_menu = MenuManager(
+        screen, main_menu_buttons, main_menu_sprites, loop_driver)
 
-    # Initialization of the levels menu
-    (level_menu_buttons, level_menu_sprites) = get_level_menu_elements()
-    level_menu = MenuManager(screen, level_menu_buttons, level_menu_sprites)
-
-    # Initialisation of the game
-    game = GameManager(screen)
+    level_menu, game = None, None
 
     # Main loop
     while True:
@@ -41,12 +77,34 @@ if __name__ == '__main__':
             view = main_menu.mainloop()
 
         elif view == LEVEL_CHOICE_MENU_VIEW:
+            # Initialization of the levels menu
+            if level_menu is None:
+                level_menu = LevelMenuManager(screen, loop_driver)
+
             (view, next_level) = level_menu.mainloop()
 
         elif view == GAME_VIEW:
-            view = LEVEL_CHOICE_MENU_VIEW
+            # Initialisation of the game
+            if game is None:
+                game = GameManager(screen, loop_driver)
+
+            # A level which cannot be read or parsed leads back to the level menu
+            try:
+                game.parse(next_level, 0)
+
+            except (OSError, ValueError) as error:
+                print(error, file=sys.stderr)
+                view = LEVEL_CHOICE_MENU_VIEW
+                continue
+
+            view = game.mainloop()
+
+            # Once a level is completed, the next one is opened at once
+            # (or the level menu, after the last level)
+            if view == GAME_VIEW:
+                next_level = next_level_reference(next_level)
 
-            game.parse(next_level, 0)
-            game.mainloop()
+                if next_level is None:
+                    view = LEVEL_CHOICE_MENU_VIEW
 
     pygame.quit()
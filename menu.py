@@ -8,77 +8,181 @@ from os import listdir
 
 import pygame
 
-from constants import (GAME_VIEW, LEVEL_MENU_BUTTONS_SIZE,
-                       LEVEL_MENU_LEVELS_PATH, LEVEL_MENU_TITLE_SIZE,
+from assets import asset_cache
+from constants import (GAME_VIEW, LEVEL_CHOICE_MENU_VIEW,
+                       LEVEL_MENU_BUTTONS_SIZE, LEVEL_MENU_LEVELS_PATH,
+                       LEVEL_MENU_NEXT_PAGE_KEY, LEVEL_MENU_NEXT_PAGE_TEXT,
+                       LEVEL_MENU_PAGE_BUTTON_SIZE, LEVEL_MENU_PAGE_TEXT,
+                       LEVEL_MENU_PREVIOUS_PAGE_KEY,
+                       LEVEL_MENU_PREVIOUS_PAGE_TEXT, LEVEL_MENU_TITLE_SIZE,
                        LEVEL_MENU_TITLE_TEXT, LEVEL_MENU_TOP_MARGIN,
                        MAIN_MENU_BUTTONS, MAIN_MENU_BUTTONS_SIZE,
                        MAIN_MENU_BUTTONS_Y, MAIN_MENU_SPRITES, MAIN_MENU_VIEW,
                        MENU_BACK_BUTTON_SIZE, MENU_BACK_BUTTON_TEXT,
                        MENU_BACKGROUND_COLOR, MENU_BUTTONS_MARGIN,
-                       UI_FONT_PATH, UI_TEXT_COLOR, WINDOW_SIZE)
-from user_interface import ImageSprite, TextButton
+                       PROFILER_BACKGROUND, PROFILER_DISPLAY, PROFILER_EVENTS,
+                       PROFILER_HOVER, PROFILER_OVERLAY, PROFILER_SPRITES,
+                       PROFILER_TOGGLE_KEY, THUMBNAIL_EVENT, UI_FONT_PATH,
+                       UI_TEXT_COLOR, WINDOW_SIZE)
+from core_constants import LEVEL_REFERENCE_SEPARATOR
+from event_loop import LoopDriver
+from level_cache import load_level
+from level_collection import collection_references, is_collection
+from profiler import profiler
+from thumbnails import thumbnail_renderer
+from user_interface import ImageSprite, LevelButton, TextButton
 
 
 class MenuManager():
     """Generic class managing a menu with a set of buttons and sprites to display"""
 
-    def __init__(self, screen, buttons, sprites):
-        """Constructor method. It initializes the image of the menu and the buttons."""
+    def __init__(self, screen, buttons, sprites, loop_driver=None):
+        """Constructor method. It initializes the image of the menu and the buttons.
+        <loop_driver> is the LoopDriver pacing the frames (a new one by default)."""
 
         # First, we store the screen as an attribute
         self.screen = screen
 
+        # Driver of the main loop, shared with the other views
+        self.loop_driver = loop_driver if loop_driver is not None else LoopDriver()
+
         # Then we can initialize the background of the menu
         self.background = pygame.Surface(WINDOW_SIZE)
         self.background.fill(MENU_BACKGROUND_COLOR)
 
-        # We create a sprite group for the buttons
+        # We create a sprite group for the buttons, and one for the other sprites
         self.buttons_group = pygame.sprite.Group()
         self.buttons_actions = []
+        self.sprites_group = pygame.sprite.Group()
+
+        self.set_elements(buttons, sprites)
+
+    def set_elements(self, buttons, sprites):
+        """Method replacing the <buttons> (list of tuples (button, action))
+        and the <sprites> displayed in the menu."""
+
+        self.buttons_group.empty()
+        self.buttons_actions = []
 
         for button in buttons:
             self.buttons_group.add(button[0])
             self.buttons_actions.append(button[1])
 
-        # Then we create a sprite group for the other sprites
-        self.sprites_group = pygame.sprite.Group()
+        self.sprites_group.empty()
 
         for sprite in sprites:
             self.sprites_group.add(sprite)
 
+    def show_buttons(self):
+        """Method called when the buttons are displayed: they are updated, so that
+        they do not appear hovered, and the buttons displayed on the screen can load
+        their content (for instance the thumbnails of the levels)."""
+
+        self.buttons_group.update((0, 0))
+        screen_rect = self.screen.get_rect()
+
+        for button in self.buttons_group:
+            if button.rect.colliderect(screen_rect):
+                button.shown()
+                button.refresh()
+
+    def handle_action(self, action):
+        """Method called when the button of the <action> is clicked. It returns the
+        value returned by the main loop, or None if the menu stays displayed
+        (the subclasses can handle some actions within the menu)."""
+        return action
+
+    def handle_event(self, event):  # pylint: disable=unused-argument
+        """Method called with the other events of the main loop (the subclasses can
+        use them). It returns True if the menu has to be drawn again."""
+        return False
+
+    def leave(self):
+        """Method called when the menu is left (the subclasses can stop
+        the work they do in the background)."""
+
     def mainloop(self):
         """Method called to invoke the main loop of the menu (opening it).
         It returns a view code, which corresponds to the next view to be displayed."""
 
-        # We update the buttons group, so that the buttons do not appear hovered
-        self.buttons_group.update((0, 0))
+        self.show_buttons()
+
+        # The menu is drawn at the first frame, then only when an event changes it
+        redraw = True
 
         while True:
-            # Events processing
-            for event in pygame.event.get():
+            # Events processing (waits for the next event, since nothing is animated)
+            events = self.loop_driver.events()
+            profiler.begin_frame()
+
+            for event in events:
                 if event.type == pygame.QUIT:
+                    self.leave()
                     sys.exit()
 
+                # The profiler is shown or hidden
+                if event.type == pygame.KEYDOWN and event.key == PROFILER_TOGGLE_KEY:
+                    profiler.toggle()
+                    profiler.begin_frame()
+                    redraw = True
+
+                # The content of some buttons has been loaded
+                if event.type == THUMBNAIL_EVENT:
+                    for button in self.buttons_group:
+                        redraw = button.refresh() or redraw
+
                 # If the mouse moves, we have to update the buttons
                 if event.type == pygame.MOUSEMOTION:
+                    profiler.mark(PROFILER_EVENTS)
                     self.buttons_group.update(pygame.mouse.get_pos())
+                    profiler.mark(PROFILER_HOVER)
+                    redraw = True
 
                 # If the mouse is clicked, we have to check for all the buttons
                 # If one is clicked, we will change the view accordingly
-                if event.type == pygame.MOUSEBUTTONUP:
+                # (the mouse wheel, which also releases buttons, is ignored)
+                if event.type == pygame.MOUSEBUTTONUP and event.button not in (4, 5):
                     mouse_position = pygame.mouse.get_pos()
+                    clicked = [self.buttons_actions[index]
+                               for index, button in enumerate(self.buttons_group)
+                               if button.collides(mouse_position)]
+
+                    if clicked:
+                        action = self.handle_action(clicked[0])
+
+                        if action is not None:
+                            self.leave()
+                            return action
+
+                        # The buttons have changed (for instance the page of the menu)
+                        self.buttons_group.update(mouse_position)
+                        redraw = True
+
+                redraw = self.handle_event(event) or redraw
+
+            if not redraw:
+                continue
 
-                    for index, button in enumerate(self.buttons_group):
-                        if button.collides(mouse_position):
-                            return self.buttons_actions[index]
+            profiler.mark(PROFILER_EVENTS)
 
             # We draw all the elements of the menu
             self.screen.blit(self.background, (0, 0))
+            profiler.mark(PROFILER_BACKGROUND)
+
             self.buttons_group.draw(self.screen)
             self.sprites_group.draw(self.screen)
+            profiler.mark(PROFILER_SPRITES)
+
+            profiler.draw_overlay(self.screen)
+            profiler.mark(PROFILER_OVERLAY)
 
             # Updating the screen
             pygame.display.flip()
+            profiler.mark(PROFILER_DISPLAY)
+            profiler.end_frame()
+            self.loop_driver.frame_drawn()
+
+            redraw = False
 
 ########################### Main Menu ##############################
 
@@ -115,47 +219,155 @@ def get_main_menu_elements():
 ########################### Level Menu #############################
 
 
-def get_level_menu_elements():
-    """Function returning the buttons
-    displayed in the level menu."""
+def level_reference(level):
+    """Function returning the reference of the level opened by the button
+    of the file <level>: the file itself, or the first level of a collection."""
+
+    path = '{}/{}'.format(LEVEL_MENU_LEVELS_PATH, level)
+
+    if is_collection(path):
+        return '{}{}1'.format(path, LEVEL_REFERENCE_SEPARATOR)
+
+    return path
+
+
+def level_references():
+    """Function returning the references of all the levels of the level menu, in
+    order: the level files of the levels directory, and each level of its collections
+    (found with the index of the collection, without parsing the levels)."""
+
+    references = []
+
+    for level in sorted(listdir(LEVEL_MENU_LEVELS_PATH)):
+        path = '{}/{}'.format(LEVEL_MENU_LEVELS_PATH, level)
+
+        if not is_collection(path):
+            references.append(path)
+            continue
+
+        # A collection which cannot be read is left out
+        try:
+            references += collection_references(path)
+
+        except OSError:
+            continue
+
+    return references
+
+
+def next_level_reference(reference):
+    """Function returning the reference of the level following <reference> in the
+    level menu. The levels which cannot be read or parsed are skipped. It returns
+    None if there is no level to open after <reference>."""
+
+    references = level_references()
+
+    if reference not in references:
+        return None
+
+    for reference in references[references.index(reference) + 1:]:
+        # We check that the level can be parsed (it is then read from the
+        # level cache when it is opened)
+        try:
+            load_level(reference)
+
+        except (OSError, ValueError):
+            continue
+
+        return reference
+
+    return None
+
 
-    # List of the files contained in the levels directory
-    # We sort it, so that the levels are in ascending order
-    levels_list = sorted(listdir(LEVEL_MENU_LEVELS_PATH))
+def level_menu_grid():
+    """Function returning the layout of the buttons of the levels in a page of the
+    level menu, as a tuple (columns, rows, x): the number of buttons in a row and
+    in a column, and the abscissa of the first column."""
 
-    # List of all the buttons of the level menu
+    columns = WINDOW_SIZE[0] // (LEVEL_MENU_BUTTONS_SIZE[0] + MENU_BUTTONS_MARGIN)
+    x_value = (WINDOW_SIZE[0] - columns * (LEVEL_MENU_BUTTONS_SIZE[0] + MENU_BUTTONS_MARGIN)
+               + MENU_BUTTONS_MARGIN) // 2
+
+    # The buttons are between the title and the 'back to main menu' button
+    height = WINDOW_SIZE[1] - LEVEL_MENU_TOP_MARGIN - MENU_BACK_BUTTON_SIZE[1] \
+        - MENU_BUTTONS_MARGIN
+    rows = max(1, height // (LEVEL_MENU_BUTTONS_SIZE[1] + MENU_BUTTONS_MARGIN))
+
+    return (columns, rows, x_value)
+
+
+def level_menu_page_count(references):
+    """Function returning the number of pages needed by the level menu
+    to display the levels of the <references> list."""
+
+    (columns, rows, _) = level_menu_grid()
+
+    return max(1, -(-len(references) // (columns * rows)))
+
+
+def get_level_menu_elements(references=None, page=0):
+    """Function returning the buttons and sprites displayed in the <page> (starting
+    from 0) of the level menu, for the levels of the <references> list (all the
+    levels of the menu by default). The buttons of the other pages are not created."""
+
+    if references is None:
+        references = level_references()
+
+    (columns, rows, x_value) = level_menu_grid()
+    page_count = level_menu_page_count(references)
+    first = page * columns * rows
+
+    # List of all the buttons of the page
     level_menu_buttons = []
-    nb_horizontal_buttons = WINDOW_SIZE[0] // (
-        LEVEL_MENU_BUTTONS_SIZE[0] + MENU_BUTTONS_MARGIN)
-    x_value = (WINDOW_SIZE[0] - nb_horizontal_buttons *
-               (LEVEL_MENU_BUTTONS_SIZE[0] + MENU_BUTTONS_MARGIN) + MENU_BUTTONS_MARGIN) // 2
 
-    # For each file, we create a button
-    for index, level in enumerate(levels_list):
-        level_menu_buttons.append((TextButton(
+    # For each level, we create a button (which displays a thumbnail of the level)
+    for index, reference in enumerate(references[first:first + columns * rows]):
+        level_menu_buttons.append((LevelButton(
             pygame.Rect(
-                (x_value + (index % nb_horizontal_buttons * (LEVEL_MENU_BUTTONS_SIZE[0] + MENU_BUTTONS_MARGIN)),
-                 (index // nb_horizontal_buttons) * (LEVEL_MENU_BUTTONS_SIZE[1] + MENU_BUTTONS_MARGIN) + LEVEL_MENU_TOP_MARGIN),
+                (x_value + (index % columns * (LEVEL_MENU_BUTTONS_SIZE[0] + MENU_BUTTONS_MARGIN)),
+                 (index // columns) * (LEVEL_MENU_BUTTONS_SIZE[1] + MENU_BUTTONS_MARGIN) + LEVEL_MENU_TOP_MARGIN),
                 LEVEL_MENU_BUTTONS_SIZE
             ),
-            str(index + 1),
-        ), (GAME_VIEW, '{}/{}'.format(LEVEL_MENU_LEVELS_PATH, level))))
+            str(first + index + 1),
+            reference
+        ), (GAME_VIEW, reference)))
 
     # We create the 'back to main menu' button
+    back_button_y = WINDOW_SIZE[1] - MENU_BUTTONS_MARGIN - MENU_BACK_BUTTON_SIZE[1]
+
     level_menu_buttons.append((TextButton(
         pygame.Rect(
-            ((WINDOW_SIZE[0] - MENU_BACK_BUTTON_SIZE[0]) // 2,
-             WINDOW_SIZE[1] - MENU_BUTTONS_MARGIN - MENU_BACK_BUTTON_SIZE[1]),
+            ((WINDOW_SIZE[0] - MENU_BACK_BUTTON_SIZE[0]) // 2, back_button_y),
             MENU_BACK_BUTTON_SIZE
         ),
         MENU_BACK_BUTTON_TEXT
     ), (MAIN_MENU_VIEW, '')))
 
-    # We create the title image of the menu
-    title_font = pygame.font.Font(UI_FONT_PATH, LEVEL_MENU_TITLE_SIZE)
+    # The buttons leading to the previous and to the next pages (their action
+    # keeps the level menu displayed, with the number of the page to display)
+    if page > 0:
+        level_menu_buttons.append((TextButton(
+            pygame.Rect((MENU_BUTTONS_MARGIN, back_button_y), LEVEL_MENU_PAGE_BUTTON_SIZE),
+            LEVEL_MENU_PREVIOUS_PAGE_TEXT
+        ), (LEVEL_CHOICE_MENU_VIEW, page - 1)))
+
+    if page < page_count - 1:
+        level_menu_buttons.append((TextButton(
+            pygame.Rect(
+                (WINDOW_SIZE[0] - MENU_BUTTONS_MARGIN - LEVEL_MENU_PAGE_BUTTON_SIZE[0],
+                 back_button_y),
+                LEVEL_MENU_PAGE_BUTTON_SIZE
+            ),
+            LEVEL_MENU_NEXT_PAGE_TEXT
+        ), (LEVEL_CHOICE_MENU_VIEW, page + 1)))
+
+    # We create the title image of the menu (with the number of the page)
+    title_font = asset_cache.font(UI_FONT_PATH, LEVEL_MENU_TITLE_SIZE)
+    title_text = LEVEL_MENU_TITLE_TEXT if page_count == 1 else \
+        LEVEL_MENU_PAGE_TEXT.format(LEVEL_MENU_TITLE_TEXT, page + 1, page_count)
 
     # Size of the rendered text
-    title_size = title_font.size(LEVEL_MENU_TITLE_TEXT)
+    title_size = title_font.size(title_text)
 
     # We intialize the sprite representing the title
     title_sprite = pygame.sprite.Sprite()
@@ -167,6 +379,93 @@ def get_level_menu_elements():
     )
 
     title_sprite.image = title_font.render(
-        LEVEL_MENU_TITLE_TEXT, True, UI_TEXT_COLOR)
+        title_text, True, UI_TEXT_COLOR)
 
     return (level_menu_buttons, [title_sprite])
+
+
+class LevelMenuManager(MenuManager):
+    """Class managing the level menu. The levels are displayed by pages, whose
+    buttons are only created when they are displayed for the first time, so that
+    collections of thousands of levels can be browsed: a level is only parsed
+    when the thumbnail of its button is rendered, or when it is opened."""
+
+    def __init__(self, screen, loop_driver=None):
+        """Constructor method. It lists the levels of the menu, and creates
+        the first page."""
+
+        self.references = level_references()
+        self.page_count = level_menu_page_count(self.references)
+
+        # Elements of the pages already displayed (with their thumbnails)
+        self.pages = {}
+        self.page = 0
+
+        MenuManager.__init__(self, screen, *self.page_elements(0), loop_driver)
+
+    def page_elements(self, page):
+        """Method returning the buttons and sprites of the <page> (see the
+        get_level_menu_elements function), created the first time."""
+
+        if page not in self.pages:
+            self.pages[page] = get_level_menu_elements(self.references, page)
+
+        return self.pages[page]
+
+    def hide_buttons(self):
+        """Method called when the buttons of the current page are no longer
+        displayed: their thumbnails which are not rendered yet are cancelled."""
+
+        for button in self.buttons_group:
+            button.hidden()
+
+        thumbnail_renderer.cancel()
+
+    def show_page(self, page):
+        """Method displaying the <page> of the menu (starting from 0), if it exists."""
+
+        if not 0 <= page < self.page_count or page == self.page:
+            return
+
+        self.hide_buttons()
+        self.page = page
+        self.set_elements(*self.page_elements(page))
+        self.show_buttons()
+
+    def handle_action(self, action):
+        """Method changing the page when the buttons of the pages are clicked
+        (the other actions leave the menu, see the MenuManager class)."""
+
+        (view, page) = action
+
+        if view == LEVEL_CHOICE_MENU_VIEW:
+            self.show_page(page)
+            return None
+
+        return action
+
+    def handle_event(self, event):
+        """Method changing the page with the mouse wheel and the keys of the pages.
+        It returns True if the page has changed."""
+
+        (previous_page, page) = (self.page, self.page)
+
+        if event.type == pygame.MOUSEWHEEL and event.y:
+            page -= 1 if event.y > 0 else -1
+
+        elif event.type == pygame.KEYDOWN and event.key == LEVEL_MENU_PREVIOUS_PAGE_KEY:
+            page -= 1
+
+        elif event.type == pygame.KEYDOWN and event.key == LEVEL_MENU_NEXT_PAGE_KEY:
+            page += 1
+
+        self.show_page(page)
+
+        return self.page != previous_page
+
+    def leave(self):
+        """Method stopping the rendering of the thumbnails when the menu is left
+        (the missing ones are requested again when it is displayed again)."""
+
+        self.hide_buttons()
+        thumbnail_renderer.shutdown()
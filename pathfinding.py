@@ -0,0 +1,128 @@
+"""
+This module finds the paths followed by the character to walk to the tiles
+clicked by the user, without pushing any crate.
+
+The paths come from a breadth-first search from the tile of the character over
+the obstacles of the board (walls and crates). The obstacles are only computed
+again when a push changes the positions of the crates, and the search is kept
+between the clicks: it is only extended as far as needed to reach the clicked
+tile, and started again when the character is on another tile.
+This module does not depend on pygame.
+"""
+
+from core_constants import CRATE_FLAG, WALL_FLAG
+
+# Translation table turning a board into a map of the obstacles (non-zero bytes)
+OBSTACLES_TABLE = bytes(1 if value & (WALL_FLAG | CRATE_FLAG) else 0 for value in range(256))
+
+# Value marking the start tile of the search in the table of the moves
+# (the other tiles store the code of the move reaching them, plus one)
+SOURCE_MARKER = 255
+
+
+class PathFinder():
+    """Class computing the shortest paths of the character on a SokobanState."""
+
+    def __init__(self, state):
+        """Constructor method. <state> is the SokobanState whose character walks."""
+
+        self.state = state
+
+        # Positions of the crates for which the obstacles were computed, and map of
+        # the obstacles (a non-zero byte for each wall or crate)
+        self.crates, self.obstacles = None, None
+
+        # Start tile of the search, move reaching each tile (0 if it has not been
+        # reached yet), tiles which are reached or are obstacles, and tiles reached
+        # (the ones after <position> have not been expanded yet)
+        self.source = None
+        self.moves, self.blocked = bytearray(), bytearray()
+        self.tiles, self.position = [], 0
+
+    def update(self):
+        """Method computing the obstacles again if the crates moved,
+        and starting a new search if the character is on another tile."""
+
+        state = self.state
+
+        if self.crates is None or self.crates != state.crates:
+            self.crates = frozenset(state.crates)
+            self.obstacles = state.board.translate(OBSTACLES_TABLE)
+            self.source = None
+
+        if self.source != state.player:
+            self.source = state.player
+            self.moves = bytearray(len(state.board))
+            self.moves[self.source] = SOURCE_MARKER
+            self.blocked = bytearray(self.obstacles)
+            self.blocked[self.source] = 1
+            self.tiles, self.position = [self.source], 0
+
+    def search(self, target, max_tiles=None):
+        """Method extending the search until the <target> tile is reached, or until
+        all the reachable tiles have been reached. At most <max_tiles> new tiles are
+        reached if it is given. It returns True if the search is over (the path
+        to the <target> can then be built by the path_to method)."""
+
+        self.update()
+
+        # The obstacles and the tiles outside of the board are never reached
+        if not 0 <= target < len(self.moves) or self.obstacles[target]:
+            return True
+
+        moves, blocked, tiles = self.moves, self.blocked, self.tiles
+        (left, up, right, down) = self.state.offsets
+        append = tiles.append
+
+        position = self.position
+        end = len(tiles) + max_tiles if max_tiles is not None else len(blocked)
+
+        # The four moves are unrolled, since this loop visits every tile of the map
+        while position < len(tiles) and not moves[target] and len(tiles) < end:
+            tile = tiles[position]
+            position += 1
+
+            next_tile = tile + left
+            if not blocked[next_tile]:
+                blocked[next_tile], moves[next_tile] = 1, 1
+                append(next_tile)
+
+            next_tile = tile + up
+            if not blocked[next_tile]:
+                blocked[next_tile], moves[next_tile] = 1, 2
+                append(next_tile)
+
+            next_tile = tile + right
+            if not blocked[next_tile]:
+                blocked[next_tile], moves[next_tile] = 1, 3
+                append(next_tile)
+
+            next_tile = tile + down
+            if not blocked[next_tile]:
+                blocked[next_tile], moves[next_tile] = 1, 4
+                append(next_tile)
+
+        self.position = position
+
+        return position == len(tiles) or bool(moves[target])
+
+    def path_to(self, target):
+        """Method returning the shortest list of move codes leading the character
+        to the <target> tile without pushing any crate, or None if it cannot reach it."""
+
+        self.search(target)
+
+        if not 0 <= target < len(self.moves) or not self.moves[target]:
+            return None
+
+        # We walk back from the target to build the path
+        offsets, path = self.state.offsets, []
+
+        while target != self.source:
+            move = self.moves[target] - 1
+            path.append(move)
+            target -= offsets[move]
+
+        path.reverse()
+
+        return path
@@ -0,0 +1,260 @@
+"""
+This module contains the profiler of the main loops. When it is enabled (with
+PROFILER_TOGGLE_KEY), it measures the time spent in each phase of every frame
+(handling the events, drawing the background, blitting the sprites, updating
+the display...), keeps the last frames in a ring buffer, and displays an overlay
+with the frame rate, the frame times and the breakdown of the phases. The frames
+are saved on exit as a trace (in the trace event format of Chrome, which can be
+opened in chrome://tracing or Perfetto) or as CSV.
+
+When the profiler is disabled, each of its methods only checks a flag.
+"""
+
+import atexit
+import csv
+import json
+import os
+import time
+from array import array
+
+import pygame
+
+from assets import asset_cache
+from constants import (PROFILER_CAPACITY, PROFILER_OVERLAY_COLOR,
+                       PROFILER_OVERLAY_FONT_SIZE, PROFILER_OVERLAY_PERIOD,
+                       PROFILER_OVERLAY_RECT, PROFILER_PHASES,
+                       PROFILER_TRACE_FORMAT, PROFILER_TRACES_PATH,
+                       UI_FONT_PATH, UI_TEXT_COLOR)
+
+
+class FrameProfiler():
+    """Class measuring the duration of the phases of the frames.
+
+    A frame starts with the begin_frame method and ends with the end_frame method.
+    In between, each call to the mark method adds the time elapsed since the
+    previous mark (or since the start of the frame) to the given phase.
+    Each frame is stored in the ring buffer as a record of floats: the start of
+    the frame, its duration and the duration of each phase, in seconds."""
+
+    def __init__(self, phases=None, capacity=PROFILER_CAPACITY):
+        """Constructor method. <phases> is the list of the names of the phases
+        (PROFILER_PHASES by default), and <capacity> the number of frames kept
+        in the ring buffer."""
+
+        self.phases = list(PROFILER_PHASES if phases is None else phases)
+        self.capacity = capacity
+        self.enabled = False
+
+        # Ring buffer of the records, and total number of frames recorded
+        self.record_size = 2 + len(self.phases)
+        self.records = array('d', bytes(8 * self.record_size * capacity))
+        self.frame_count = 0
+
+        # Durations of the phases of the current frame, start of the frame
+        # and time of the last mark
+        self.durations = [0.0] * len(self.phases)
+        self.frame_start, self.last_mark = 0.0, 0.0
+
+        # Origin of the times of the records
+        self.origin = time.perf_counter()
+
+        # Image of the overlay, and time at which it was rendered
+        self.overlay_rect = pygame.Rect(PROFILER_OVERLAY_RECT)
+        self.overlay_image, self.overlay_time = None, 0.0
+
+        # The trace is saved on exit, if the profiler has been used
+        self.exit_handler_registered = False
+
+    def toggle(self):
+        """Method enabling or disabling the profiler."""
+
+        self.enabled = not self.enabled
+        self.overlay_image = None
+
+        if not self.exit_handler_registered:
+            atexit.register(self.save)
+            self.exit_handler_registered = True
+
+    def begin_frame(self):
+        """Method starting the measure of a frame."""
+
+        if not self.enabled:
+            return
+
+        self.frame_start = self.last_mark = time.perf_counter()
+
+        for phase in range(len(self.durations)):
+            self.durations[phase] = 0.0
+
+    def mark(self, phase):
+        """Method adding the time elapsed since the previous mark
+        to the <phase> (index in the list of the phases)."""
+
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        self.durations[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self):
+        """Method ending the measure of a frame, and storing it in the ring buffer."""
+
+        if not self.enabled or not self.frame_start:
+            return
+
+        position = self.frame_count % self.capacity * self.record_size
+
+        self.records[position] = self.frame_start - self.origin
+        self.records[position + 1] = time.perf_counter() - self.frame_start
+        self.records[position + 2:position + self.record_size] = array('d', self.durations)
+
+        self.frame_count += 1
+        self.frame_start = 0.0
+
+    def frames(self):
+        """Method returning the records of the frames kept in the ring buffer,
+        from the oldest to the most recent, as tuples of floats."""
+
+        count = min(self.frame_count, self.capacity)
+        first = self.frame_count - count
+
+        return [
+            tuple(self.records[position:position + self.record_size])
+            for position in (frame % self.capacity * self.record_size
+                             for frame in range(first, self.frame_count))
+        ]
+
+    def statistics(self):
+        """Method returning a dictionary with the number of frames drawn during the
+        last second ('fps'), the median and 99th percentile of the frame times
+        ('p50' and 'p99') and the mean duration of each phase ('phases'),
+        in milliseconds. It returns None if no frame has been recorded."""
+
+        frames = self.frames()
+
+        if not frames:
+            return None
+
+        last_second = time.perf_counter() - self.origin - 1
+        frame_times = sorted(frame[1] for frame in frames)
+
+        return {
+            'fps': sum(1 for frame in frames if frame[0] >= last_second),
+            'p50': 1000 * frame_times[len(frame_times) // 2],
+            'p99': 1000 * frame_times[int(0.99 * (len(frame_times) - 1))],
+            'phases': [1000 * sum(frame[2 + phase] for frame in frames) / len(frames)
+                       for phase in range(len(self.phases))]
+        }
+
+    def draw_overlay(self, screen):
+        """Method drawing the overlay on the <screen>. Its text is only rendered
+        again every PROFILER_OVERLAY_PERIOD seconds. It returns the rect of the
+        overlay, or None if the profiler is disabled."""
+
+        if not self.enabled:
+            return None
+
+        now = time.perf_counter()
+
+        if self.overlay_image is None or now - self.overlay_time >= PROFILER_OVERLAY_PERIOD:
+            self.overlay_image = self.render_overlay()
+            self.overlay_time = now
+
+        screen.blit(self.overlay_image, self.overlay_rect)
+
+        return self.overlay_rect
+
+    def render_overlay(self):
+        """Method rendering the image of the overlay with the current statistics."""
+
+        image = pygame.Surface(self.overlay_rect.size, pygame.SRCALPHA)
+        image.fill(PROFILER_OVERLAY_COLOR)
+
+        font = asset_cache.font(UI_FONT_PATH, PROFILER_OVERLAY_FONT_SIZE)
+        statistics = self.statistics()
+
+        if statistics is None:
+            lines = ['Profiler: no frame yet']
+
+        else:
+            lines = ['FPS: {}'.format(statistics['fps']),
+                     'p50: {:.2f} ms  p99: {:.2f} ms'.format(
+                         statistics['p50'], statistics['p99'])]
+            lines.extend('{}: {:.3f} ms'.format(name, duration)
+                         for name, duration in zip(self.phases, statistics['phases']))
+
+        line_height = font.get_linesize()
+
+        for index, line in enumerate(lines):
+            image.blit(font.render(line, True, UI_TEXT_COLOR),
+                       (4, 2 + index * line_height))
+
+        return image
+
+    def trace_events(self):
+        """Method returning the frames as a list of events of the trace event format
+        of Chrome (in microseconds). The phases of a frame are laid out one after the
+        other, in the order of the list of the phases, inside the event of the frame."""
+
+        events = []
+
+        for frame in self.frames():
+            start = 1e6 * frame[0]
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                           'ts': round(start, 3), 'dur': round(1e6 * frame[1], 3)})
+
+            for name, duration in zip(self.phases, frame[2:]):
+                if duration > 0:
+                    events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                                   'ts': round(start, 3), 'dur': round(1e6 * duration, 3)})
+                    start += 1e6 * duration
+
+        return events
+
+    def write_trace(self, output):
+        """Method writing the frames in the <output> file object, as a trace
+        in the JSON trace event format of Chrome."""
+
+        json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, output)
+
+    def write_csv(self, output):
+        """Method writing the frames in the <output> file object, as CSV:
+        one line per frame, with its start, its duration and the duration of
+        each phase, in milliseconds."""
+
+        writer = csv.writer(output)
+        writer.writerow(['start', 'frame'] + self.phases)
+
+        for frame in self.frames():
+            writer.writerow(['{:.4f}'.format(1000 * value) for value in frame])
+
+    def save(self, path=PROFILER_TRACES_PATH, trace_format=PROFILER_TRACE_FORMAT):
+        """Method saving the frames of the ring buffer in a new file of the <path>
+        directory, with the 'json' or 'csv' <trace_format>. It returns the path of
+        the file, or None if there is no frame or if it cannot be written."""
+
+        if not self.frame_count:
+            return None
+
+        filename = os.path.join(path, 'trace-{}.{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'), trace_format))
+
+        try:
+            os.makedirs(path, exist_ok=True)
+
+            with open(filename, 'w', newline='', encoding='utf-8') as output:
+                if trace_format == 'csv':
+                    self.write_csv(output)
+
+                else:
+                    self.write_trace(output)
+
+        except OSError:
+            return None
+
+        return filename
+
+
+# Profiler shared by the main loops
+profiler = FrameProfiler()
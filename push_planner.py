@@ -0,0 +1,287 @@
+"""
+This module plans the moves needed to push a crate to a given tile: the user
+drags a crate in the game, and the character pushes it there by itself.
+
+The search is a breadth-first search over the positions of the crate, combined
+with the area of the map in which the character is (the tiles around the crate
+which it can reach). For each position of the crate, the tiles around it are
+grouped by area once, and these groups are reused by all the states of the search
+with the crate on this tile. The plan is then turned into moves (walks and pushes).
+The plans are searched by a worker thread, with a time limit, so that the game
+stays responsive. This module does not depend on pygame.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+from core_constants import (CRATE_FLAG, PLANNER_CHECK_INTERVAL,
+                            PLANNER_TIME_LIMIT, WALL_FLAG)
+
+# Translation table turning a board into a map of the obstacles (non-zero bytes)
+OBSTACLES_TABLE = bytes(1 if value & (WALL_FLAG | CRATE_FLAG) else 0 for value in range(256))
+
+
+class PushSearch():
+    """Class searching the pushes moving a crate of a SokobanState to a target tile.
+    The other crates are not moved."""
+
+    def __init__(self, state, crate):
+        """Constructor method. <state> is the SokobanState (it is not modified),
+        and <crate> the index of the tile of the crate to move."""
+
+        self.state = state
+        self.crate = crate
+        self.offsets = state.offsets
+
+        # Obstacles of the board, without the moved crate
+        self.obstacles = state.board.translate(OBSTACLES_TABLE)
+        self.obstacles[crate] = 0
+
+        # Areas of the tiles around each position of the crate: for each position,
+        # a tuple giving for each neighbour the number of the first neighbour in the
+        # same area (-1 if the neighbour is an obstacle)
+        self.areas = {}
+
+    def neighbour_areas(self, crate):
+        """Method returning the areas of the neighbours of the tile <crate>,
+        when the moved crate is on it (see the areas attribute)."""
+
+        areas = self.areas.get(crate)
+
+        if areas is not None:
+            return areas
+
+        obstacles, offsets = self.obstacles, self.offsets
+        neighbours = [crate + offset for offset in offsets]
+        labels = [-1 if obstacles[tile] else None for tile in neighbours]
+
+        obstacles[crate] = 1
+
+        for side, start in enumerate(neighbours):
+            if labels[side] is not None:
+                continue
+
+            labels[side] = side
+
+            # Neighbours which have not been grouped yet
+            others = {tile: other for other, tile in enumerate(neighbours)
+                      if labels[other] is None}
+
+            # Breadth-first search from the neighbour, until all the other
+            # neighbours are found (or the whole area is visited)
+            visited = {start}
+            tiles = [start]
+
+            for tile in tiles:
+                if not others:
+                    break
+
+                for offset in offsets:
+                    next_tile = tile + offset
+
+                    if next_tile not in visited and not obstacles[next_tile]:
+                        visited.add(next_tile)
+                        tiles.append(next_tile)
+
+                        if next_tile in others:
+                            labels[others.pop(next_tile)] = side
+
+        obstacles[crate] = 0
+
+        areas = self.areas[crate] = tuple(labels)
+
+        return areas
+
+    def initial_area(self):
+        """Method returning the area of the character around the crate
+        at the beginning, or None if it cannot reach any side of the crate."""
+
+        target_tiles = {self.crate + offset: side for side, offset in enumerate(self.offsets)}
+        areas = self.neighbour_areas(self.crate)
+
+        self.obstacles[self.crate] = 1
+
+        visited = {self.state.player}
+        tiles = [self.state.player]
+        area = None
+
+        for tile in tiles:
+            if tile in target_tiles:
+                area = areas[target_tiles[tile]]
+                break
+
+            for offset in self.offsets:
+                next_tile = tile + offset
+
+                if next_tile not in visited and not self.obstacles[next_tile]:
+                    visited.add(next_tile)
+                    tiles.append(next_tile)
+
+        self.obstacles[self.crate] = 0
+
+        return area
+
+    def search(self, target, time_limit=None, cancelled=None):
+        """Method searching the shortest list of pushes moving the crate to the
+        <target> tile. It stops after <time_limit> seconds, or once the <cancelled>
+        event (a threading.Event) is set. It returns a tuple (status, pushes), where
+        status is 'planned', 'impossible', 'timeout' or 'cancelled', and pushes the
+        list of the tuples (crate, move code) of the plan (None if there is no plan)."""
+
+        deadline = time.perf_counter() + time_limit if time_limit is not None else None
+
+        if target == self.crate:
+            return ('planned', [])
+
+        area = self.initial_area()
+
+        if area is None or self.obstacles[target]:
+            return ('impossible', None)
+
+        start = (self.crate, area)
+
+        # For each visited state, the previous state and the move of the push
+        previous_states = {start: None}
+        states = [start]
+        offsets, obstacles = self.offsets, self.obstacles
+
+        for count, state in enumerate(states):
+            if count % PLANNER_CHECK_INTERVAL == 0:
+                if cancelled is not None and cancelled.is_set():
+                    return ('cancelled', None)
+
+                if deadline is not None and time.perf_counter() > deadline:
+                    return ('timeout', None)
+
+            (crate, area) = state
+            areas = self.neighbour_areas(crate)
+
+            for move, offset in enumerate(offsets):
+                # The character pushes from the opposite side of the crate
+                side = (move + 2) % len(offsets)
+                destination = crate + offset
+
+                if areas[side] != area or obstacles[destination]:
+                    continue
+
+                # After the push, the character is on the former tile of the crate
+                next_state = (destination, self.neighbour_areas(destination)[side])
+
+                if next_state in previous_states:
+                    continue
+
+                previous_states[next_state] = (state, move)
+
+                if destination == target:
+                    return ('planned', self.pushes(previous_states, next_state))
+
+                states.append(next_state)
+
+        return ('impossible', None)
+
+    def pushes(self, previous_states, state):
+        """Method returning the list of the pushes leading to <state>,
+        as tuples (crate, move code)."""
+
+        pushes = []
+
+        while previous_states[state] is not None:
+            (state, move) = previous_states[state]
+            pushes.append((state[0], move))
+
+        pushes.reverse()
+
+        return pushes
+
+
+def plan_moves(state, pushes):
+    """Function turning a list of <pushes> (tuples (crate, move code)) into the
+    list of the move codes played by the character (walks and pushes) from <state>.
+    It returns None if the pushes cannot be played."""
+
+    state = state.copy()
+    moves = []
+
+    for (crate, move) in pushes:
+        path = state.path_to(crate - state.offsets[move])
+
+        if path is None:
+            return None
+
+        for step in path + [move]:
+            state.move(step)
+
+        moves.extend(path)
+        moves.append(move)
+
+    return moves
+
+
+def plan_push(state, crate, target, time_limit=PLANNER_TIME_LIMIT, cancelled=None):
+    """Function searching the moves which push the crate at the <crate> tile of
+    <state> to the <target> tile (see the search method of PushSearch). It returns
+    a tuple (status, moves), where moves is the list of the move codes of the
+    character (None if there is no plan). The <state> is not modified."""
+
+    (status, pushes) = PushSearch(state, crate).search(target, time_limit, cancelled)
+
+    if pushes is None:
+        return (status, None)
+
+    moves = plan_moves(state, pushes)
+
+    return (status, moves) if moves is not None else ('impossible', None)
+
+
+class PushPlanner():
+    """Class searching the plans in a worker thread. Only the last requested plan
+    is searched: requesting a plan cancels the previous one. The thread is only
+    started when the first plan is requested."""
+
+    def __init__(self, time_limit=PLANNER_TIME_LIMIT):
+        """Constructor method. <time_limit> is the maximum duration of a search."""
+
+        self.time_limit = time_limit
+        self.executor = None
+
+        # Event cancelling the search in progress
+        self.cancelled = threading.Event()
+
+    def request(self, state, crate, target, callback):
+        """Method requesting the plan pushing the crate at the <crate> tile of <state>
+        to the <target> tile. The search uses a copy of the state. <callback> is
+        called with the tuple (status, moves) once the search is over: it is called
+        from the worker thread, and not at all if the plan has been cancelled."""
+
+        self.cancel()
+        self.cancelled = cancelled = threading.Event()
+
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+        future = self.executor.submit(
+            plan_push, state.copy(), crate, target, self.time_limit, cancelled)
+
+        def done(future):
+            """Function passing the plan to the callback."""
+
+            if cancelled.is_set() or future.exception() is not None:
+                return
+
+            callback(future.result())
+
+        future.add_done_callback(done)
+
+    def cancel(self):
+        """Method cancelling the plan being searched (if any)."""
+        self.cancelled.set()
+
+    def shutdown(self):
+        """Method cancelling the plan being searched, and stopping the thread."""
+
+        self.cancel()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
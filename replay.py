@@ -0,0 +1,227 @@
+"""
+This module records the games as compact replays, and plays them back.
+A replay stores the moves of the character packed on 2 bits each (the pushes
+are found again by playing the moves), with the reference and the digest of the
+level, the date of the game and its duration. It can be played without any
+display, or rendered in the window at a chosen speed.
+
+Usage: python replay.py <replay file> [--speed moves per second] [--headless]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+from core_constants import (MOVE_BLOCKED, MOVE_PUSH_FLAG, REPLAY_DEFAULT_SPEED,
+                            REPLAY_EXTENSION, REPLAY_MAGIC, REPLAY_VERSION,
+                            REPLAYS_PATH)
+from engine import SokobanState
+from level_collection import read_level_reference
+
+# Header of a replay file: magic, version, digest of the level, date of the game,
+# duration, number of moves, and length of the reference of the level
+REPLAY_HEADER = struct.Struct('<4sH16sddIH')
+
+# Move codes stored in each possible byte of packed moves
+UNPACKED_MOVES = [bytes((value & 3, value >> 2 & 3, value >> 4 & 3, value >> 6))
+                  for value in range(256)]
+
+
+def pack_moves(moves):
+    """Function packing the <moves> (bytes of move codes, with or without
+    MOVE_PUSH_FLAG) in bytes holding 4 moves each."""
+
+    codes = bytes(move & ~MOVE_PUSH_FLAG for move in moves)
+    codes += bytes(-len(codes) % 4)
+
+    return bytes(map(
+        lambda first, second, third, fourth:
+        first | second << 2 | third << 4 | fourth << 6,
+        codes[0::4], codes[1::4], codes[2::4], codes[3::4]
+    ))
+
+
+def unpack_moves(packed_moves, move_count):
+    """Function returning the <move_count> move codes stored in <packed_moves>."""
+    return b''.join(UNPACKED_MOVES[value] for value in packed_moves)[:move_count]
+
+
+class Replay():
+    """Class storing the replay of a game."""
+
+    __slots__ = ('level', 'level_hash', 'moves', 'move_count',
+                 'started', 'duration')
+
+    def __init__(self, level, level_hash, moves, move_count, started=0.0, duration=0.0):
+        """Constructor method. <level> is the reference of the level, <level_hash> its
+        digest, <moves> the packed moves, <move_count> the number of moves,
+        <started> the date of the game (as a timestamp) and <duration> its length
+        in seconds."""
+
+        self.level, self.level_hash = level, level_hash
+        self.moves, self.move_count = moves, move_count
+        self.started, self.duration = started, duration
+
+    @classmethod
+    def from_state(cls, state, level, started=0.0, duration=0.0):
+        """Method creating the replay of the history of moves of a SokobanState."""
+
+        return cls(level, state.level_hash(), pack_moves(state.history),
+                   len(state.history), started, duration)
+
+    def move_codes(self):
+        """Method returning the move codes of the replay (without the push flags)."""
+        return unpack_moves(self.moves, self.move_count)
+
+    def to_bytes(self):
+        """Method returning the content of the replay file."""
+
+        level = self.level.encode()
+
+        return REPLAY_HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION, bytes.fromhex(self.level_hash),
+            self.started, self.duration, self.move_count, len(level)
+        ) + level + self.moves
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Method reading a replay from the content of a replay file.
+        A ValueError is raised if the data is not a valid replay."""
+
+        try:
+            (magic, version, level_hash, started, duration, move_count,
+             level_length) = REPLAY_HEADER.unpack_from(data)
+
+        except struct.error as error:
+            raise ValueError('truncated replay') from error
+
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError('invalid replay')
+
+        position = REPLAY_HEADER.size + level_length
+        moves = bytes(data[position:])
+
+        if len(moves) != -(-move_count // 4):
+            raise ValueError('truncated replay')
+
+        return cls(bytes(data[REPLAY_HEADER.size:position]).decode(), level_hash.hex(),
+                   moves, move_count, started, duration)
+
+    def save(self, filename):
+        """Method saving the replay in the file <filename>."""
+
+        with open(filename, 'wb') as replay_file:
+            replay_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filename):
+        """Method loading a replay from the file <filename>."""
+
+        with open(filename, 'rb') as replay_file:
+            return cls.from_bytes(replay_file.read())
+
+
+def replay_path(level, started, path=REPLAYS_PATH):
+    """Function returning the path of the file of the replay of the <level>
+    started at the date <started>."""
+
+    name = os.path.basename(level).replace(os.extsep, '_')
+
+    return os.path.join(path, '{}-{}-{:03d}{}'.format(
+        name, time.strftime('%Y%m%d-%H%M%S', time.localtime(started)),
+        int(started * 1000) % 1000, REPLAY_EXTENSION))
+
+
+def save_replay(replay, path=REPLAYS_PATH):
+    """Function saving the <replay> in the replays directory.
+    It returns the path of the file, or None if it cannot be written."""
+
+    filename = replay_path(replay.level, replay.started, path)
+
+    try:
+        os.makedirs(path, exist_ok=True)
+        replay.save(filename)
+
+    except OSError:
+        return None
+
+    return filename
+
+
+def play_replay(replay, state=None):
+    """Function playing the <replay> without any display, on the <state> of its
+    level (read from the reference of the replay if it is not given).
+    It returns the state after the last move. A ValueError is raised if the
+    replay does not match the level, or if one of its moves is impossible."""
+
+    if state is None:
+        state = SokobanState(*read_level_reference(replay.level))
+
+    if state.level_hash() != replay.level_hash:
+        raise ValueError('{}: the replay does not match the level'.format(replay.level))
+
+    move = state.move
+
+    for index, code in enumerate(replay.move_codes()):
+        if move(code) == MOVE_BLOCKED:
+            raise ValueError('{}: impossible move {}'.format(replay.level, index + 1))
+
+    return state
+
+
+def main(arguments=None):
+    """Main function of the tool. It returns the exit status:
+    0 if the replay solves its level, 1 otherwise."""
+
+    parser = argparse.ArgumentParser(description='Play a replay back.')
+    parser.add_argument('replay', help='replay file')
+    parser.add_argument('-s', '--speed', type=float, default=REPLAY_DEFAULT_SPEED,
+                        help='number of moves per second of the rendered playback')
+    parser.add_argument('--headless', action='store_true',
+                        help='play the replay without any display, as fast as possible')
+    options = parser.parse_args(arguments)
+
+    replay = Replay.load(options.replay)
+
+    if options.headless:
+        # The level is read before the moves are timed
+        state = SokobanState(*read_level_reference(replay.level))
+
+        start_time = time.perf_counter()
+        play_replay(replay, state)
+        elapsed = time.perf_counter() - start_time
+
+        print('Level: {}'.format(replay.level))
+        print('Moves: {}, pushes: {}'.format(state.move_count(), state.push_count()))
+        print('Solution: {}'.format(state.lurd()))
+        print('Played in {:.4f} s ({:.0f} moves/s)'.format(
+            elapsed, state.move_count() / elapsed if elapsed > 0 else 0))
+
+    else:
+        # The display is only needed for the rendered playback
+        import pygame
+
+        from constants import WINDOW_SIZE, WINDOW_TITLE
+        from game import GameManager
+
+        pygame.init()
+        pygame.display.set_caption(WINDOW_TITLE)
+        screen = pygame.display.set_mode(WINDOW_SIZE)
+
+        game = GameManager(screen)
+        game.parse(replay.level, 0)
+
+        game.play_replay(replay, options.speed)
+
+        state = game.state
+        pygame.quit()
+
+    print('Solved' if state.is_solved() else 'Not solved')
+
+    return 0 if state.is_solved() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+This module contains a command-line tool solving a whole set of levels
+in parallel, without any display. It is used to check that all the levels
+can still be solved, and reports the results as JSON or CSV.
+The solutions are kept in the database of the levels: the levels which have
+already been solved are only looked up (unless --no-database is given).
+
+Usage: python solve_levels.py [paths or globs...] [options]
+(run with --help for the list of the options)
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import signal
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # The resource module is not available on Windows
+    resource = None
+
+from core_constants import (BATCH_REPORT_FIELDS, BATCH_TIME_LIMIT, DATABASE_PATH,
+                            LEVELS_PATH, SOLVER_CORRAL_CHECK, SOLVER_DEFAULT_WEIGHT,
+                            SOLVER_TABLE_SIZE)
+from database import LevelDatabase
+from engine import SokobanState
+from level_collection import (collection_references, is_collection,
+                              read_level_reference)
+from solver import solve_file
+
+
+def find_levels(paths):
+    """Function returning the sorted list of the level files designated by
+    the <paths> list: each path is a directory, a file or a glob pattern.
+    The collections are replaced by the references of all their levels."""
+
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name)
+                         for name in sorted(os.listdir(path)))
+
+        elif os.path.isfile(path):
+            files.append(path)
+
+        else:
+            files.extend(sorted(glob.glob(path)))
+
+    levels = []
+
+    for filename in files:
+        if not os.path.isfile(filename):
+            continue
+
+        if is_collection(filename):
+            levels.extend(collection_references(filename))
+
+        else:
+            levels.append(filename)
+
+    return levels
+
+
+def level_hashes(levels):
+    """Function returning a dictionary giving the digest of each level of the
+    <levels> list (the invalid levels are left out)."""
+
+    hashes = {}
+
+    for level in levels:
+        try:
+            hashes[level] = SokobanState(*read_level_reference(level)).level_hash()
+
+        except (OSError, ValueError):
+            pass
+
+    return hashes
+
+
+def known_report(level, moves, pushes):
+    """Function returning the report of a <level> whose solution (with <moves>
+    moves and <pushes> pushes) is found in the database."""
+
+    report = dict.fromkeys(BATCH_REPORT_FIELDS)
+    report.update(level=level, status='solved', solved=True, moves=moves,
+                  pushes=pushes, nodes=0, elapsed=0.0, wall_time=0.0, source='database')
+
+    return report
+
+
+def init_worker(memory_limit):
+    """Function run at the start of each worker process. The workers ignore the
+    interruptions (the main process cancels the remaining levels itself), and
+    their memory is limited to <memory_limit> bytes if it is not None."""
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def solve_level(filename, time_limit, weight, corral_check, table_size):
+    """Function solving a single level in a worker process. It returns a dictionary
+    with the fields of BATCH_REPORT_FIELDS, and the solution found ('solution')."""
+
+    report = dict.fromkeys(BATCH_REPORT_FIELDS)
+    report.update(level=filename, solved=False, source='solver', solution=None)
+
+    start_time = time.perf_counter()
+
+    try:
+        result = solve_file(filename, time_limit, weight,
+                            table_size=table_size, corral_check=corral_check)
+
+    except ValueError as error:
+        report.update(status='invalid', error=str(error))
+
+    except MemoryError:
+        report.update(status='memory_limit')
+
+    else:
+        report.update(
+            status=result.status,
+            solved=result.solved,
+            moves=result.moves,
+            pushes=result.pushes,
+            nodes=result.nodes,
+            elapsed=round(result.elapsed, 3),
+            solution=result.solution
+        )
+
+    report['wall_time'] = round(time.perf_counter() - start_time, 3)
+
+    return report
+
+
+def solve_levels(levels, jobs=None, time_limit=BATCH_TIME_LIMIT, memory_limit=None,
+                 weight=SOLVER_DEFAULT_WEIGHT, corral_check=SOLVER_CORRAL_CHECK,
+                 table_size=SOLVER_TABLE_SIZE, progress=None, database=None):
+    """Function solving the <levels> list of files with a pool of <jobs> processes
+    (one per core by default). <progress> is an optional function called with each
+    report as soon as it is available. It returns the list of the reports, in the
+    order of <levels>. If the batch is interrupted (KeyboardInterrupt), the levels
+    which were not started yet are reported as 'cancelled'.
+    If a LevelDatabase is given as <database>, the levels it has already solved are
+    not solved again, and the runs of the solver and the solutions are recorded."""
+
+    reports, futures = {}, {}
+    hashes = level_hashes(levels) if database is not None else {}
+
+    # The levels which have already been solved are a single lookup
+    if database is not None:
+        solutions = database.solutions(set(hashes.values()))
+
+        for level, level_hash in hashes.items():
+            if level_hash in solutions:
+                (_, moves, pushes) = solutions[level_hash]
+                reports[level] = known_report(level, moves, pushes)
+
+                if progress is not None:
+                    progress(reports[level])
+
+    def record(level, report):
+        """Function keeping the <report> of a level solved by a worker,
+        and recording it in the database."""
+
+        solution = report.pop('solution', None)
+        reports[level] = report
+
+        if database is not None and level in hashes and report['nodes'] is not None:
+            database.record_solver_run(hashes[level], report['status'], report['nodes'],
+                                       report['elapsed'], weight)
+
+            if solution is not None:
+                database.record_solution(hashes[level], solution, report['moves'],
+                                         report['pushes'], 'solver')
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        jobs, initializer=init_worker, initargs=(memory_limit,))
+
+    try:
+        futures = {
+            executor.submit(solve_level, level, time_limit, weight,
+                            corral_check, table_size): level
+            for level in levels if level not in reports
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                report = future.result()
+
+            except concurrent.futures.process.BrokenProcessPool:
+                # The worker was killed (for instance by the system, out of memory)
+                report = dict.fromkeys(BATCH_REPORT_FIELDS)
+                report.update(level=futures[future], status='crashed', solved=False)
+
+            record(futures[future], report)
+
+            if progress is not None:
+                progress(report)
+
+    except KeyboardInterrupt:
+        # We cancel the levels which are still waiting, and let the running
+        # ones finish (they are bounded by the time limit)
+        for future in futures:
+            future.cancel()
+
+        for future, level in futures.items():
+            if not future.cancelled() and level not in reports:
+                try:
+                    record(level, future.result())
+
+                except concurrent.futures.process.BrokenProcessPool:
+                    pass
+
+    finally:
+        executor.shutdown(wait=True)
+
+        if database is not None:
+            database.flush()
+
+    # The missing levels have been cancelled
+    for level in levels:
+        if level not in reports:
+            reports[level] = dict.fromkeys(BATCH_REPORT_FIELDS)
+            reports[level].update(level=level, status='cancelled', solved=False)
+
+    return [reports[level] for level in levels]
+
+
+def write_report(reports, output, report_format):
+    """Function writing the <reports> in the <output> file object,
+    with the 'json' or 'csv' <report_format>."""
+
+    if report_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=BATCH_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(reports)
+
+    else:
+        json.dump({
+            'levels': reports,
+            'solved': sum(1 for report in reports if report['solved']),
+            'total': len(reports)
+        }, output, indent=2)
+        output.write('\n')
+
+
+def raise_keyboard_interrupt(signal_number, frame):
+    """Function handling SIGTERM as an interruption, so that a cancelled batch
+    still writes the report of the levels already solved."""
+    raise KeyboardInterrupt
+
+
+def main(arguments=None):
+    """Main function of the tool. It returns the exit status:
+    0 if all the levels have been solved, 1 otherwise."""
+
+    parser = argparse.ArgumentParser(
+        description='Solve a set of levels in parallel and report the results.')
+    parser.add_argument('paths', nargs='*', default=[LEVELS_PATH],
+                        help='level files, directories or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of cores)')
+    parser.add_argument('-t', '--time-limit', type=float, default=BATCH_TIME_LIMIT,
+                        help='time limit for each level, in seconds')
+    parser.add_argument('-m', '--memory-limit', type=int, default=None,
+                        help='memory limit of each worker process, in megabytes')
+    parser.add_argument('-w', '--weight', type=float, default=SOLVER_DEFAULT_WEIGHT,
+                        help='weight of the heuristic of the solver')
+    parser.add_argument('--no-corral', dest='corral', action='store_false',
+                        help='do not prune the corral deadlocks')
+    parser.add_argument('-d', '--database', default=DATABASE_PATH,
+                        help='database of the levels, in which the solutions are kept')
+    parser.add_argument('--no-database', action='store_true',
+                        help='solve all the levels again, without using the database')
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+                        help='format of the report')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file in which the report is written (default: standard output)')
+    options = parser.parse_args(arguments)
+
+    levels = find_levels(options.paths)
+
+    if not levels:
+        parser.error('no level found')
+
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+
+    def progress(report):
+        """Function displaying the progress of the batch on the error output."""
+        print('{}: {} ({} s)'.format(report['level'], report['status'],
+                                     report['wall_time']), file=sys.stderr)
+
+    database = LevelDatabase(options.database) if not options.no_database else None
+
+    try:
+        reports = solve_levels(
+            levels,
+            options.jobs,
+            options.time_limit,
+            options.memory_limit * 1024 * 1024 if options.memory_limit else None,
+            options.weight,
+            options.corral,
+            progress=progress,
+            database=database
+        )
+
+    finally:
+        if database is not None:
+            database.close()
+
+    if options.output is None:
+        write_report(reports, sys.stdout, options.format)
+
+    else:
+        with open(options.output, 'w', newline='', encoding='utf-8') as output:
+            write_report(reports, output, options.format)
+
+    return 0 if all(report['solved'] for report in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,683 @@
+"""
+This module contains a solver for the levels of the game.
+It runs an A* search in the space of the pushes: each node is a position of
+the crates, with the character normalized to the region it can reach, and
+each edge is a single push. The visited positions are stored in a bounded
+transposition table, indexed by Zobrist hashes updated at each push.
+
+The heuristic is the cost of a minimal matching of the crates with the trophies
+(Hungarian algorithm), which never overestimates the number of pushes left: with
+a weight of 1, the solutions found have the minimal number of pushes. The matching
+of a position is updated from the one of its parent, as a push moves a single crate.
+The crates and the region of the character are stored as bitboards (see the
+flood_bits function of the engine), so that the region and the pushes available
+from it are found with a few shifts of integers.
+
+Usage: python solver.py <level file> [options]
+(run with --help for the list of the options)
+"""
+
+import argparse
+import heapq
+import random
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # The resource module is not available on Windows
+    resource = None
+
+from core_constants import (CRATE_FLAG, SOLVER_CHECK_INTERVAL,
+                            SOLVER_CORRAL_CHECK, SOLVER_DEFAULT_WEIGHT,
+                            SOLVER_TABLE_SIZE, SOLVER_ZOBRIST_SEED, TROPHY_FLAG,
+                            WALL_FLAG)
+from deadlock import DeadlockDetector
+from engine import SokobanState, bit_tiles, flood_bits, push_destinations
+from level_collection import read_level_reference
+
+# Distance used for the tiles from which a crate can never reach a trophy
+UNREACHABLE = sys.maxsize
+
+# Reduced costs above this value come from an unreachable pair (crate, trophy):
+# the potentials of the matching stay far below it
+UNMATCHABLE = UNREACHABLE // 2
+
+
+def peak_memory():
+    """Function returning the peak memory used by the process, in bytes,
+    or None if it cannot be measured on this platform."""
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # The value is given in kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class TranspositionTable():
+    """Class storing a value (for instance the lowest number of pushes found)
+    for each position, indexed by its Zobrist hash. When the table is full,
+    the oldest half of the entries is evicted, so that the memory used by
+    the search stays bounded."""
+
+    def __init__(self, max_entries=SOLVER_TABLE_SIZE):
+        """Constructor method. <max_entries> is the maximum size of the table."""
+
+        self.max_entries = max_entries
+        self.entries = {}
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Method returning the value stored for the given <key>, or <default>."""
+        return self.entries.get(key, default)
+
+    def store(self, key, value):
+        """Method storing the <value> of the position with the given <key>."""
+
+        if len(self.entries) >= self.max_entries and key not in self.entries:
+            # Dictionaries keep the insertion order, so the oldest entries come first
+            self.entries = dict(
+                list(self.entries.items())[self.max_entries // 2:])
+            self.evictions += 1
+
+        self.entries[key] = value
+
+    def improves(self, key, cost):
+        """Method storing the <cost> of the position with the given <key>, unless
+        the position is already known with a lower or equal cost.
+        It returns True if the cost has been stored."""
+
+        known_cost = self.entries.get(key)
+
+        if known_cost is not None and known_cost <= cost:
+            return False
+
+        self.store(key, cost)
+
+        return True
+
+
+class SolverResult():
+    """Class describing the result of a search."""
+
+    __slots__ = ('solved', 'solution', 'nodes', 'elapsed', 'peak_memory',
+                 'table_entries', 'status', 'partial')
+
+    def __init__(self, solved, solution, nodes, elapsed, status):
+        """Constructor method. <solution> is a LURD string (None if the level is not solved),
+        <status> is 'solved', 'unsolvable', 'timeout' or 'node_limit'."""
+
+        self.solved = solved
+        self.solution = solution
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.status = status
+        self.peak_memory = peak_memory()
+        self.table_entries = 0
+
+        # Moves (LURD string) leading to the position closest to a solution
+        # among the explored ones, when the search stopped before finding one
+        self.partial = None
+
+    @property
+    def moves(self):
+        """Number of moves of the solution."""
+        return len(self.solution) if self.solution is not None else None
+
+    @property
+    def pushes(self):
+        """Number of pushes of the solution."""
+        return sum(1 for move in self.solution if move.isupper()) \
+            if self.solution is not None else None
+
+    @property
+    def nodes_per_second(self):
+        """Number of nodes expanded per second."""
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        """Method returning the result as a dictionary (for reports)."""
+
+        return {
+            'status': self.status,
+            'solved': self.solved,
+            'solution': self.solution,
+            'moves': self.moves,
+            'pushes': self.pushes,
+            'nodes': self.nodes,
+            'elapsed': self.elapsed,
+            'nodes_per_second': self.nodes_per_second,
+            'peak_memory': self.peak_memory,
+            'table_entries': self.table_entries
+        }
+
+
+def assign_row(costs, trophies_of, crates_of, potentials, trophy_potentials, row):
+    """Function matching the crate of index <row> (unmatched) with a trophy, along
+    the shortest augmenting path of the reduced costs (a step of the Hungarian algorithm).
+    <costs> gives the row of the distances to the trophies of each crate, <trophies_of>
+    the trophy matched with each crate, and <crates_of> the crate matched with each
+    trophy (-1 if none); they are updated in place, with the <potentials> of the crates
+    and the <trophy_potentials>. It returns False if the crate cannot be matched."""
+
+    count = len(trophy_potentials)
+    distances = [UNREACHABLE] * count
+    previous = [-1] * count
+    used = [False] * count
+
+    # We grow a tree of alternating paths from the row, as Dijkstra's algorithm would:
+    # <crate> is the last crate reached, through the trophy of index <trophy>
+    (crate, trophy) = (row, -1)
+
+    while True:
+        (delta, closest) = (UNREACHABLE, -1)
+        crate_costs, crate_potential = costs[crate], potentials[crate]
+
+        for column in range(count):
+            if not used[column]:
+                reduced = crate_costs[column] - crate_potential - trophy_potentials[column]
+
+                if reduced < distances[column]:
+                    distances[column] = reduced
+                    previous[column] = trophy
+
+                if distances[column] < delta:
+                    (delta, closest) = (distances[column], column)
+
+        if delta >= UNMATCHABLE:
+            return False
+
+        # We update the potentials, so that the reduced costs stay non-negative
+        potentials[row] += delta
+
+        for column in range(count):
+            if used[column]:
+                potentials[crates_of[column]] += delta
+                trophy_potentials[column] -= delta
+            else:
+                distances[column] -= delta
+
+        used[closest] = True
+
+        if crates_of[closest] == -1:
+            break
+
+        (crate, trophy) = (crates_of[closest], closest)
+
+    # We reverse the alternating path that ends on a free trophy
+    column = closest
+
+    while True:
+        before = previous[column]
+        crate = row if before == -1 else crates_of[before]
+        crates_of[column] = crate
+        trophies_of[crate] = column
+
+        if before == -1:
+            return True
+
+        column = before
+
+
+class Solver():
+    """Class solving a level, given as a SokobanState object."""
+
+    def __init__(self, state, weight=SOLVER_DEFAULT_WEIGHT,
+                 table_size=SOLVER_TABLE_SIZE, corral_check=SOLVER_CORRAL_CHECK):
+        """Constructor method. It precomputes the data shared by all the searches
+        on this level. <weight> multiplies the heuristic: 1 gives solutions with the
+        minimal number of pushes, higher values give faster but longer solutions.
+        If <corral_check> is True, the corral deadlocks are pruned as well
+        (slightly slower for each node, but fewer nodes on levels with many crates)."""
+
+        self.state = state
+        self.weight = weight
+        self.table_size = table_size
+        self.corral_check = corral_check
+        self.stride = state.stride
+
+        # Dead tiles of the level and checks of the deadlocks after each push
+        self.deadlocks = DeadlockDetector(state)
+
+        # Board of the level without any crate
+        self.empty_board = bytearray(state.board)
+
+        for index in state.crates:
+            self.empty_board[index] &= ~CRATE_FLAG
+
+        self.trophies = [index for index, tile in enumerate(self.empty_board)
+                         if tile & TROPHY_FLAG]
+
+        # Bitboards of the tiles without walls, and of the tiles where a crate
+        # can be pushed (the dead tiles are never used)
+        (self.floor, self.live) = (self.deadlocks.floor, self.deadlocks.live)
+
+        # Random keys of the Zobrist hashes, for the crates and for the character
+        generator = random.Random(SOLVER_ZOBRIST_SEED)
+        self.crate_keys = [generator.getrandbits(64)
+                           for _ in range(len(state.board))]
+        self.player_keys = [generator.getrandbits(64)
+                            for _ in range(len(state.board))]
+
+        # Number of pushes needed to bring a crate from each tile to each trophy,
+        # and the same distances as a tuple for each tile (a row of the matching)
+        self.trophy_distances = [self.compute_distances([trophy])
+                                 for trophy in self.trophies]
+        self.tile_costs = list(zip(*self.trophy_distances)) if self.trophies \
+            else [()] * len(state.board)
+
+    def compute_distances(self, trophies):
+        """Method computing, for each tile, the minimal number of pushes needed
+        to bring a crate from this tile to any of the <trophies> (ignoring the other
+        crates). The tiles from which no trophy can be reached get the UNREACHABLE value."""
+
+        board, offsets = self.empty_board, self.state.offsets
+        distances = [UNREACHABLE] * len(board)
+
+        for trophy in trophies:
+            distances[trophy] = 0
+
+        # Breadth-first search from the trophies, pulling the crates backward:
+        # a crate can come from <previous> if the character could stand behind it
+        tiles = list(trophies)
+        position = 0
+
+        while position < len(tiles):
+            tile = tiles[position]
+            position += 1
+
+            for offset in offsets:
+                previous = tile - offset
+
+                if distances[previous] == UNREACHABLE \
+                        and not board[previous] & WALL_FLAG \
+                        and not board[previous - offset] & WALL_FLAG:
+                    distances[previous] = distances[tile] + 1
+                    tiles.append(previous)
+
+        return distances
+
+    def heuristic(self, crates):
+        """Method estimating the number of pushes needed to solve the position of
+        the <crates> (an iterable of tiles): each crate is matched with a distinct
+        trophy, so that the sum of the distances is minimal. It returns a tuple
+        (estimate, matching), where the matching is a tuple (crates, trophy of each
+        crate, potentials of the trophies) used to update it after a push,
+        or (UNREACHABLE, None) if no complete matching exists."""
+
+        crates = tuple(crates)
+        costs = [self.tile_costs[crate] for crate in crates]
+        trophies_of = [-1] * len(crates)
+        crates_of = [-1] * len(self.trophies)
+        potentials = [0] * len(crates)
+        trophy_potentials = [0] * len(self.trophies)
+
+        for row in range(len(crates)):
+            if not assign_row(costs, trophies_of, crates_of,
+                              potentials, trophy_potentials, row):
+                return (UNREACHABLE, None)
+
+        return self.matching_result(
+            costs, crates, trophies_of, trophy_potentials)
+
+    def updated_heuristic(self, estimate, matching, crate, destination):
+        """Method updating the <estimate> and the <matching> (see the heuristic method)
+        of a position after the push of the <crate> to the <destination> tile.
+        Only the pushed crate has to be matched again, from the potentials of the
+        other crates which are still valid. It returns the same tuple as the
+        heuristic method."""
+
+        (crates, trophies_of, trophy_potentials) = matching
+        row = crates.index(crate)
+        crates = crates[:row] + (destination,) + crates[row + 1:]
+        costs = self.tile_costs[destination]
+
+        # Lowest reduced cost of the pushed crate: if its trophy still reaches it,
+        # the matching stays minimal and only its cost changes
+        best = min(cost - potential
+                   for cost, potential in zip(costs, trophy_potentials))
+
+        if best >= UNMATCHABLE:
+            return (UNREACHABLE, None)
+
+        trophy = trophies_of[row]
+
+        if costs[trophy] - trophy_potentials[trophy] == best:
+            estimate += costs[trophy] - self.tile_costs[crate][trophy]
+            return (estimate, (crates, trophies_of, trophy_potentials))
+
+        # Otherwise the crate is matched again along an augmenting path
+        all_costs = [self.tile_costs[tile] for tile in crates]
+        trophies_of = list(trophies_of)
+        trophy_potentials = list(trophy_potentials)
+        potentials = [all_costs[index][column] - trophy_potentials[column]
+                      for index, column in enumerate(trophies_of)]
+        potentials[row] = best
+
+        crates_of = [-1] * len(trophy_potentials)
+
+        for index, column in enumerate(trophies_of):
+            if index != row:
+                crates_of[column] = index
+
+        trophies_of[row] = -1
+
+        if not assign_row(all_costs, trophies_of, crates_of,
+                          potentials, trophy_potentials, row):
+            return (UNREACHABLE, None)
+
+        return self.matching_result(
+            all_costs, crates, trophies_of, trophy_potentials)
+
+    @staticmethod
+    def matching_result(costs, crates, trophies_of, trophy_potentials):
+        """Method building the tuple returned by the heuristic method
+        from a complete matching."""
+
+        estimate = sum(row[column] for row, column in zip(costs, trophies_of))
+
+        # The matching may use unreachable pairs if no other one exists
+        if estimate >= UNREACHABLE:
+            return (UNREACHABLE, None)
+
+        return (estimate, (crates, tuple(trophies_of), tuple(trophy_potentials)))
+
+    def zobrist(self, crates):
+        """Method returning the Zobrist hash of the position of the <crates>."""
+
+        key = 0
+
+        for crate in crates:
+            key ^= self.crate_keys[crate]
+
+        return key
+
+    def pushes(self, crates, region):
+        """Method returning the list of the pushes available to the character
+        in its <region>, for the <crates> (both bitboards), as tuples
+        (crate, destination, move code). The pushes to a dead tile are omitted."""
+
+        targets = self.live & ~crates
+        pushes = []
+
+        for move, offset in enumerate(self.state.offsets):
+            destinations = push_destinations(region, crates, targets, offset)
+
+            for destination in bit_tiles(destinations):
+                pushes.append((destination - offset, destination, move))
+
+        return pushes
+
+    def corral_pushes(self, crates, region):
+        """Method checking the corrals of the position of the <crates>, where the
+        character can reach the tiles of the <region> (both bitboards, see the corrals
+        method of the deadlock detector). A corral is a PI-corral if the crates of its
+        border can only be pushed into it, all these pushes being available: one of
+        them is needed before any solution, and they can be played first, so that
+        the other pushes need not be searched.
+        It returns the pushes of the PI-corral with the fewest pushes (as the pushes
+        method), an empty list if there is no PI-corral, or None if a corral is
+        a deadlock (only checked if the corral_check attribute is True)."""
+
+        deadlocks, offsets, live = self.deadlocks, self.state.offsets, self.live
+        best = []
+
+        for (corral, border) in deadlocks.corrals(crates, region):
+            if self.corral_check and deadlocks.corral_blocked(border, corral, region):
+                return None
+
+            pushes = self.border_pushes(crates, region, corral, border, live, offsets)
+
+            if pushes and (not best or len(pushes) < len(best)):
+                best = pushes
+
+        return best
+
+    @staticmethod
+    def border_pushes(crates, region, corral, border, live, offsets):
+        """Method returning the pushes of the crates of the <border> of a <corral>,
+        if they all go into the corral and the character can play them all from its
+        <region> (None otherwise). See the corral_pushes method."""
+
+        pushes = []
+
+        for crate in bit_tiles(border):
+            for move, offset in enumerate(offsets):
+                destination = crate + offset
+
+                if not live >> destination & 1 or crates >> destination & 1:
+                    continue
+
+                available = region >> (crate - offset) & 1
+
+                if corral >> destination & 1:
+                    if not available:
+                        return None
+
+                    pushes.append((crate, destination, move))
+
+                elif available:
+                    return None
+
+        return pushes
+
+    def solve(self, time_limit=None, max_nodes=None):
+        """Method searching a solution from the current position of the state.
+        The search stops after <time_limit> seconds or <max_nodes> expanded nodes.
+        It returns a SolverResult object."""
+
+        start_time = time.perf_counter()
+        deadline = start_time + time_limit if time_limit is not None else None
+
+        state = self.state
+        deadlocks = self.deadlocks
+        crate_keys, player_keys = self.crate_keys, self.player_keys
+        floor, stride = self.floor, self.stride
+        weight = self.weight
+        table = TranspositionTable(self.table_size)
+
+        crates = 0
+
+        for crate in state.crates:
+            crates |= 1 << crate
+
+        crates_key = self.zobrist(state.crates)
+        (estimate, matching) = self.heuristic(bit_tiles(crates))
+
+        if estimate == UNREACHABLE:
+            return self.result(False, None, 0, start_time, 'unsolvable', table)
+
+        # Positions already put in the open list, indexed with the tile of the
+        # character instead of its region (computing the region of each child
+        # would be too expensive), to avoid most of the duplicates
+        generated = TranspositionTable(self.table_size)
+
+        # Each node of the open list is (f, -g, counter, g, h, matching, crates,
+        # crates hash, character tile, push chain). The crates are a bitboard and
+        # the push chains are linked tuples (push, parent chain), where a push
+        # is (crate tile, move code).
+        counter = 0
+        open_list = [(weight * estimate, 0, counter, 0, estimate, matching,
+                      crates, crates_key, state.player, None)]
+        nodes = 0
+        (best_estimate, best_chain) = (estimate, None)
+
+        while open_list:
+            (_, _, _, cost, estimate, matching, crates, crates_key,
+             player, chain) = heapq.heappop(open_list)
+
+            # The character is normalized to the smallest tile of its region
+            free = floor & ~crates
+            region = flood_bits(1 << player, free, stride)
+            lowest = (region & -region).bit_length() - 1
+
+            if not table.improves(crates_key ^ player_keys[lowest], cost):
+                continue
+
+            if estimate == 0:
+                return self.result(True, self.rebuild_solution(chain), nodes,
+                                   start_time, 'solved', table)
+
+            nodes += 1
+
+            if nodes % SOLVER_CHECK_INTERVAL == 0:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return self.result(False, None, nodes, start_time, 'timeout',
+                                       table, best_chain)
+
+            if max_nodes is not None and nodes >= max_nodes:
+                return self.result(False, None, nodes, start_time, 'node_limit',
+                                   table, best_chain)
+
+            # We remember the position closest to a solution (for the partial result)
+            if estimate < best_estimate:
+                (best_estimate, best_chain) = (estimate, chain)
+
+            # Only the pushes into a PI-corral are searched, if there is one
+            pushes = self.corral_pushes(crates, region)
+
+            if pushes is None:
+                continue
+
+            pushes = pushes or self.pushes(crates, region)
+
+            # We build the board of the position (for the freeze deadlocks)
+            board = bytearray(self.empty_board)
+
+            for crate in bit_tiles(crates):
+                board[crate] |= CRATE_FLAG
+
+            for (crate, destination, move) in pushes:
+                child_key = crates_key ^ crate_keys[crate] ^ crate_keys[destination]
+
+                if not generated.improves(child_key ^ player_keys[crate], cost + 1):
+                    continue
+
+                # We check the freeze deadlocks on the board after the push
+                board[crate] &= ~CRATE_FLAG
+                board[destination] |= CRATE_FLAG
+                deadlock = deadlocks.freeze_deadlock(board, destination)
+                board[destination] &= ~CRATE_FLAG
+                board[crate] |= CRATE_FLAG
+
+                if deadlock:
+                    continue
+
+                (child_estimate, child_matching) = self.updated_heuristic(
+                    estimate, matching, crate, destination)
+
+                if child_estimate == UNREACHABLE:
+                    continue
+
+                counter += 1
+
+                heapq.heappush(open_list, (
+                    cost + 1 + weight * child_estimate,
+                    -cost - 1,
+                    counter,
+                    cost + 1,
+                    child_estimate,
+                    child_matching,
+                    crates ^ (1 << crate) ^ (1 << destination),
+                    child_key,
+                    crate,
+                    ((crate, move), chain)
+                ))
+
+        return self.result(False, None, nodes, start_time, 'unsolvable', table)
+
+    def result(self, solved, solution, nodes, start_time, status, table,
+               partial_chain=None):
+        """Method building the SolverResult object at the end of a search.
+        <partial_chain> is the chain of pushes leading to the position closest
+        to a solution, if the search stopped before finding one."""
+
+        result = SolverResult(solved, solution, nodes,
+                              time.perf_counter() - start_time, status)
+        result.table_entries = len(table)
+
+        if partial_chain is not None:
+            result.partial = self.rebuild_solution(partial_chain)
+
+        return result
+
+    def rebuild_solution(self, chain):
+        """Method converting a chain of pushes into a LURD string,
+        by walking the character between the pushes."""
+
+        pushes = []
+
+        while chain is not None:
+            (push, chain) = chain
+            pushes.append(push)
+
+        pushes.reverse()
+
+        # We replay the pushes on a copy of the state, which records the moves
+        state = self.state.copy()
+        state.history = bytearray()
+
+        for (crate, move) in pushes:
+            for walk_move in state.path_to(crate - state.offsets[move]):
+                state.move(walk_move)
+
+            state.move(move)
+
+        return state.lurd()
+
+
+def solve_file(filename, time_limit=None, weight=SOLVER_DEFAULT_WEIGHT,
+               max_nodes=None, table_size=SOLVER_TABLE_SIZE,
+               corral_check=SOLVER_CORRAL_CHECK):
+    """Function solving the level stored in the file <filename>
+    (or the level of a collection designated by this reference).
+    It returns a SolverResult object."""
+
+    solver = Solver(SokobanState(*read_level_reference(filename)), weight,
+                    table_size, corral_check)
+
+    return solver.solve(time_limit, max_nodes)
+
+
+def main(arguments=None):
+    """Main function of the command-line tool solving a single level.
+    It returns the exit status: 0 if the level has been solved, 1 otherwise."""
+
+    parser = argparse.ArgumentParser(description='Solve a level and print the solution.')
+    parser.add_argument('level', help='level file, or reference of a level of a collection')
+    parser.add_argument('-w', '--weight', type=float, default=SOLVER_DEFAULT_WEIGHT,
+                        help='weight of the heuristic (1 gives the minimal number of pushes)')
+    parser.add_argument('-t', '--time-limit', type=float, default=None,
+                        help='time limit of the search, in seconds')
+    parser.add_argument('-n', '--max-nodes', type=int, default=None,
+                        help='maximum number of expanded nodes')
+    parser.add_argument('--no-corral', dest='corral', action='store_false',
+                        help='do not prune the corral deadlocks')
+    options = parser.parse_args(arguments)
+
+    try:
+        result = solve_file(options.level, options.time_limit, options.weight,
+                            options.max_nodes, corral_check=options.corral)
+
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    print('Status: {}'.format(result.status))
+    print('Solution: {}'.format(result.solution))
+    print('Moves: {}, pushes: {}'.format(result.moves, result.pushes))
+    print('Nodes: {} ({:.0f} nodes/s, {:.2f} s)'.format(
+        result.nodes, result.nodes_per_second, result.elapsed))
+    print('Peak memory: {} bytes'.format(result.peak_memory))
+
+    return 0 if result.solved else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
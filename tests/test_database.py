@@ -0,0 +1,98 @@
+"""
+Tests of the database of the levels: the rules replacing the solutions and the
+best games of the player, the buffered writes, and the packing of the tiles.
+"""
+
+import os
+
+from core_constants import LEVELS_PATH
+from database import LevelDatabase, pack_tiles, unpack_tiles
+from deadlock import DeadlockDetector
+from engine import SokobanState, pad_level, read_level
+
+LEVEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     LEVELS_PATH, 'level_A.txt')
+
+
+def test_solution_upsert():
+    """Function testing that a solution only replaces the known one if it has
+    fewer moves, or as many moves and fewer pushes."""
+
+    with LevelDatabase(':memory:', batch_size=1) as database:
+        database.record_solution('level', 'first', 100, 20, 'solver')
+        assert database.solution('level') == ('first', 100, 20)
+
+        # Worse or equal solutions are ignored
+        for (moves, pushes) in ((120, 10), (100, 25), (100, 20)):
+            database.record_solution('level', 'worse', moves, pushes)
+            assert database.solution('level') == ('first', 100, 20)
+
+        database.record_solution('level', 'fewer pushes', 100, 18)
+        assert database.solution('level') == ('fewer pushes', 100, 18)
+
+        database.record_solution('level', 'fewer moves', 90, 30)
+        assert database.solution('level') == ('fewer moves', 90, 30)
+
+        assert database.solution('other level') is None
+
+
+def test_player_best_upsert():
+    """Function testing that the best game of the player is kept as a whole:
+    a slower game with fewer moves replaces it, a faster but longer one does not."""
+
+    with LevelDatabase(':memory:', batch_size=1) as database:
+        database.record_player_result('level', 100, 20, 60.0)
+        database.record_player_result('level', 110, 20, 30.0)
+        assert database.player_best('level') == (100, 20, 60.0)
+
+        database.record_player_result('level', 100, 19, 90.0)
+        assert database.player_best('level') == (100, 19, 90.0)
+
+        assert database.player_best('other level') is None
+
+
+def test_buffered_writes(tmp_path):
+    """Function testing that the rows are written by batches, and when the
+    database is closed (they are then found by another connection)."""
+
+    path = str(tmp_path / 'levels.db')
+
+    with LevelDatabase(path, batch_size=3) as database:
+        database.record_solution('first', 'R', 1, 1)
+        database.record_solver_run('first', 'solved', 10, 0.5, 3)
+        assert database.solution('first') is None
+
+        # The third row completes the batch
+        database.record_solver_run('first', 'timeout', 1000, 60.0, 1)
+        assert database.solution('first') == ('R', 1, 1)
+
+        database.record_solution('second', 'L', 1, 1)
+
+    with LevelDatabase(path) as database:
+        assert database.solutions(['first', 'second', 'third']) == {
+            'first': ('R', 1, 1), 'second': ('L', 1, 1)}
+
+        assert sorted(run[0] for run in database.solver_runs('first')) == ['solved', 'timeout']
+
+
+def test_pack_tiles_round_trip():
+    """Function testing that the packed dead tiles of a level are unpacked to the
+    same tiles, including on the same level centered in a larger map."""
+
+    state = SokobanState.from_file(LEVEL)
+    dead_tiles = DeadlockDetector(state).dead_tiles
+
+    (width, packed_tiles) = pack_tiles(state, dead_tiles)
+    assert unpack_tiles(state, width, packed_tiles) == dead_tiles
+    assert unpack_tiles(state, width + 1, packed_tiles) is None
+
+    # The padded level has the same digest and the same dead tiles
+    level = read_level(LEVEL)
+    padded = SokobanState(*pad_level(level, len(level[0][0]) + 6, len(level[0]) + 4))
+
+    with LevelDatabase(':memory:') as database:
+        database.record_dead_tiles(state, dead_tiles)
+        database.flush()
+
+        assert database.dead_tiles(state) == dead_tiles
+        assert database.dead_tiles(padded) == DeadlockDetector(padded).dead_tiles
@@ -0,0 +1,225 @@
+"""
+Tests of the deadlock detection: the dead tiles, the freeze deadlocks and the
+corral deadlocks, which are checked against a complete search on tiny levels.
+"""
+
+import itertools
+
+from core_constants import TROPHY_FLAG, WALL_FLAG
+from deadlock import DeadlockDetector
+from engine import SokobanState, flood_bits
+
+# Tiny levels (in the usual text format: '#' wall, '$' crate, '.' trophy,
+# '*' crate on a trophy, '@' character, '+' character on a trophy)
+TINY_LEVELS = [
+    ['######',
+     '#@  .#',
+     '#   ##',
+     '##$  #',
+     '##.$ #',
+     '#  ###',
+     '######'],
+    ['#######',
+     '#  .  #',
+     '# $#$ #',
+     '#  .@ #',
+     '#######'],
+    ['######',
+     '#. $ #',
+     '# # @#',
+     '#.$  #',
+     '######'],
+    ['#######',
+     '#.$   #',
+     '## #$ #',
+     '#.  @##',
+     '#######'],
+]
+
+
+def level_state(rows):
+    """Function creating the state of the level drawn by the <rows> (strings)."""
+
+    (crates, trophies, character_coords) = ([], [], None)
+
+    for row, line in enumerate(rows):
+        for column, character in enumerate(line):
+            if character in '$*':
+                crates.append((column, row))
+
+            if character in '.*+':
+                trophies.append((column, row))
+
+            if character in '@+':
+                character_coords = (column, row)
+
+    return SokobanState([[int(character == '#') for character in line] for line in rows],
+                        crates, trophies, character_coords)
+
+
+def bitboards(state):
+    """Function returning the bitboards of the tiles without walls and of
+    the trophies of the <state>."""
+
+    (floor, trophies) = (0, 0)
+
+    for index, tile in enumerate(state.board):
+        if not tile & WALL_FLAG:
+            floor |= 1 << index
+
+        if tile & TROPHY_FLAG:
+            trophies |= 1 << index
+
+    return (floor, trophies)
+
+
+def all_positions(state):
+    """Function returning the solvability of all the positions of the crates of the
+    <state>: a dictionary whose keys are the positions (crates, region of the
+    character), as bitboards, and whose values are True if the position can be
+    solved. It is a complete search, so it is only usable on tiny levels."""
+
+    (floor, trophies) = bitboards(state)
+    tiles = [index for index in range(len(state.board)) if floor >> index & 1]
+
+    def key(crates, region):
+        """Function returning the key of a position, with the lowest tile of the region."""
+        return (crates, region & -region)
+
+    # We list all the positions, with the positions reached by their pushes
+    (positions, children) = ({}, {})
+
+    for placed in itertools.combinations(tiles, len(state.crates)):
+        crates = sum(1 << crate for crate in placed)
+        free = floor & ~crates
+        regions = set()
+
+        for tile in tiles:
+            if free >> tile & 1:
+                regions.add(flood_bits(1 << tile, free, state.stride))
+
+        for region in regions:
+            positions[key(crates, region)] = (crates, region)
+            children[key(crates, region)] = [
+                key(pushed, flood_bits(1 << crate, floor & ~pushed, state.stride))
+                for crate in placed for offset in state.offsets
+                if region >> (crate - offset) & 1 and floor >> (crate + offset) & 1
+                and not crates >> (crate + offset) & 1
+                for pushed in [crates ^ (1 << crate) ^ (1 << (crate + offset))]]
+
+    # Then the solvable positions are found backward from the solved ones
+    solvable = {position for position in positions if not position[0] & ~trophies}
+    changed = True
+
+    while changed:
+        changed = False
+
+        for position in positions:
+            if position not in solvable \
+                    and any(child in solvable for child in children[position]):
+                solvable.add(position)
+                changed = True
+
+    return {positions[position]: position in solvable for position in positions}
+
+
+def test_dead_tiles():
+    """Function testing that the corners, and the tiles along the walls without
+    trophy, are dead tiles, and that the other tiles are not."""
+
+    state = level_state(['#######',
+                         '#     #',
+                         '#  .  #',
+                         '#  @$ #',
+                         '#######'])
+    detector = DeadlockDetector(state)
+
+    live = [(column, row) for row in range(state.height) for column in range(state.width)
+            if not state.board[state.index(column, row)] & WALL_FLAG
+            and not detector.is_dead(state.index(column, row))]
+
+    assert live == [(2, 2), (3, 2), (4, 2)]
+
+    # The tiles along a wall are alive if they lead to a trophy along the wall
+    state = level_state(['#######',
+                         '#   . #',
+                         '#  $  #',
+                         '#  @  #',
+                         '#######'])
+    detector = DeadlockDetector(state)
+
+    assert not any(detector.is_dead(state.index(column, 1)) for column in range(2, 5))
+    assert all(detector.is_dead(state.index(*coords)) for coords in ((1, 1), (5, 1), (1, 2)))
+
+
+def test_freeze_deadlock():
+    """Function testing that four crates in a square, or two crates along a wall,
+    are frozen, which is only a deadlock if one of them is not on a trophy."""
+
+    for (placed, deadlock) in ((0, True), (1, True), (3, True), (4, False)):
+        # The first crates of the square are placed on trophies, and the
+        # other trophies are left empty
+        square = ''.join('*' if number < placed else '$' for number in range(4))
+        state = level_state(['########',
+                             '#      #',
+                             '#  {}  #'.format(square[:2]),
+                             '#  {}  #'.format(square[2:]),
+                             '#@{}#'.format('.' * (4 - placed) + ' ' * (1 + placed)),
+                             '########'])
+        detector = DeadlockDetector(state)
+
+        assert detector.is_frozen(state.board, state.index(3, 2))
+        assert detector.freeze_deadlock(state.board, state.index(4, 3)) == deadlock
+
+    # Two crates along a wall are frozen, but not a single one
+    state = level_state(['#######',
+                         '#. $$ #',
+                         '#     #',
+                         '#.  @ #',
+                         '#######'])
+    detector = DeadlockDetector(state)
+
+    assert detector.freeze_deadlock(state.board, state.index(3, 1))
+
+    state.move_crate(state.index(4, 1), state.index(4, 2))
+
+    assert not detector.is_frozen(state.board, state.index(3, 1))
+    assert not detector.is_frozen(state.board, state.index(4, 2))
+
+
+def test_corral_deadlock():
+    """Function testing a corral deadlock: the crates are on live tiles and not
+    frozen, but the crate left after filling the trophy of the corral can never
+    get out of it."""
+
+    state = level_state(TINY_LEVELS[0])
+    detector = DeadlockDetector(state)
+    crates = sum(1 << crate for crate in state.crates)
+    (floor, _) = bitboards(state)
+    region = flood_bits(1 << state.player, floor & ~crates, state.stride)
+
+    assert not any(detector.is_dead(crate) for crate in state.crates)
+    assert not any(detector.is_frozen(state.board, crate) for crate in state.crates)
+
+    assert detector.corral_deadlock(crates, region)
+    assert not all_positions(state)[(crates, region)]
+
+
+def test_corral_blocked_never_prunes_a_solvable_position():
+    """Function testing, on all the positions of tiny levels, that the positions
+    found to be corral deadlocks can never be solved."""
+
+    for rows in TINY_LEVELS:
+        state = level_state(rows)
+        positions = all_positions(state)
+
+        # The check must prune some positions, to test something
+        detector = DeadlockDetector(state)
+        pruned = 0
+
+        for (crates, region), solvable in positions.items():
+            if detector.corral_deadlock(crates, region):
+                assert not solvable, rows
+                pruned += 1
+
+        assert pruned
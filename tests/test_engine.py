@@ -0,0 +1,149 @@
+"""
+Tests of the rules of the game implemented by the SokobanState class
+of the engine module.
+"""
+
+from core_constants import (CHARACTER, CRATE, MOVE_BLOCKED, MOVE_DOWN,
+                            MOVE_LEFT, MOVE_PUSH_FLAG, MOVE_PUSHED, MOVE_RIGHT,
+                            MOVE_UP, MOVE_WALKED, TROPHY, WALL)
+from engine import SokobanState, pad_level, split_tile_map
+
+
+def make_state(tile_map):
+    """Function creating a state from a <tile_map> (list of lists of tile codes)."""
+    return SokobanState(*split_tile_map([list(row) for row in tile_map]))
+
+
+# A corridor: the character, a crate, an empty tile and a trophy
+CORRIDOR = [
+    [WALL, WALL, WALL, WALL, WALL, WALL],
+    [WALL, CHARACTER, CRATE, 0, TROPHY, WALL],
+    [WALL, 0, 0, 0, WALL, WALL],
+    [WALL, WALL, WALL, WALL, WALL, WALL],
+]
+
+
+def test_walk():
+    """Function testing a move of the character on an empty tile."""
+
+    state = make_state(CORRIDOR)
+    start = state.player
+
+    assert state.move(MOVE_DOWN) == MOVE_WALKED
+    assert state.player == start + state.offsets[MOVE_DOWN]
+    assert state.history == bytearray([MOVE_DOWN])
+    assert state.push_count() == 0
+
+
+def test_walls_block_the_character():
+    """Function testing that the walls block the character."""
+
+    state = make_state(CORRIDOR)
+    start = state.player
+
+    for move in (MOVE_LEFT, MOVE_UP):
+        assert state.move(move) == MOVE_BLOCKED
+
+    assert state.player == start
+    assert not state.history
+
+
+def test_push():
+    """Function testing the push of a crate."""
+
+    state = make_state(CORRIDOR)
+    crate = state.index(2, 1)
+
+    assert state.move(MOVE_RIGHT) == MOVE_PUSHED
+    assert state.player == crate
+    assert state.crates == {crate + 1}
+    assert state.history == bytearray([MOVE_RIGHT | MOVE_PUSH_FLAG])
+    assert state.lurd() == 'R'
+
+
+def test_crates_block_the_push():
+    """Function testing that a crate cannot be pushed against a wall
+    or against another crate."""
+
+    state = make_state(CORRIDOR)
+
+    for move in (MOVE_RIGHT, MOVE_RIGHT):
+        state.move(move)
+
+    assert state.move(MOVE_RIGHT) == MOVE_BLOCKED
+
+    state = make_state([
+        [WALL, WALL, WALL, WALL, WALL],
+        [WALL, CHARACTER, CRATE, CRATE, WALL],
+        [WALL, TROPHY, TROPHY, 0, WALL],
+        [WALL, WALL, WALL, WALL, WALL],
+    ])
+
+    assert state.move(MOVE_RIGHT) == MOVE_BLOCKED
+    assert state.player == state.index(1, 1)
+
+
+def test_undo():
+    """Function testing that the undo method cancels the moves and the pushes."""
+
+    state = make_state(CORRIDOR)
+    (crates, player) = (set(state.crates), state.player)
+
+    state.move(MOVE_RIGHT)
+    state.move(MOVE_DOWN)
+
+    assert state.undo() == MOVE_DOWN
+    assert state.undo() == MOVE_RIGHT | MOVE_PUSH_FLAG
+    assert state.undo() is None
+    assert (state.crates, state.player) == (crates, player)
+    assert state.board == make_state(CORRIDOR).board
+
+
+def test_win():
+    """Function testing the win test, before and after the last push."""
+
+    state = make_state(CORRIDOR)
+
+    state.move(MOVE_RIGHT)
+    assert not state.is_solved()
+
+    state.move(MOVE_RIGHT)
+    assert state.is_solved()
+    assert state.lurd() == 'RR'
+
+    # Pulling the crate back out of the trophy cancels the win
+    state.undo()
+    assert not state.is_solved()
+    assert state.crates_on_trophies == 0
+
+
+def test_reset_and_copy():
+    """Function testing that a copy of a state is independent, and the reset method."""
+
+    state = make_state(CORRIDOR)
+    state.move(MOVE_RIGHT)
+
+    copy = state.copy()
+    copy.move(MOVE_RIGHT)
+
+    assert not state.is_solved() and copy.is_solved()
+
+    state.reset()
+    assert state.crates == set(state.initial_crates)
+    assert state.player == state.initial_player
+    assert not state.history
+
+
+def test_padding_keeps_the_level():
+    """Function testing that the padding of a level (with walls) keeps
+    its digest and its rules."""
+
+    state = make_state(CORRIDOR)
+    padded = SokobanState(*pad_level(
+        split_tile_map([list(row) for row in CORRIDOR]), 12, 9))
+
+    assert padded.level_hash() == state.level_hash()
+
+    for level in (state, padded):
+        assert level.move(MOVE_UP) == MOVE_BLOCKED
+        assert level.move(MOVE_LEFT) == MOVE_BLOCKED
@@ -0,0 +1,115 @@
+"""
+Tests of the training environment: its games must follow the rules of the engine.
+"""
+
+import os
+
+import pytest
+
+from core_constants import (ENVIRONMENT_SOLVED_REWARD, ENVIRONMENT_STEP_REWARD,
+                            ENVIRONMENT_TROPHY_REWARD, LEVELS_PATH, MOVE_LETTERS,
+                            MOVE_PUSHED, MOVE_WALKED)
+from engine import SokobanState
+from level_collection import read_level_reference
+from solver import Solver
+
+# The environment needs NumPy, which is optional
+numpy = pytest.importorskip('numpy')
+
+# pylint: disable=wrong-import-position
+from environment import ENVIRONMENT_MARGIN, LevelPool, SokobanEnvironment
+
+LEVELS = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       LEVELS_PATH, 'level_{}.txt'.format(name)) for name in 'ABCDE']
+
+MAX_STEPS = 50
+
+
+def engine_position(state):
+    """Function returning the position of the engine <state> in the form returned
+    by the state method of the environment (coordinates in its boards)."""
+
+    def shift(index):
+        """Function returning the coordinates of the tile <index> in the environment."""
+        (column, row) = state.coords(index)
+        return (column + ENVIRONMENT_MARGIN, row + ENVIRONMENT_MARGIN)
+
+    return (sorted(shift(crate) for crate in state.crates), shift(state.player))
+
+
+def reward(placed, solved):
+    """Function returning the reward of a step which placed <placed> crates on
+    trophies (negative if they were pushed out of them), and <solved> the level."""
+    return ENVIRONMENT_STEP_REWARD + ENVIRONMENT_TROPHY_REWARD * placed \
+        + ENVIRONMENT_SOLVED_REWARD * solved
+
+
+def test_random_moves_agree_with_the_engine():
+    """Function testing that random moves played in the environment and with the
+    engine give the same positions, rewards and done flags, including in the games
+    started again after the maximum number of steps."""
+
+    pool = LevelPool(LEVELS)
+    environment = SokobanEnvironment(16, pool, max_steps=MAX_STEPS, seed=0)
+    generator = numpy.random.default_rng(1)
+
+    def new_state(game):
+        """Function returning the engine state of the level of the <game>."""
+        return SokobanState(*read_level_reference(pool.references[environment.levels[game]]))
+
+    states = [new_state(game) for game in range(environment.count)]
+    steps = [0] * environment.count
+
+    for _ in range(MAX_STEPS * 4):
+        actions = generator.integers(environment.action_count, size=environment.count)
+        (_, rewards, dones, infos) = environment.step(actions)
+
+        for (game, state) in enumerate(states):
+            placed = state.crates_on_trophies
+            state.move(int(actions[game]))
+            placed = state.crates_on_trophies - placed
+            steps[game] += 1
+
+            solved = state.is_solved()
+
+            assert infos['solved'][game] == solved
+            assert infos['truncated'][game] == (not solved and steps[game] >= MAX_STEPS)
+            assert rewards[game] == pytest.approx(reward(placed, solved))
+
+            if dones[game]:
+                states[game] = state = new_state(game)
+                steps[game] = 0
+
+            assert environment.state(game) == engine_position(state)
+
+
+def test_solution_solves_the_game():
+    """Function testing that a solution found by the solver solves the game
+    of the environment at its last move, with the rewards of its pushes."""
+
+    state = SokobanState(*read_level_reference(LEVELS[0]))
+    solution = Solver(state.copy()).solve(time_limit=60).solution
+
+    environment = SokobanEnvironment(1, LevelPool(LEVELS[:1]), max_steps=len(solution) + 1)
+    placed = -state.crates_on_trophies
+    total_reward = 0.0
+
+    for (step, letter) in enumerate(solution, 1):
+        move = MOVE_LETTERS.index(letter.lower())
+        assert state.move(move) == (MOVE_PUSHED if letter.isupper() else MOVE_WALKED)
+
+        (_, rewards, dones, infos) = environment.step(numpy.array([move]))
+        total_reward += float(rewards[0])
+
+        assert dones[0] == (step == len(solution))
+
+        # The game is started again once it is solved
+        if not dones[0]:
+            assert environment.state(0) == engine_position(state)
+
+    placed += state.crates_on_trophies
+
+    assert infos['solved'][0] and not infos['truncated'][0]
+    assert total_reward == pytest.approx(
+        ENVIRONMENT_STEP_REWARD * len(solution) + ENVIRONMENT_TROPHY_REWARD * placed
+        + ENVIRONMENT_SOLVED_REWARD, rel=1e-5)
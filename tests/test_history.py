@@ -0,0 +1,135 @@
+"""
+Tests of the timeline of the moves (MoveHistory class): its checkpoints must
+always give the same positions as playing the moves from the start.
+"""
+
+import os
+import random
+
+from core_constants import LEVELS_PATH, MOVE_LETTERS, MOVE_PUSH_FLAG
+from engine import SokobanState
+from history import MoveHistory
+from solver import Solver
+
+LEVEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     LEVELS_PATH, 'level_A.txt')
+
+INTERVAL = 4
+
+
+def played_game():
+    """Function returning a state of level_A with a MoveHistory of checkpoint interval
+    INTERVAL, and the list of the move codes of a solution of the level."""
+
+    state = SokobanState.from_file(LEVEL)
+    solution = Solver(state.copy()).solve(time_limit=60).solution
+
+    return (state, MoveHistory(state, INTERVAL),
+            [MOVE_LETTERS.index(letter.lower()) for letter in solution])
+
+
+def position_after(moves):
+    """Function returning the crates, the character and the history of level_A
+    after the <moves> are played from the start."""
+
+    state = SokobanState.from_file(LEVEL)
+
+    for move in moves:
+        state.move(move)
+
+    return (state.crates, state.player, state.history)
+
+
+def test_checkpoints():
+    """Function testing that a checkpoint is recorded every INTERVAL moves."""
+
+    (state, history, moves) = played_game()
+
+    for move in moves:
+        state.move(move)
+        history.record()
+
+    assert history.length() == history.position() == len(moves)
+    assert len(history.checkpoints) == len(moves) // INTERVAL + 1
+
+    for (number, checkpoint) in enumerate(history.checkpoints):
+        history.restore(number)
+        assert history.snapshot() == checkpoint
+
+
+def test_seek():
+    """Function testing that seeking any position, backward or forward,
+    gives the position reached by playing the moves from the start."""
+
+    (state, history, moves) = played_game()
+
+    for move in moves:
+        state.move(move)
+        history.record()
+
+    positions = list(range(len(moves) + 1))
+    random.Random(0).shuffle(positions)
+
+    for position in positions + [0, len(moves)]:
+        history.seek(position)
+
+        assert history.position() == position
+        assert (state.crates, state.player, state.history) == position_after(moves[:position])
+
+    assert state.is_solved()
+
+
+def test_redo_and_new_move():
+    """Function testing that the cancelled moves can be played again, and that they
+    are forgotten (with their checkpoints) when another move is played."""
+
+    (state, history, moves) = played_game()
+
+    for move in moves:
+        state.move(move)
+        history.record()
+
+    # The undo leaves the cancelled moves in the timeline
+    for _ in range(INTERVAL * 2 + 1):
+        state.undo()
+
+    position = history.position()
+    assert history.next_move() & ~MOVE_PUSH_FLAG == moves[position]
+    assert history.length() == len(moves)
+
+    # Playing the same move again keeps the timeline
+    state.move(moves[position])
+    history.record()
+    assert history.length() == len(moves)
+
+    # Playing another move forgets the rest of the timeline
+    state.undo()
+    other = next(move for move in range(len(MOVE_LETTERS))
+                 if move != moves[position] and state.move(move))
+    history.record()
+
+    assert history.length() == position + 1
+    assert history.next_move() is None
+    assert len(history.checkpoints) == (position + 1) // INTERVAL + 1
+
+    history.seek(0)
+    history.seek(position + 1)
+    assert (state.crates, state.player) == position_after(moves[:position] + [other])[:2]
+
+
+def test_clear_replays_the_history():
+    """Function testing that a MoveHistory created on a state which has already
+    played moves gets the checkpoints of these moves."""
+
+    (_, _, moves) = played_game()
+
+    state = SokobanState.from_file(LEVEL)
+
+    for move in moves:
+        state.move(move)
+
+    history = MoveHistory(state, INTERVAL)
+
+    assert history.position() == history.length() == len(moves)
+    assert len(history.checkpoints) == len(moves) // INTERVAL + 1
+    assert (state.crates, state.player) == position_after(moves)[:2]
@@ -0,0 +1,114 @@
+"""
+Tests of the cache of the compiled levels: a compiled level is only used while
+its level file has the same signature (modification time and size) or the same
+content, and the level file is parsed again otherwise.
+"""
+
+import os
+
+import pytest
+
+import level_cache
+from level_cache import compiled_path, load_level, save_background
+
+LEVEL = '''1,1,1,1,1,1
+1,5,2,0,3,1
+1,1,1,1,1,1
+'''
+
+# The same level, with the crate and the trophy swapped (same size)
+SWAPPED_LEVEL = LEVEL.replace('2,0,3', '3,0,2')
+
+
+def parse_counter(monkeypatch):
+    """Function counting the levels parsed by the load_level function
+    (the returned list gets one item per parsed level)."""
+
+    parsed = []
+    read_level_reference = level_cache.read_level_reference
+
+    def counted_read(reference):
+        """Function parsing the level <reference>, and counting it."""
+        parsed.append(reference)
+        return read_level_reference(reference)
+
+    monkeypatch.setattr(level_cache, 'read_level_reference', counted_read)
+
+    return parsed
+
+
+def touch(filename, shift):
+    """Function changing the modification time of the file <filename> by <shift> seconds."""
+
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + shift * 10 ** 9))
+
+
+def test_cache_invalidation(tmp_path, monkeypatch):
+    """Function testing that the level is parsed again when its content changes,
+    even with the same size, and not when it is only touched."""
+
+    filename = str(tmp_path / 'level.txt')
+    cache_path = str(tmp_path / 'cache')
+    parsed = parse_counter(monkeypatch)
+
+    with open(filename, 'w', encoding='utf-8') as level_file:
+        level_file.write(LEVEL)
+
+    level = load_level(filename, cache_path)
+    assert (level.crates, level.trophies, parsed) == ([(2, 1)], [(4, 1)], [filename])
+    assert os.path.isfile(compiled_path(filename, cache_path))
+
+    # Same signature: the compiled level is used
+    assert load_level(filename, cache_path).crates == [(2, 1)]
+    assert len(parsed) == 1
+
+    # New modification time, same content: the compiled level is used,
+    # and its signature is updated
+    touch(filename, 10)
+    assert load_level(filename, cache_path).crates == [(2, 1)]
+    assert load_level(filename, cache_path).crates == [(2, 1)]
+    assert len(parsed) == 1
+
+    # New content of the same size: the level is parsed again
+    with open(filename, 'w', encoding='utf-8') as level_file:
+        level_file.write(SWAPPED_LEVEL)
+
+    touch(filename, 20)
+    assert load_level(filename, cache_path).crates == [(4, 1)]
+    assert len(parsed) == 2
+
+    # New size: the level is parsed again, and the errors are raised
+    with open(filename, 'w', encoding='utf-8') as level_file:
+        level_file.write(SWAPPED_LEVEL.replace('5', '0'))
+
+    with pytest.raises(ValueError):
+        load_level(filename, cache_path)
+
+    assert len(parsed) == 3
+
+
+def test_background_and_corrupted_cache(tmp_path, monkeypatch):
+    """Function testing that the pixels of the background are kept in the cache,
+    and that a corrupted compiled level is compiled again."""
+
+    filename = str(tmp_path / 'level.txt')
+    cache_path = str(tmp_path / 'cache')
+    parsed = parse_counter(monkeypatch)
+
+    with open(filename, 'w', encoding='utf-8') as level_file:
+        level_file.write(LEVEL)
+
+    level = load_level(filename, cache_path)
+    assert save_background(level, filename, 7, (2, 1), b'\x01' * 8, cache_path)
+
+    level = load_level(filename, cache_path)
+    assert (level.background_tag, level.background_size) == (7, (2, 1))
+    assert bytes(level.background_pixels) == b'\x01' * 8
+    assert len(parsed) == 1
+
+    with open(compiled_path(filename, cache_path), 'r+b') as compiled:
+        compiled.write(b'XXXX')
+
+    level = load_level(filename, cache_path)
+    assert (level.crates, level.background_pixels, len(parsed)) == ([(2, 1)], None, 2)
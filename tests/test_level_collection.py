@@ -0,0 +1,103 @@
+"""
+Tests of the level collections: the index of the levels in the collection file,
+its cache, and the levels read through it.
+"""
+
+import os
+
+import pytest
+
+from level_collection import LevelCollection, read_level_reference
+
+# Collection of three levels, with comments, titles and blank lines between them,
+# and Windows line endings in the second one
+COLLECTION = (b'; Test collection\n\n'
+              b'Title: first\n'
+              b'#####\n#@$.#\n#####\n'
+              b'\n; 2\r\n'
+              b'######\r\n#@ $.#\r\n######\r\n'
+              b'\nTitle: third\n'
+              b'#####\n#.$@#\n#####')
+
+
+def board_offsets(data):
+    """Function returning the (offset, length) pairs of the blocks
+    of board lines of the collection <data>."""
+
+    blocks, start, offset = [], None, 0
+
+    for line in data.splitlines(keepends=True):
+        if line.strip().startswith(b'#'):
+            start = offset if start is None else start
+
+        elif start is not None:
+            blocks.append((start, offset - start))
+            start = None
+
+        offset += len(line)
+
+    return blocks + ([(start, offset - start)] if start is not None else [])
+
+
+def test_index_offsets(tmp_path):
+    """Function testing that the index gives the offset and the length of each
+    level in the file, and that the levels are read with it."""
+
+    filename = tmp_path / 'pack.xsb'
+    filename.write_bytes(COLLECTION)
+    collection = LevelCollection(str(filename), str(tmp_path / 'cache'))
+
+    assert len(collection) == 3
+    assert list(zip(collection.offsets, collection.lengths)) == board_offsets(COLLECTION)
+
+    for number in range(len(collection)):
+        (start, length) = board_offsets(COLLECTION)[number]
+        lines = COLLECTION[start:start + length].decode().splitlines()
+
+        assert collection.board_lines(number) == lines
+
+    # The levels are parsed from the lines of the index
+    assert collection[0][1:] == ([(2, 1)], [(3, 1)], (1, 1))
+    assert collection[1][1:] == ([(3, 1)], [(4, 1)], (1, 1))
+    assert collection[2][1:] == ([(2, 1)], [(1, 1)], (3, 1))
+    assert read_level_reference(collection.reference(1)) == collection[1]
+
+    with pytest.raises(IndexError):
+        collection.board_lines(3)
+
+    with pytest.raises(ValueError):
+        read_level_reference(collection.reference(3))
+
+
+def test_stale_index(tmp_path):
+    """Function testing that the index is reloaded from the cache while the
+    collection is unchanged, and rebuilt once it has changed."""
+
+    filename = tmp_path / 'pack.xsb'
+    cache_path = str(tmp_path / 'cache')
+    filename.write_bytes(COLLECTION)
+
+    collection = LevelCollection(str(filename), cache_path)
+    assert os.path.isfile(collection.index_path())
+
+    # The saved index matches the unchanged collection
+    assert LevelCollection(str(filename), cache_path).load_index()
+
+    # A level is added: the index is stale, and rebuilt
+    data = COLLECTION + b'\n\n#######\n#@ $ .#\n#######\n'
+    filename.write_bytes(data)
+
+    collection = LevelCollection(str(filename), cache_path)
+
+    assert len(collection) == 4
+    assert list(zip(collection.offsets, collection.lengths)) == board_offsets(data)
+    assert collection[3][1:] == ([(3, 1)], [(5, 1)], (1, 1))
+
+    # The rebuilt index is saved for the next time
+    assert LevelCollection(str(filename), cache_path).load_index()
+
+    # A corrupted index is rebuilt as well
+    with open(collection.index_path(), 'r+b') as index:
+        index.truncate(10)
+
+    assert len(LevelCollection(str(filename), cache_path)) == 4
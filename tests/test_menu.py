@@ -0,0 +1,64 @@
+"""
+Tests of the order of the levels in the level menu: each level of the
+collections has its own place, and the levels which cannot be read are skipped.
+"""
+
+import menu
+
+LEVEL = '''#####
+#@$.#
+#####
+'''
+
+LEVEL_FILE = '''1,1,1,1,1
+1,5,2,3,1
+1,1,1,1,1
+'''
+
+
+def levels_directory(path):
+    """Function creating a levels directory in <path>: a level file, a collection
+    of three levels (the second one has no character), another level file, and a
+    directory whose name is the one of a level file (it cannot be read)."""
+
+    path.mkdir()
+    (path / 'a.txt').write_text(LEVEL_FILE, encoding='utf-8')
+    (path / 'b.xsb').write_text('; 1\n{0}\n; 2\n#####\n# $.#\n#####\n\n; 3\n{0}'.format(LEVEL),
+                                encoding='utf-8')
+    (path / 'c.txt').write_text(LEVEL_FILE, encoding='utf-8')
+    (path / 'd.txt').mkdir()
+
+    return str(path)
+
+
+def test_level_references(tmp_path, monkeypatch):
+    """Function testing that the levels of the collections are listed one by one,
+    in the order of the files."""
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(menu, 'LEVEL_MENU_LEVELS_PATH', levels_directory(tmp_path / 'levels'))
+
+    references = menu.level_references()
+
+    assert len(references) == 6
+    assert references[0].endswith('a.txt') and references[4].endswith('c.txt')
+    assert references[1:4] == [menu.level_reference('b.xsb')[:-1] + str(number)
+                               for number in (1, 2, 3)]
+
+
+def test_next_level_reference(tmp_path, monkeypatch):
+    """Function testing that the next level skips the levels which cannot
+    be parsed or read, and that there is no level after the last one."""
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(menu, 'LEVEL_MENU_LEVELS_PATH', levels_directory(tmp_path / 'levels'))
+
+    references = menu.level_references()
+
+    assert menu.next_level_reference(references[0]) == references[1]
+    assert menu.next_level_reference(references[1]) == references[3]
+    assert menu.next_level_reference(references[3]) == references[4]
+
+    # The directory cannot be read as a level, so there is no level after c.txt
+    assert menu.next_level_reference(references[4]) is None
+    assert menu.next_level_reference('unknown.txt') is None
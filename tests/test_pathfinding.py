@@ -0,0 +1,94 @@
+"""
+Tests of the paths of the character (PathFinder class): they must be the
+shortest walks to the clicked tile, and never push a crate.
+"""
+
+import os
+import random
+
+from core_constants import LEVELS_PATH, MOVE_BLOCKED, MOVE_WALKED, WALL_FLAG
+from engine import SokobanState
+from pathfinding import PathFinder
+
+LEVEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     LEVELS_PATH, 'level_A.txt')
+
+# Number of random moves played in the level
+MOVES = 300
+
+
+def distances(state):
+    """Function returning the number of moves needed by the character of the <state>
+    to walk to each tile it can reach (a dictionary indexed by the tiles)."""
+
+    result = {state.player: 0}
+    tiles = [state.player]
+
+    for tile in tiles:
+        for offset in state.offsets:
+            next_tile = tile + offset
+
+            if next_tile not in result and not state.board[next_tile] & WALL_FLAG \
+                    and next_tile not in state.crates:
+                result[next_tile] = result[tile] + 1
+                tiles.append(next_tile)
+
+    return result
+
+
+def test_shortest_paths():
+    """Function testing that the path to each tile leads there without pushing,
+    with the minimal number of moves, and that the state is unchanged."""
+
+    state = SokobanState.from_file(LEVEL)
+    pathfinder = PathFinder(state)
+    reachable = distances(state)
+
+    for target in range(len(state.board)):
+        path = pathfinder.path_to(target)
+
+        assert (state.crates, state.player, state.history) == (
+            set(state.initial_crates), state.initial_player, bytearray())
+
+        if target not in reachable:
+            assert path is None
+            continue
+
+        assert len(path) == reachable[target]
+
+        copy = state.copy()
+
+        for move in path:
+            assert copy.move(move) == MOVE_WALKED
+
+        assert copy.player == target
+
+
+def test_paths_follow_the_state():
+    """Function testing that the paths are searched again when the character
+    moves or a crate is pushed, including after a partial search."""
+
+    state = SokobanState.from_file(LEVEL)
+    pathfinder = PathFinder(state)
+    targets = sorted(distances(state))
+
+    # A partial search leaves the path to a far tile unknown, then completes it
+    assert not pathfinder.search(targets[-1], max_tiles=1)
+    assert len(pathfinder.path_to(targets[-1])) == distances(state)[targets[-1]]
+
+    # The character walks and pushes at random, and the paths always take
+    # the new position into account
+    generator = random.Random(0)
+
+    for _ in range(MOVES):
+        if state.move(generator.randrange(4)) == MOVE_BLOCKED:
+            continue
+
+        reachable = distances(state)
+
+        for target in targets:
+            path = pathfinder.path_to(target)
+            assert (path is None) == (target not in reachable)
+            assert path is None or len(path) == reachable[target]
+
+    assert state.push_count()
@@ -0,0 +1,141 @@
+"""
+Tests of the plans pushing a dragged crate (plan_push function and PushPlanner
+class): they must push the crate to the target with the fewest pushes.
+"""
+
+import collections
+import threading
+
+from core_constants import MOVE_PUSHED, WALL_FLAG
+from engine import SokobanState, split_tile_map
+from push_planner import PushPlanner, plan_push
+
+# The level of the tests ('#' wall, '$' crate, '.' trophy, '@' character)
+LEVEL = ['#########',
+         '#   #   #',
+         '# $ $ # #',
+         '#  .@ . #',
+         '## #  ###',
+         '#     $.#',
+         '#########']
+
+TILE_CODES = {' ': 0, '#': 1, '$': 2, '.': 3, '@': 5}
+
+
+def level_state():
+    """Function creating the state of the level of the tests."""
+    return SokobanState(*split_tile_map([[TILE_CODES[character] for character in line]
+                                         for line in LEVEL]))
+
+
+def fewest_pushes(state, crate):
+    """Function returning the fewest pushes needed to move the crate on the <crate>
+    tile of the <state> to each tile (a dictionary indexed by the tiles), the other
+    crates staying in place. It is a breadth-first search over the positions of the
+    crate and of the character, where the walks cost nothing."""
+
+    def free(tile, crate):
+        """Function returning True if the character or the crate can go to the <tile>."""
+        return not state.board[tile] & WALL_FLAG and tile != crate \
+            and (tile not in state.crates or tile == start)
+
+    start = crate
+    pushes = {(crate, state.player): 0}
+    positions = collections.deque([(crate, state.player)])
+    result = {}
+
+    while positions:
+        (crate, player) = positions.popleft()
+        count = pushes[(crate, player)]
+        result.setdefault(crate, count)
+
+        for offset in state.offsets:
+            next_tile = player + offset
+
+            if next_tile == crate:
+                position, cost = (crate + offset, next_tile), count + 1
+
+                if not free(crate + offset, crate):
+                    continue
+
+            elif free(next_tile, crate):
+                position, cost = (crate, next_tile), count
+
+            else:
+                continue
+
+            if position not in pushes or cost < pushes[position]:
+                pushes[position] = cost
+
+                if cost == count:
+                    positions.appendleft(position)
+                else:
+                    positions.append(position)
+
+    return result
+
+
+def snapshot(state):
+    """Function returning the position of the <state>, with its history."""
+    return (set(state.crates), state.player, bytes(state.history))
+
+
+def test_plans_push_the_crate_to_the_target():
+    """Function testing that the plans push the crate to each tile it can reach
+    with the fewest pushes, and that there is no plan for the other tiles."""
+
+    state = level_state()
+    before = snapshot(state)
+
+    for crate in sorted(state.crates):
+        reachable = fewest_pushes(state, crate)
+
+        for target in range(len(state.board)):
+            (status, moves) = plan_push(state, crate, target, time_limit=None)
+
+            assert snapshot(state) == before
+
+            if target not in reachable:
+                assert (status, moves) == ('impossible', None)
+                continue
+
+            assert status == 'planned'
+
+            copy = state.copy()
+            pushes = 0
+
+            for move in moves:
+                pushes += copy.move(move) == MOVE_PUSHED
+
+            assert copy.crates == state.crates - {crate} | {target}
+            assert pushes == reachable[target]
+
+
+def test_planner_thread():
+    """Function testing that the plans searched by the worker thread are passed
+    to the callback, and that a cancelled search stops without a plan."""
+
+    state = level_state()
+    crate = min(state.crates)
+    target = max(fewest_pushes(state, crate))
+    planner = PushPlanner()
+    (results, done) = ([], threading.Event())
+
+    def callback(result):
+        """Function storing the result of the plan."""
+        results.append(result)
+        done.set()
+
+    try:
+        planner.request(state, crate, target, callback)
+        assert done.wait(10)
+
+    finally:
+        planner.shutdown()
+
+    assert results == [plan_push(state, crate, target)]
+
+    cancelled = threading.Event()
+    cancelled.set()
+
+    assert plan_push(state, crate, target, cancelled=cancelled) == ('cancelled', None)
@@ -0,0 +1,91 @@
+"""
+Tests of the replays: the packing of the moves, the replay files, and the
+playback of the games without any display.
+"""
+
+import os
+
+import pytest
+
+from core_constants import (LEVELS_PATH, MOVE_BLOCKED, MOVE_LETTERS,
+                            MOVE_PUSH_FLAG, REPLAY_EXTENSION)
+from engine import SokobanState
+from replay import REPLAY_HEADER, Replay, pack_moves, play_replay, unpack_moves
+from solver import Solver
+
+LEVEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     LEVELS_PATH, 'level_A.txt')
+
+
+def solved_state():
+    """Function returning the state of level_A after the moves of a solution."""
+
+    state = SokobanState.from_file(LEVEL)
+
+    for letter in Solver(state.copy()).solve(time_limit=60).solution:
+        state.move(MOVE_LETTERS.index(letter.lower()))
+
+    return state
+
+
+def test_pack_moves_round_trip():
+    """Function testing that the packed moves are unpacked to the same move codes,
+    without their push flags, for any number of moves."""
+
+    moves = bytes([0, 1, 2, 3, 3 | MOVE_PUSH_FLAG, 2, 1 | MOVE_PUSH_FLAG, 0, 3])
+
+    for count in range(len(moves) + 1):
+        packed = pack_moves(moves[:count])
+
+        assert len(packed) == -(-count // 4)
+        assert unpack_moves(packed, count) == bytes(move & ~MOVE_PUSH_FLAG
+                                                    for move in moves[:count])
+
+
+def test_replay_file_round_trip(tmp_path):
+    """Function testing that a saved replay is loaded with the same fields,
+    and that it solves the level when it is played again."""
+
+    replay = Replay.from_state(solved_state(), LEVEL, started=1234.5, duration=67.25)
+    filename = str(tmp_path / ('game' + REPLAY_EXTENSION))
+    replay.save(filename)
+
+    loaded = Replay.load(filename)
+
+    assert [getattr(loaded, name) for name in Replay.__slots__] \
+        == [getattr(replay, name) for name in Replay.__slots__]
+
+    state = play_replay(loaded)
+
+    assert state.is_solved()
+    assert state.move_count() == replay.move_count
+
+
+def test_truncated_replays():
+    """Function testing that the truncated or invalid replays, and the replays
+    which cannot be played on their level, raise a ValueError."""
+
+    data = Replay.from_state(solved_state(), LEVEL).to_bytes()
+
+    for length in (0, REPLAY_HEADER.size - 1, REPLAY_HEADER.size + len(LEVEL), len(data) - 1):
+        with pytest.raises(ValueError, match='truncated replay'):
+            Replay.from_bytes(data[:length])
+
+    with pytest.raises(ValueError, match='invalid replay'):
+        Replay.from_bytes(b'XXXX' + data[4:])
+
+    # The moves must be played on the level of the replay
+    replay = Replay.from_bytes(data)
+    replay.level_hash = '0' * 32
+
+    with pytest.raises(ValueError, match='does not match'):
+        play_replay(replay)
+
+    # The moves must be possible
+    state = SokobanState.from_file(LEVEL)
+    blocked = next(move for move in range(len(MOVE_LETTERS))
+                   if state.copy().move(move) == MOVE_BLOCKED)
+    replay = Replay(LEVEL, state.level_hash(), pack_moves(bytes([blocked])), 1)
+
+    with pytest.raises(ValueError, match='impossible move 1'):
+        play_replay(replay)
@@ -0,0 +1,136 @@
+"""
+Tests of the solver: the solutions found are checked by playing them again
+with the engine.
+"""
+
+import os
+
+import pytest
+
+from core_constants import (CHARACTER, CRATE, LEVELS_PATH, MOVE_BLOCKED,
+                            MOVE_LETTERS, MOVE_PUSHED, TROPHY, WALL)
+from engine import SokobanState, split_tile_map
+from solver import Solver, main
+
+LEVELS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      LEVELS_PATH)
+
+
+def level_state(name):
+    """Function creating the state of the level file <name> of the levels directory."""
+    return SokobanState.from_file(os.path.join(LEVELS, name))
+
+
+def replay(state, solution):
+    """Function playing the <solution> (LURD string) from <state>, and returning
+    the number of pushes played. Each move must be possible, and only the moves
+    in upper case must push a crate."""
+
+    for letter in solution:
+        result = state.move(MOVE_LETTERS.index(letter.lower()))
+
+        assert result != MOVE_BLOCKED
+        assert (result == MOVE_PUSHED) == letter.isupper()
+
+    return state.push_count()
+
+
+@pytest.mark.parametrize('name', ['level_A.txt', 'level_B.txt', 'level_C.txt',
+                                  'level_D.txt', 'level_E.txt'])
+def test_solutions_replay(name):
+    """Function testing that the solutions of the levels solve them
+    when they are played again."""
+
+    state = level_state(name)
+    result = Solver(state).solve(time_limit=60)
+
+    assert result.solved and result.status == 'solved'
+    assert replay(state, result.solution) == result.pushes
+    assert state.is_solved()
+
+
+def test_minimal_pushes():
+    """Function testing that the solutions found with a weight of 1
+    have the minimal number of pushes."""
+
+    state = level_state('level_D.txt')
+    result = Solver(state, weight=1).solve(time_limit=60)
+
+    assert result.pushes == 41
+    assert replay(state, result.solution) == 41
+    assert state.is_solved()
+
+
+def test_corral_check_gives_a_solution():
+    """Function testing that the level is solved with and without the check
+    of the corral deadlocks."""
+
+    for corral_check in (False, True):
+        state = level_state('level_A.txt')
+        result = Solver(state, corral_check=corral_check).solve(time_limit=60)
+
+        replay(state, result.solution)
+        assert state.is_solved()
+
+
+def test_unsolvable():
+    """Function testing a level whose crate can never reach the trophy."""
+
+    state = SokobanState(*split_tile_map([
+        [WALL, WALL, WALL, WALL, WALL],
+        [WALL, CRATE, 0, 0, WALL],
+        [WALL, 0, CHARACTER, TROPHY, WALL],
+        [WALL, WALL, WALL, WALL, WALL],
+    ]))
+    result = Solver(state).solve(time_limit=10)
+
+    assert not result.solved
+    assert result.status == 'unsolvable'
+    assert result.solution is None
+
+
+def test_node_limit():
+    """Function testing that the search stops at the maximum number of nodes."""
+
+    result = Solver(level_state('level_D.txt')).solve(max_nodes=10)
+
+    assert not result.solved
+    assert result.status == 'node_limit'
+    assert result.nodes == 10
+
+
+def test_main_invalid_level(capsys):
+    """Function testing that the command line reports an invalid level
+    on the error output, with the exit status 1."""
+
+    assert main([os.path.join(LEVELS, 'level_F.txt')]) == 1
+    assert 'invalid tile code' in capsys.readouterr().err
+
+
+@pytest.mark.slow
+def test_level_j_unsolvable():
+    """Function testing that the search exhausts the positions of level_J without
+    finding a solution: every position reachable without a dead tile, a freeze or
+    a corral deadlock is expanded (about 2.4 million nodes, 11 minutes and 1 GB).
+    Run with: python -m pytest -m slow"""
+
+    result = Solver(level_state('level_J.txt'), table_size=1 << 25).solve()
+
+    assert not result.solved
+    assert result.status == 'unsolvable'
+
+
+def test_level_i_solvable():
+    """Function testing that level_I can be solved, with the 207 pushes solution of
+    the solutions directory: the solver stops at its time limit on this level, the
+    goal room being reachable through a single tile."""
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solutions', 'level_I.txt')
+
+    with open(path, encoding='utf-8') as solution:
+        letters = ''.join(solution.read().split())
+
+    state = level_state('level_I.txt')
+
+    assert replay(state, letters) == 207
+    assert state.is_solved()
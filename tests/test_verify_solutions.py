@@ -0,0 +1,96 @@
+"""
+Tests of the verification of the solutions: the status reported for each
+solution, and the command line on a JSONL file.
+"""
+
+import json
+import os
+
+from core_constants import LEVELS_PATH, MOVE_LETTERS
+from engine import SokobanState
+from solver import Solver
+from verify_solutions import main, resolve_entries, verify_batch, verify_solution
+
+LEVEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     LEVELS_PATH, 'level_A.txt')
+
+
+def solution():
+    """Function returning a solution of level_A (LURD string)."""
+    return Solver(SokobanState.from_file(LEVEL)).solve(time_limit=60).solution
+
+
+def blocked_move():
+    """Function returning the letter of a move which is blocked at the start of level_A."""
+
+    state = SokobanState.from_file(LEVEL)
+
+    return next(letter for (move, letter) in enumerate(MOVE_LETTERS)
+                if not state.copy().move(move))
+
+
+def test_statuses():
+    """Function testing the status of valid, unsolved, blocked and invalid solutions."""
+
+    lurd = solution()
+
+    report = verify_solution(LEVEL, lurd)
+    assert (report['status'], report['valid'], report['error']) == ('valid', True, None)
+    assert report['pushes'] == sum(letter.isupper() for letter in lurd)
+    assert report['moves'] == len(lurd)
+
+    # The whitespaces are ignored, and the case only matters in strict mode
+    assert verify_solution(LEVEL, ' \n'.join(lurd.lower()))['status'] == 'valid'
+    assert verify_solution(LEVEL, lurd.lower(), strict=True)['status'] == 'push_mismatch'
+
+    report = verify_solution(LEVEL, lurd[:-1])
+    assert (report['status'], report['valid']) == ('unsolved', False)
+
+    report = verify_solution(LEVEL, 'xx' + blocked_move())
+    assert (report['status'], report['diverged_at']) == ('invalid', 1)
+    assert report['error'] == "invalid character 'x'"
+
+    report = verify_solution(LEVEL, blocked_move() + lurd)
+    assert (report['status'], report['diverged_at'], report['moves']) == ('blocked', 1, 0)
+
+
+def test_unknown_level():
+    """Function testing that the solutions of unknown levels and the malformed
+    entries are reported as invalid, without being played."""
+
+    lurd = solution()
+    entries = list(resolve_entries([('1', 'level_A', lurd), ('2', 'level_Z', lurd),
+                                    ('3', LEVEL, None)], [LEVEL]))
+    reports = verify_batch(entries)
+
+    assert [report['id'] for report in reports] == ['1', '2', '3']
+    assert [report['status'] for report in reports] == ['valid', 'invalid', 'invalid']
+    assert [report['error'] for report in reports] == [None, 'unknown level', 'malformed entry']
+
+    # A level which cannot be read is reported as well
+    report = verify_solution(LEVEL + '.missing', lurd)
+    assert (report['status'], report['valid']) == ('invalid', False)
+
+
+def test_main(tmp_path):
+    """Function testing the command line on a JSONL file, with its report
+    and its exit status."""
+
+    solutions = tmp_path / 'solutions.jsonl'
+    output = tmp_path / 'report.json'
+    line = json.dumps({'id': 'good', 'level': 'level_A', 'solution': solution()})
+    solutions.write_text(line + '\nnot json\n', encoding='utf-8')
+
+    assert main([str(solutions), '--levels', LEVEL, '--jobs', '1',
+                 '--output', str(output)]) == 1
+
+    report = json.loads(output.read_text(encoding='utf-8'))
+
+    assert (report['valid'], report['total']) == (1, 2)
+    assert report['solutions'][0]['status'] == 'valid'
+    assert report['solutions'][1]['error'] == 'malformed entry'
+
+    solutions.write_text(line + '\n', encoding='utf-8')
+
+    assert main([str(solutions), '--levels', LEVEL, '--jobs', '1',
+                 '--output', str(output)]) == 0
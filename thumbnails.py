@@ -0,0 +1,253 @@
+"""
+This module renders the thumbnails of the levels displayed in the level menu.
+A thumbnail is drawn from the grid of the level (one colored block per tile,
+or one pixel for several tiles on the largest maps), by a pool of worker
+processes, so that the menu stays responsive. The thumbnails are saved in the
+cache directory, keyed by the digest of the content of the level: a level is
+only rendered again if it changes. This module does not depend on pygame.
+"""
+
+import concurrent.futures
+import os
+import struct
+
+from core_constants import (CRATE_FLAG, THUMBNAIL_CHARACTER_COLOR,
+                            THUMBNAIL_CRATE_COLOR, THUMBNAIL_FLOOR_COLOR,
+                            THUMBNAIL_MAGIC, THUMBNAIL_OUTSIDE_COLOR,
+                            THUMBNAIL_PLACED_CRATE_COLOR, THUMBNAIL_SIZE,
+                            THUMBNAIL_TROPHY_COLOR, THUMBNAIL_VERSION,
+                            THUMBNAIL_WALL_COLOR, THUMBNAIL_WORKERS,
+                            THUMBNAILS_PATH, TROPHY_FLAG, WALL_FLAG)
+from engine import SokobanState, reachable_tiles
+from level_cache import load_level
+
+# Header of a thumbnail file: magic, version, width and height in pixels
+THUMBNAIL_HEADER = struct.Struct('<4sHHH')
+
+
+def tile_colors(state):
+    """Function returning the colors (RGBA bytes) of the tiles of the board of
+    <state>, and the area of the board which is drawn, as a tuple (colors, left,
+    top, width, height) in tiles of the board. The floor is the part of the map
+    which the character can reach if the crates are removed: only the walls
+    around it are drawn, the other tiles are transparent."""
+
+    # The crates are removed to find the floor
+    board = bytes(flags & ~CRATE_FLAG for flags in state.board)
+    floor = bytearray(len(board))
+
+    for tile in reachable_tiles(board, state.offsets, state.player):
+        floor[tile] = 1
+
+    # Offsets of the 8 neighbours of a tile
+    stride = state.stride
+    neighbours = [dx + dy * stride for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                  if dx or dy]
+
+    (wall, floor_color, trophy, crate, placed_crate, character, outside) = (
+        bytes(color) for color in (
+            THUMBNAIL_WALL_COLOR, THUMBNAIL_FLOOR_COLOR, THUMBNAIL_TROPHY_COLOR,
+            THUMBNAIL_CRATE_COLOR, THUMBNAIL_PLACED_CRATE_COLOR,
+            THUMBNAIL_CHARACTER_COLOR, THUMBNAIL_OUTSIDE_COLOR)
+    )
+
+    colors = [outside] * len(board)
+    drawn = []
+
+    for tile, flags in enumerate(state.board):
+        if floor[tile]:
+            if flags & CRATE_FLAG:
+                colors[tile] = placed_crate if flags & TROPHY_FLAG else crate
+
+            elif tile == state.player:
+                colors[tile] = character
+
+            else:
+                colors[tile] = trophy if flags & TROPHY_FLAG else floor_color
+
+        # The walls are drawn if they touch the floor (the floor never
+        # touches the border of the board, which is made of walls)
+        elif flags & WALL_FLAG and any(
+                0 <= tile + offset < len(floor) and floor[tile + offset]
+                for offset in neighbours):
+            colors[tile] = wall
+
+        else:
+            continue
+
+        drawn.append(tile)
+
+    # Area of the board containing the drawn tiles
+    rows = [tile // stride for tile in (drawn[0], drawn[-1])]
+    columns = [tile % stride for tile in drawn]
+
+    return (colors, min(columns), rows[0], max(columns) - min(columns) + 1,
+            rows[1] - rows[0] + 1)
+
+
+def render_thumbnail(state, size=THUMBNAIL_SIZE):
+    """Function rendering the thumbnail of the level of <state>, which fits in
+    <size> pixels. It returns a tuple (width, height, pixels), where pixels are
+    RGBA bytes. The map is scaled down by sampling the tiles if it has more
+    tiles than the thumbnail has pixels."""
+
+    (colors, left, top, columns, rows) = tile_colors(state)
+
+    scale = min(size[0] / columns, size[1] / rows)
+
+    # Integer number of pixels per tile, when the map is small enough
+    if scale >= 1:
+        scale = int(scale)
+
+    width = max(1, int(columns * scale))
+    height = max(1, int(rows * scale))
+
+    # Index (in a row of the board) of the tile displayed by each column of pixels
+    tile_columns = [left + x * columns // width for x in range(width)]
+
+    lines, previous_row = [], None
+
+    for y in range(height):
+        row = top + y * rows // height
+
+        # The consecutive lines of pixels of the same row of tiles are identical
+        if row != previous_row:
+            start = row * state.stride
+            line = b''.join(colors[start + column] for column in tile_columns)
+            previous_row = row
+
+        lines.append(line)
+
+    return (width, height, b''.join(lines))
+
+
+def thumbnail_path(level_hash, size, path=THUMBNAILS_PATH):
+    """Function returning the path of the thumbnail of the level of digest
+    <level_hash>, rendered with the given <size>."""
+    return os.path.join(path, '{}-{}x{}.thb'.format(level_hash, size[0], size[1]))
+
+
+def read_thumbnail(filename):
+    """Function reading a thumbnail file. It returns a tuple (width, height, pixels),
+    or None if the file does not exist or is not valid."""
+
+    try:
+        with open(filename, 'rb') as thumbnail:
+            data = thumbnail.read()
+
+        (magic, version, width, height) = THUMBNAIL_HEADER.unpack_from(data)
+
+    except (OSError, struct.error):
+        return None
+
+    if magic != THUMBNAIL_MAGIC or version != THUMBNAIL_VERSION \
+            or len(data) != THUMBNAIL_HEADER.size + 4 * width * height:
+        return None
+
+    return (width, height, data[THUMBNAIL_HEADER.size:])
+
+
+def write_thumbnail(filename, thumbnail):
+    """Function saving a <thumbnail> (tuple (width, height, pixels)) in <filename>.
+    It returns False if the file cannot be written."""
+
+    (width, height, pixels) = thumbnail
+    temporary_path = '{}.{}.tmp'.format(filename, os.getpid())
+
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        with open(temporary_path, 'wb') as thumbnail_file:
+            thumbnail_file.write(THUMBNAIL_HEADER.pack(
+                THUMBNAIL_MAGIC, THUMBNAIL_VERSION, width, height))
+            thumbnail_file.write(pixels)
+
+        os.replace(temporary_path, filename)
+
+    except OSError:
+        return False
+
+    return True
+
+
+def load_thumbnail(reference, size=THUMBNAIL_SIZE, path=THUMBNAILS_PATH):
+    """Function returning the thumbnail of the level <reference>, read from the
+    cache if the level has already been rendered, and rendered otherwise.
+    It returns a tuple (width, height, pixels), or None if the level is not valid.
+    It is run by the worker processes."""
+
+    try:
+        state = SokobanState(*load_level(reference).to_level())
+
+    except (OSError, ValueError):
+        return None
+
+    filename = thumbnail_path(state.level_hash(), size, path)
+    thumbnail = read_thumbnail(filename)
+
+    if thumbnail is None:
+        thumbnail = render_thumbnail(state, size)
+        write_thumbnail(filename, thumbnail)
+
+    return thumbnail
+
+
+class ThumbnailRenderer():
+    """Class rendering the thumbnails in a pool of worker processes.
+    The pool is only started when the first thumbnail is requested."""
+
+    def __init__(self, workers=THUMBNAIL_WORKERS, size=THUMBNAIL_SIZE, path=THUMBNAILS_PATH):
+        """Constructor method. <workers> is the number of processes, <size> the
+        maximum size of the thumbnails, and <path> the directory where they are saved."""
+
+        self.workers, self.size, self.path = workers, size, path
+        self.executor = None
+
+        # Thumbnails which have not been rendered yet
+        self.futures = set()
+
+    def request(self, reference, callback):
+        """Method requesting the thumbnail of the level <reference>. <callback> is
+        called with the thumbnail (a tuple (width, height, pixels)) once it is ready:
+        it is called from another thread, and not at all if the level is not valid."""
+
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+
+        future = self.executor.submit(load_thumbnail, reference, self.size, self.path)
+        self.futures.add(future)
+
+        def done(future):
+            """Function passing the thumbnail to the callback."""
+
+            self.futures.discard(future)
+
+            if future.cancelled() or future.exception() is not None:
+                return
+
+            if future.result() is not None:
+                callback(future.result())
+
+        future.add_done_callback(done)
+
+    def cancel(self):
+        """Method cancelling the thumbnails which are not rendered yet
+        (their callbacks are not called)."""
+
+        for future in list(self.futures):
+            future.cancel()
+
+    def shutdown(self):
+        """Method cancelling the thumbnails which are not rendered yet,
+        and stopping the worker processes. They are started again
+        if another thumbnail is requested."""
+
+        self.cancel()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+# Renderer shared by the level menus
+thumbnail_renderer = ThumbnailRenderer()
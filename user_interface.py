@@ -4,9 +4,12 @@ such the Button and the Input class.
 """
 
 import pygame
+from assets import asset_cache
 from constants import (UI_FONT_PATH, UI_TEXT_COLOR, UI_BACKGROUND_COLOR,
                        UI_TEXT_PROPORTION, UI_HOVER_COLOR, UI_HOVER_ALPHA_VALUE,
-                       UI_BUTTON_CHECK_PATH, UI_BUTTON_CHECK_SIZE)
+                       UI_BUTTON_CHECK_PATH, UI_BUTTON_CHECK_SIZE,
+                       LEVEL_MENU_NUMBER_PROPORTION, THUMBNAIL_EVENT)
+from thumbnails import thumbnail_renderer
 
 
 class ImageSprite(pygame.sprite.Sprite):
@@ -18,8 +21,8 @@ class ImageSprite(pygame.sprite.Sprite):
         # Call to the parent constructor
         pygame.sprite.Sprite.__init__(self)
 
-        # We load the image
-        self.image = pygame.image.load(image_path).convert_alpha()
+        # We load the image (shared by the asset cache)
+        self.image = asset_cache.image(image_path)
 
         # We define a rect for the sprite
         self.rect = pygame.Rect(coords, self.image.get_size())
@@ -35,12 +38,11 @@ class Button(pygame.sprite.Sprite):
         # Call to the parent constructor
         pygame.sprite.Sprite.__init__(self)
 
-        # Attribute saving if the button is checked
-        self.checked = False
+        # Attributes saving if the button is checked, and if it is hovered
+        self.checked, self.hovered = False, False
 
-        # Button check icon
-        self.check_icon = pygame.image.load(
-            UI_BUTTON_CHECK_PATH).convert_alpha()
+        # Button check icon (shared by all the buttons)
+        self.check_icon = asset_cache.image(UI_BUTTON_CHECK_PATH)
 
         # Rect (coordinates and dimensions) of the button
         self.rect = rect
@@ -68,15 +70,34 @@ class Button(pygame.sprite.Sprite):
 
         return self.rect.collidepoint(mouse_coords[0], mouse_coords[1])
 
+    def shown(self):
+        """Method called when the button is displayed on the screen.
+        It does nothing here, but the subclasses can use it to load their content."""
+
+    def refresh(self):
+        """Method updating the content of the button, if it has changed since it
+        was displayed. It returns True if the button has to be drawn again."""
+        return False
+
+    def hidden(self):
+        """Method called when the button is no longer displayed on the screen.
+        It does nothing here, but the subclasses can stop loading their content."""
+
     def update(self, mouse_coords):
         """Method called when the mouse is moved,
         to update the appearance of the button."""
 
+        self.hovered = self.collides(mouse_coords)
+        self.render()
+
+    def render(self):
+        """Method drawing the final image of the button."""
+
         # We display the basic image of the button
         self.image.blit(self.image_base, (0, 0))
 
         # If the button is hovered, then we also display the hover layer
-        if self.collides(mouse_coords):
+        if self.hovered:
             self.image.blit(self.hover_surface, (0, 0))
 
         # If the button is checked, then we display the button-check icon
@@ -99,7 +120,7 @@ class TextButton(Button):
         Button.__init__(self, rect)
 
         # Font used to display the text (we make the text slighlty smaller than the button)
-        text_font = pygame.font.Font(UI_FONT_PATH, int(
+        text_font = asset_cache.font(UI_FONT_PATH, int(
             self.rect.height * UI_TEXT_PROPORTION))
 
         # Size of the rendered text
@@ -133,7 +154,7 @@ class ImageButton(Button):
         Button.__init__(self, rect)
 
         # First, we load the image
-        image = pygame.image.load(image_path).convert_alpha()
+        image = asset_cache.image(image_path)
         (image_width, image_height) = image.get_size()
 
         # Then, we blit it on the button image, centering it
@@ -145,3 +166,145 @@ class ImageButton(Button):
 
         # We update the button, so that the image is filled
         self.update((0, 0))
+
+
+class LevelButton(TextButton):
+    """Class defining a button of the level menu. It displays the number of the
+    level, and then a thumbnail of the level, once it has been rendered."""
+
+    def __init__(self, rect, text, level):
+        """Constructor method. <level> is the reference of the level."""
+
+        # Call to the parent constructor
+        TextButton.__init__(self, rect, text)
+
+        self.text, self.level = text, level
+
+        # The thumbnail is requested when the button is displayed for the first time
+        # Then it is stored by the thread of the renderer, until it is displayed
+        self.thumbnail_requested = False
+        self.thumbnail_received = False
+        self.pending_thumbnail = None
+
+    def shown(self):
+        """Method requesting the thumbnail of the level, the first time
+        the button is displayed."""
+
+        if self.thumbnail_requested:
+            return
+
+        self.thumbnail_requested = True
+        thumbnail_renderer.request(self.level, self.receive_thumbnail)
+
+    def hidden(self):
+        """Method called when the button is no longer displayed: if its thumbnail
+        has not been received, its rendering may be cancelled, so the thumbnail
+        is requested again the next time the button is displayed."""
+
+        if not self.thumbnail_received and self.pending_thumbnail is None:
+            self.thumbnail_requested = False
+
+    def receive_thumbnail(self, thumbnail):
+        """Method called by the thread of the renderer when the thumbnail is ready.
+        The thumbnail is displayed by the main thread, which is woken up by an event."""
+
+        self.pending_thumbnail = thumbnail
+
+        try:
+            pygame.event.post(pygame.event.Event(THUMBNAIL_EVENT))
+
+        # The display may have been closed in the meantime
+        except pygame.error:
+            pass
+
+    def refresh(self):
+        """Method displaying the thumbnail, if it has been received."""
+
+        if self.pending_thumbnail is None:
+            return False
+
+        (width, height, pixels) = self.pending_thumbnail
+        self.pending_thumbnail = None
+        self.thumbnail_received = True
+
+        thumbnail = pygame.image.fromstring(pixels, (width, height), 'RGBA')
+
+        # The thumbnail is centered on the button, and the number of the level
+        # is written in its top left corner
+        self.image_base.fill(UI_BACKGROUND_COLOR)
+        self.image_base.blit(thumbnail, ((self.rect.width - width) // 2,
+                                         (self.rect.height - height) // 2))
+
+        font = asset_cache.font(UI_FONT_PATH, int(
+            self.rect.height * LEVEL_MENU_NUMBER_PROPORTION))
+        self.image_base.blit(
+            font.render(self.text, True, UI_TEXT_COLOR, UI_BACKGROUND_COLOR), (0, 0))
+
+        self.render()
+
+        return True
+
+
+class Timeline(pygame.sprite.Sprite):
+    """Class defining the timeline of the moves of a game. The bar is filled up
+    to the current move, and the user can click on it (or drag the mouse along it)
+    to jump to another move."""
+
+    def __init__(self, rect):
+        """Constructor method. <rect> describes the coordinates and
+        dimensions of the timeline."""
+
+        # Call to the parent constructor
+        pygame.sprite.Sprite.__init__(self)
+
+        self.rect = rect
+
+        # Current move, and number of moves of the timeline
+        self.position, self.length = 0, 0
+
+        self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.render()
+
+    def collides(self, mouse_coords):
+        """Method which determines if the coordinates of the click
+        passed in parameters are contained in the timeline."""
+
+        return self.rect.collidepoint(mouse_coords[0], mouse_coords[1])
+
+    def position_at(self, mouse_coords):
+        """Method returning the move of the timeline under the mouse."""
+
+        if not self.length:
+            return 0
+
+        ratio = (mouse_coords[0] - self.rect.x) / max(self.rect.width, 1)
+
+        return round(min(max(ratio, 0), 1) * self.length)
+
+    def update(self, position, length):
+        """Method changing the current move and the number of moves of the timeline.
+        It returns True if the image of the timeline changed."""
+
+        previous_width = self.filled_width()
+        self.position, self.length = position, length
+
+        if self.filled_width() == previous_width:
+            return False
+
+        self.render()
+
+        return True
+
+    def filled_width(self):
+        """Method returning the width (in pixels) of the filled part of the bar."""
+
+        if not self.length:
+            return 0
+
+        return self.rect.width * self.position // self.length
+
+    def render(self):
+        """Method drawing the image of the timeline."""
+
+        self.image.fill(UI_BACKGROUND_COLOR)
+        self.image.fill(UI_TEXT_COLOR, (0, 0, self.filled_width(), self.rect.height))
@@ -0,0 +1,348 @@
+"""
+This module contains a command-line tool checking a large number of solutions
+(for instance the ones submitted to a competition) in parallel, without any
+display. Each solution, in the LURD notation, is played on its level with the
+rules of the engine (the same as the ones of the sprites of the game), and
+the tool reports whether it is valid, where it diverged, and its number of
+moves and pushes.
+
+The solutions are read from JSONL files, where each line is an object with the
+fields 'level', 'solution' and optionally 'id', or from directories where each
+file holds one solution and is named after its level ('level_A.txt' for the
+level 'levels/level_A.txt', 'pack#12.txt' for the 12th level of 'pack.xsb').
+The 'level' field of a JSONL line can be such a name, or a level reference.
+
+Usage: python verify_solutions.py <solutions...> [--levels paths...] [options]
+(run with --help for the list of the options)
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import signal
+import sys
+
+from core_constants import (LEVEL_REFERENCE_SEPARATOR, LEVELS_PATH,
+                            MOVE_BLOCKED, MOVE_LETTERS, MOVE_PUSHED,
+                            VERIFY_CHUNK_SIZE, VERIFY_JSONL_EXTENSION,
+                            VERIFY_REPORT_FIELDS)
+from engine import SokobanState
+from level_collection import read_level_reference, split_reference
+from solve_levels import find_levels, init_worker, raise_keyboard_interrupt
+
+# Table converting the letters of the LURD notation into move codes
+# (the other characters are converted into an invalid code)
+INVALID_MOVE = 255
+LURD_TABLE = bytes(
+    MOVE_LETTERS.index(chr(value).lower()) if chr(value).lower() in MOVE_LETTERS
+    else INVALID_MOVE
+    for value in range(256)
+)
+
+# States of the levels already read by a worker process, by reference
+worker_states = {}
+
+
+def level_name(reference):
+    """Function returning the name designating a level in the solutions: the name
+    of its file without extension, followed by its number for a collection."""
+
+    (path, number) = split_reference(reference)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    if number is None:
+        return name
+
+    return '{}{}{}'.format(name, LEVEL_REFERENCE_SEPARATOR, number + 1)
+
+
+def read_solutions(paths):
+    """Generator reading the solutions in the <paths> list (JSONL files,
+    solution files or directories of solution files). It yields tuples
+    (id, level, solution), where level is the one given by the solution:
+    a level name or reference. A malformed entry yields a solution of None."""
+
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            yield from read_solutions(os.path.join(path, name) for name in names
+                                      if os.path.isfile(os.path.join(path, name)))
+
+        elif path.endswith(VERIFY_JSONL_EXTENSION):
+            with open(path, encoding='utf-8') as solutions:
+                for line_number, line in enumerate(solutions, 1):
+                    if not line.strip():
+                        continue
+
+                    entry_id = '{}:{}'.format(path, line_number)
+
+                    try:
+                        entry = json.loads(line)
+                        yield (str(entry.get('id', entry_id)), str(entry['level']),
+                               str(entry['solution']))
+
+                    except (ValueError, KeyError, AttributeError):
+                        yield (entry_id, '', None)
+
+        else:
+            # The name of the file is the name of the level, followed by any extension
+            with open(path, encoding='utf-8', errors='replace') as solution:
+                yield (path, os.path.basename(path).split(os.extsep, 1)[0],
+                       solution.read())
+
+
+def level_state(reference):
+    """Function returning the SokobanState of the level <reference> in its
+    initial position. Each worker reads a level only once, and then resets it."""
+
+    state = worker_states.get(reference)
+
+    if state is None:
+        state = worker_states[reference] = SokobanState(*read_level_reference(reference))
+
+    else:
+        state.reset()
+
+    return state
+
+
+def verify_solution(reference, solution, strict=False):
+    """Function playing the <solution> (a string in the LURD notation, where the
+    whitespaces are ignored) on the level <reference>. If <strict> is True, the
+    case of each letter must tell whether the move pushes a crate.
+    It returns a dictionary with the fields of VERIFY_REPORT_FIELDS."""
+
+    report = dict.fromkeys(VERIFY_REPORT_FIELDS)
+    report.update(level=reference, valid=False)
+
+    letters = ''.join(solution.split())
+    codes = letters.encode('latin-1', 'replace').translate(LURD_TABLE)
+
+    if INVALID_MOVE in codes:
+        position = codes.index(INVALID_MOVE)
+        report.update(status='invalid', diverged_at=position + 1,
+                      error='invalid character {!r}'.format(letters[position]))
+        return report
+
+    try:
+        state = level_state(reference)
+
+    except (OSError, ValueError) as error:
+        report.update(status='invalid', error=str(error))
+        return report
+
+    move = state.move
+
+    for index, code in enumerate(codes):
+        result = move(code)
+
+        if result == MOVE_BLOCKED:
+            report.update(status='blocked', diverged_at=index + 1,
+                          error='impossible move {!r}'.format(letters[index]))
+            break
+
+        # An upper case letter must push a crate, and a lower case one must not
+        if strict and (result == MOVE_PUSHED) != letters[index].isupper():
+            report.update(status='push_mismatch', diverged_at=index + 1,
+                          error='the move {!r} {} a crate'.format(
+                              letters[index],
+                              'pushes' if result == MOVE_PUSHED else 'does not push'))
+            break
+
+    else:
+        report['valid'] = state.is_solved()
+        report['status'] = 'valid' if report['valid'] else 'unsolved'
+
+    report.update(moves=state.move_count(), pushes=state.push_count())
+
+    return report
+
+
+def verify_batch(entries, strict=False):
+    """Function verifying a batch of solutions in a worker process. <entries> is a
+    list of tuples (id, level reference, solution, error): when error is not None,
+    the entry is reported as invalid without being played.
+    It returns the list of the reports."""
+
+    reports = []
+
+    for (entry_id, reference, solution, error) in entries:
+        if error is not None:
+            report = dict.fromkeys(VERIFY_REPORT_FIELDS)
+            report.update(level=reference, status='invalid', valid=False, error=error)
+
+        else:
+            report = verify_solution(reference, solution, strict)
+
+        report['id'] = entry_id
+        reports.append(report)
+
+    return reports
+
+
+def resolve_entries(solutions, levels):
+    """Generator converting the (id, level, solution) tuples of <solutions> into
+    the entries of the verify_batch function. The level of each solution is
+    looked up in the <levels> list of references, by name or by reference."""
+
+    references = {level_name(reference): reference for reference in levels}
+    references.update((reference, reference) for reference in levels)
+
+    for (entry_id, level, solution) in solutions:
+        reference = references.get(level)
+
+        if solution is None:
+            yield (entry_id, level, None, 'malformed entry')
+
+        elif reference is None:
+            yield (entry_id, level, None, 'unknown level')
+
+        else:
+            yield (entry_id, reference, solution, None)
+
+
+def chunks(entries, size):
+    """Generator grouping the <entries> in lists of <size> entries."""
+
+    chunk = []
+
+    for entry in entries:
+        chunk.append(entry)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def verify_solutions(entries, jobs=None, strict=False,
+                     chunk_size=VERIFY_CHUNK_SIZE, progress=None):
+    """Function verifying the <entries> (see the verify_batch function) with a pool
+    of <jobs> processes (one per core by default). The entries are sent to the
+    workers in chunks of <chunk_size>, so that each worker reads its levels once
+    for many solutions. <progress> is an optional function called with the list
+    of reports of each chunk as soon as it is available. It returns the list of
+    the reports, in the order of <entries>. If the verification is interrupted
+    (KeyboardInterrupt), the chunks which were not verified are reported as
+    'cancelled'."""
+
+    batches, results = list(chunks(entries, chunk_size)), {}
+    futures = {}
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        jobs, initializer=init_worker, initargs=(None,))
+
+    try:
+        futures = {executor.submit(verify_batch, batch, strict): number
+                   for (number, batch) in enumerate(batches)}
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                reports = future.result()
+
+            except concurrent.futures.process.BrokenProcessPool:
+                # The worker was killed (for instance by the system, out of memory)
+                reports = cancelled_reports(batches[futures[future]], 'crashed')
+
+            results[futures[future]] = reports
+
+            if progress is not None:
+                progress(reports)
+
+    except KeyboardInterrupt:
+        for future in futures:
+            future.cancel()
+
+    finally:
+        executor.shutdown(wait=True)
+
+    return [report
+            for (number, batch) in enumerate(batches)
+            for report in results.get(number) or cancelled_reports(batch, 'cancelled')]
+
+
+def cancelled_reports(batch, status):
+    """Function returning the reports of the entries of a <batch>
+    which could not be verified, with the given <status>."""
+
+    reports = []
+
+    for (entry_id, reference, _, _) in batch:
+        report = dict.fromkeys(VERIFY_REPORT_FIELDS)
+        report.update(id=entry_id, level=reference, status=status, valid=False)
+        reports.append(report)
+
+    return reports
+
+
+def write_report(reports, output, report_format):
+    """Function writing the <reports> in the <output> file object,
+    with the 'json' or 'csv' <report_format>."""
+
+    if report_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=VERIFY_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(reports)
+
+    else:
+        json.dump({
+            'solutions': reports,
+            'valid': sum(1 for report in reports if report['valid']),
+            'total': len(reports)
+        }, output, indent=2)
+        output.write('\n')
+
+
+def main(arguments=None):
+    """Main function of the tool. It returns the exit status:
+    0 if all the solutions are valid, 1 otherwise."""
+
+    parser = argparse.ArgumentParser(
+        description='Verify a set of solutions in parallel and report the results.')
+    parser.add_argument('solutions', nargs='+',
+                        help='JSONL files, solution files or directories of solutions')
+    parser.add_argument('-l', '--levels', nargs='+', default=[LEVELS_PATH],
+                        help='level files, directories or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of cores)')
+    parser.add_argument('--strict', action='store_true',
+                        help='check that the upper case moves are exactly the pushes')
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+                        help='format of the report')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file in which the report is written (default: standard output)')
+    options = parser.parse_args(arguments)
+
+    levels = find_levels(options.levels)
+
+    if not levels:
+        parser.error('no level found')
+
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+
+    verified = [0]
+
+    def progress(reports):
+        """Function displaying the progress of the verification on the error output."""
+        verified[0] += len(reports)
+        print('{} solutions verified'.format(verified[0]), file=sys.stderr)
+
+    entries = resolve_entries(read_solutions(options.solutions), levels)
+    reports = verify_solutions(entries, options.jobs, options.strict, progress=progress)
+
+    if options.output is None:
+        write_report(reports, sys.stdout, options.format)
+
+    else:
+        with open(options.output, 'w', newline='', encoding='utf-8') as output:
+            write_report(reports, output, options.format)
+
+    return 0 if all(report['valid'] for report in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
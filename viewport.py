@@ -0,0 +1,78 @@
+"""
+This module contains the viewport of the game: the part of the map displayed
+in the window. The maps can be much larger than the window, so the viewport
+follows the character and converts the coordinates of the map (in pixels)
+into coordinates of the screen.
+"""
+
+import pygame
+
+from constants import GAME_CAMERA_MARGIN, TILE_SIZE
+
+
+class Viewport():
+    """Class storing the area of the map displayed on the screen."""
+
+    def __init__(self, size):
+        """Constructor method. <size> is the size of the displayed area, in pixels."""
+
+        # Area of the map (in pixels) displayed on the screen
+        self.rect = pygame.Rect((0, 0), size)
+
+        # Size of the map, in pixels
+        self.map_width, self.map_height = size
+
+    def set_map_size(self, columns, rows):
+        """Method setting the size of the map, in terms of tiles."""
+
+        self.map_width, self.map_height = columns * TILE_SIZE, rows * TILE_SIZE
+        self.rect.topleft = (0, 0)
+
+    def follow(self, rect):
+        """Method scrolling the viewport so that the <rect> area of the map (the one
+        of the character) stays at least GAME_CAMERA_MARGIN tiles away from the
+        edges of the screen, without showing anything outside of the map.
+        It returns True if the viewport moved."""
+
+        margin = GAME_CAMERA_MARGIN * TILE_SIZE
+        previous_position = self.rect.topleft
+
+        # The area which must be visible is the rect, extended by the margin
+        # (but the margin cannot be larger than half of the screen)
+        area = rect.inflate(
+            2 * min(margin, (self.rect.width - rect.width) // 2),
+            2 * min(margin, (self.rect.height - rect.height) // 2)
+        )
+
+        # We move the viewport as little as possible to contain this area
+        self.rect.left = min(self.rect.left, area.left)
+        self.rect.right = max(self.rect.right, area.right)
+        self.rect.top = min(self.rect.top, area.top)
+        self.rect.bottom = max(self.rect.bottom, area.bottom)
+
+        # Finally, we keep the viewport inside of the map
+        self.rect.left = max(0, min(self.rect.left, self.map_width - self.rect.width))
+        self.rect.top = max(0, min(self.rect.top, self.map_height - self.rect.height))
+
+        return self.rect.topleft != previous_position
+
+    def to_screen(self, rect):
+        """Method converting a <rect> of the map into a rect of the screen."""
+        return rect.move(-self.rect.x, -self.rect.y)
+
+    def to_map(self, rect):
+        """Method converting a <rect> of the screen into a rect of the map."""
+        return rect.move(self.rect.x, self.rect.y)
+
+    def tile_at(self, position):
+        """Method returning the (column, row) coordinates of the tile of the map
+        displayed at the <position> of the screen."""
+
+        return ((position[0] + self.rect.x) // TILE_SIZE,
+                (position[1] + self.rect.y) // TILE_SIZE)
+
+    def tile_rect(self, column, row):
+        """Method returning the rect of the screen covered by the tile at (<column>, <row>)."""
+
+        return pygame.Rect(column * TILE_SIZE - self.rect.x,
+                           row * TILE_SIZE - self.rect.y, TILE_SIZE, TILE_SIZE)